@@ -0,0 +1,531 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+import logging
+from datetime import datetime
+from aiohttp import web
+import numpy as np
+from main import STOCKS, percentile
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench")
+logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+
+BENCH_HOST = "127.0.0.1"
+BENCH_PORT = int(os.getenv("BENCH_PORT", "8765"))
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "bench_results")
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# عدد مرات قياس زمن إقلاع الأوامر التي لا تحتاج متصفحاً
+STARTUP_RUNS = int(os.getenv("BENCH_STARTUP_RUNS", "5"))
+
+# إعدادات الصفحة الاصطناعية: زمن الرسم بالثواني ونسبة الصفحات التي لا تُرسم أبداً ومحتوى الـ canvas
+DEFAULT_PAGE = {
+    "server_delay": 0.2,
+    "render_delay": 1.5,
+    "jitter": 0.5,
+    "failure_rate": 0.0,
+    # نسبة ثابتة من الرموز (حسب crc32) تتأخر بقدر slow_delay لمحاكاة تفاوت الأسهم
+    "slow_fraction": 0.0,
+    "slow_delay": 0.0,
+    # candles (شموع حسب الرمز) أو blank (canvas فارغ)
+    "content": "candles",
+    # طلبات طرف ثالث تحاكي التحليلات والخطوط (تطابق قائمة الحظر الافتراضية في main.py)
+    "third_party_requests": 6,
+    "third_party_bytes": 50000,
+    "third_party_delay": 0.3,
+    # زمن وصول بيانات إطار جديد عند التبديل عبر TradingViewApi دون إعادة تحميل الصفحة
+    "switch_delay": 0.3,
+}
+
+# إعدادات Bot API الوهمي: رد 429 على كل N استدعاء (0 = معطل)
+DEFAULT_API = {
+    "latency": 0.05,
+    "rate_limit_every": 0,
+    "retry_after": 1,
+}
+
+SCENARIOS = {
+    "baseline": {"env": {"MAX_WORKERS": "3"}},
+    # worker واحد على نفس الأسهم: مرجع التسريع الفعلي لـ baseline
+    "sequential": {"env": {"MAX_WORKERS": "1"}},
+    "tabs": {"env": {"MAX_WORKERS": "1", "TABS_PER_BROWSER": "3"}},
+    "skewed": {"env": {"MAX_WORKERS": "3"}, "page": {"slow_fraction": 0.2, "slow_delay": 8.0}},
+    "flaky": {"env": {"MAX_WORKERS": "3"}, "page": {"failure_rate": 0.1}},
+    "throttled": {"env": {"MAX_WORKERS": "3"}, "api": {"rate_limit_every": 5, "retry_after": 1}},
+    "unblocked": {"env": {"MAX_WORKERS": "3", "CHART_BLOCKED_URLS": ""}},
+    # يبدأ بمتصفحين ويترك المتحكم التكيفي يحدد العدد (للمقارنة مع baseline الثابت على 3)
+    "adaptive": {"env": {"MAX_WORKERS": "2", "ADAPTIVE_WORKERS": "1", "ADAPTIVE_INTERVAL": "5"}},
+    # رسم محلي من أسعار اصطناعية دون Chrome، بعملية صور واحدة (نواة واحدة) للمقارنة مع baseline
+    "renko": {"env": {"CHART_BACKEND": "renko", "IMAGE_WORKERS": "1"}, "ohlc": True},
+    # ثلاثة أطر لكل سهم من صفحة واحدة (ألبوم لكل سهم) مقابل ثلاثة تحميلات منفصلة
+    "variants": {"env": {"MAX_WORKERS": "3", "CHART_VARIANTS": "1W:4,1D:1"}},
+}
+# سنوات الأسعار اليومية الاصطناعية لسيناريو renko
+OHLC_YEARS = 20
+
+CHART_PAGE = """<!DOCTYPE html>
+<html><head><style>
+body { margin: 0; background: #131722; }
+.layout__area--center { position: absolute; left: 0; top: 0; right: 0; bottom: 0; }
+@font-face { font-family: ChartFont; src: url(/static/chart.woff2); }
+.legend { font-family: ChartFont; position: absolute; visibility: hidden; }
+</style>
+__THIRD_PARTY__
+</head>
+<body><div class="legend">legend</div><div class="layout__area--center"><canvas id="chart"></canvas></div>
+<script>
+const config = __CONFIG__;
+const canvas = document.getElementById('chart');
+canvas.width = window.innerWidth;
+canvas.height = window.innerHeight;
+function draw() {
+    const ctx = canvas.getContext('2d');
+    ctx.fillStyle = '#131722';
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+    if (config.content === 'blank') return;
+    let seed = config.seed;
+    const rand = () => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+    const count = 120, width = canvas.width / count;
+    let price = 100;
+    const bars = [];
+    for (let i = 0; i < count; i++) {
+        const open = price;
+        price = Math.max(5, price + (rand() - 0.48) * 8);
+        bars.push([open, price]);
+    }
+    const low = Math.min(...bars.flat()), high = Math.max(...bars.flat());
+    const y = value => canvas.height - 40 - (value - low) / (high - low) * (canvas.height - 80);
+    bars.forEach(([open, close], i) => {
+        ctx.fillStyle = close >= open ? '#26a69a' : '#ef5350';
+        const top = y(Math.max(open, close)), bottom = y(Math.min(open, close));
+        ctx.fillRect(i * width + 1, top, width - 2, Math.max(2, bottom - top));
+    });
+    ctx.fillStyle = '#d1d4dc';
+    ctx.font = '24px sans-serif';
+    ctx.fillText(`${config.symbol} ${config.interval} ${config.style}`, 20, 40);
+}
+// محاكاة واجهة TradingView التي يستخدمها main.py لتبديل الإطار والنوع في نفس الصفحة
+const chart = {
+    resolution: () => config.interval,
+    setChartType: style => { config.style = String(style); if (!config.fail) draw(); },
+    setResolution: (interval, callback) => {
+        config.interval = interval;
+        config.seed = (config.seed * 31 + interval.charCodeAt(interval.length - 1)) % 2147483648;
+        setTimeout(() => { draw(); if (callback) callback(); }, config.switch_delay * 1000);
+    },
+};
+window.TradingViewApi = { activeChart: () => chart };
+if (!config.fail) setTimeout(draw, config.render_delay * 1000);
+</script></body></html>
+"""
+
+class BenchServer:
+    """خادم محلي واحد: صفحة شارت اصطناعية بدل TradingView و Bot API وهمي يسجل الاستدعاءات"""
+
+    def __init__(self, host=BENCH_HOST, port=BENCH_PORT):
+        self.host = host
+        self.port = port
+        self.page = dict(DEFAULT_PAGE)
+        self.api = dict(DEFAULT_API)
+        self.rng = random.Random(0)
+        self.runner = None
+        self.reset()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def configure(self, page, api, seed=0):
+        """ضبط إعدادات السيناريو التالي وتصفير العدادات"""
+        self.page = dict(DEFAULT_PAGE, **page)
+        self.api = dict(DEFAULT_API, **api)
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.page_requests = 0
+        self.page_failures = 0
+        self.third_party_requests = 0
+        self.api_calls = 0
+        self.calls_by_method = {}
+        self.rate_limited = 0
+        self.upload_bytes = 0
+        self.message_ids = 0
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/chart/", self.handle_chart)
+        app.router.add_get("/thirdparty/{path:.*}", self.handle_third_party)
+        app.router.add_get("/static/{path:.*}", self.handle_third_party)
+        app.router.add_post("/bot{token}/{method}", self.handle_api)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"🧪 خادم القياس يعمل على {self.base_url}")
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def handle_chart(self, request):
+        symbol = request.query.get("symbol", "")
+        self.page_requests += 1
+        await asyncio.sleep(self.page["server_delay"])
+
+        render_delay = self.page["render_delay"] + self.rng.uniform(0, self.page["jitter"])
+        # تأخير ثابت لنفس الرموز في كل تشغيل حتى تكون السيناريوهات قابلة للمقارنة
+        if zlib.crc32(symbol.encode()) % 100 < self.page["slow_fraction"] * 100:
+            render_delay += self.page["slow_delay"]
+        fail = self.rng.random() < self.page["failure_rate"]
+        if fail:
+            self.page_failures += 1
+
+        config = {
+            "symbol": symbol,
+            "seed": zlib.crc32(symbol.encode()) % 2147483648,
+            "render_delay": render_delay,
+            "switch_delay": self.page["switch_delay"],
+            "interval": request.query.get("interval", ""),
+            "style": request.query.get("style", ""),
+            "content": self.page["content"],
+            "fail": fail,
+        }
+        third_party = "\n".join(
+            f'<script async src="/thirdparty/google-analytics.com/collect-{index}.js"></script>'
+            for index in range(self.page["third_party_requests"])
+        )
+        html = CHART_PAGE.replace("__CONFIG__", json.dumps(config)).replace("__THIRD_PARTY__", third_party)
+        return web.Response(text=html, content_type="text/html")
+
+    async def handle_third_party(self, request):
+        """محتوى وهمي بحجم ثابت للسكربتات والخطوط التي يُفترض أن تُحظر"""
+        self.third_party_requests += 1
+        await asyncio.sleep(self.page["third_party_delay"])
+        return web.Response(body=b"/*" + b" " * self.page["third_party_bytes"] + b"*/", content_type="application/javascript")
+
+    def _message(self, **fields):
+        self.message_ids += 1
+        return dict({"message_id": self.message_ids, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}, **fields)
+
+    def _photo_message(self):
+        file_id = f"bench-{self.message_ids + 1}"
+        return self._message(photo=[{"file_id": file_id, "file_unique_id": file_id, "width": 1200, "height": 700}])
+
+    async def handle_api(self, request):
+        method = request.match_info["method"]
+        self.api_calls += 1
+        self.calls_by_method[method] = self.calls_by_method.get(method, 0) + 1
+        data = await request.post()
+        # الرفع متعدد الأجزاء يُرسل مقطّعاً بدون Content-Length فيُقاس حجم الحقول نفسها
+        for value in data.values():
+            self.upload_bytes += len(value.file.read()) if hasattr(value, "file") else len(str(value))
+        await asyncio.sleep(self.api["latency"])
+
+        every = self.api["rate_limit_every"]
+        if every and self.api_calls % every == 0:
+            self.rate_limited += 1
+            retry_after = self.api["retry_after"]
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+
+        name = method.lower()
+        if name == "sendmediagroup":
+            result = [self._photo_message() for _ in json.loads(data["media"])]
+        elif name == "sendphoto":
+            result = self._photo_message()
+        elif name.startswith("send") or name.startswith("edit"):
+            result = self._message(text=data.get("text", ""))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def api_stats(self):
+        return {
+            "calls": self.api_calls,
+            "calls_by_method": dict(self.calls_by_method),
+            "rate_limited": self.rate_limited,
+            "upload_bytes": self.upload_bytes,
+        }
+
+def write_synthetic_ohlc(directory, symbols, seed=0, years=OHLC_YEARS):
+    """كتابة أسعار يومية اصطناعية (مسار عشوائي هندسي) لكل سهم كملف CSV"""
+    os.makedirs(directory, exist_ok=True)
+    days = np.arange(np.datetime64("2000-01-03"), np.datetime64("2000-01-03") + years * 365)
+    days = days[np.is_busday(days)]
+    for symbol in symbols:
+        rng = np.random.default_rng(zlib.crc32(symbol.encode("utf-8")) + seed)
+        close = 20 + rng.random() * 200 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(days))))
+        spread = close * rng.uniform(0.005, 0.03, len(days))
+        prices = np.column_stack((close - spread / 4, close + spread, close - spread, close))
+        with open(os.path.join(directory, f"{symbol}.csv"), "w", encoding="utf-8") as f:
+            f.write("date,open,high,low,close\n")
+            f.writelines(f"{day},{o:.2f},{h:.2f},{l:.2f},{c:.2f}\n" for day, (o, h, l, c) in zip(days, prices))
+
+async def run_scenario(server, name, scenario, shard=None, seed=0):
+    """تشغيل main.py الحقيقي كعملية منفصلة ضد الخادم المحلي وجمع المقاييس"""
+    page = scenario.get("page", {})
+    api = scenario.get("api", {})
+    server.configure(page, api, seed)
+    logger.info(f"▶️ السيناريو {name}...")
+
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        report_path = os.path.join(workdir, "run_report.json")
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN="0:bench",
+            TELEGRAM_CHAT_ID="1",
+            TELEGRAM_API_SERVER=server.base_url,
+            CHART_URL_TEMPLATE=server.base_url + "/chart/?symbol={exchange}:{symbol}&interval={interval}&style={style}",
+            # ذاكرة فارغة في كل تشغيل: لا file_id سابقة تُخفي تكلفة الرفع
+            CHART_DEDUP_MODE="off",
+            CHART_CACHE_FILE=os.path.join(workdir, "chart_cache.json"),
+            RUN_STATE_DB=os.path.join(workdir, "run_state.db"),
+            SHARD_RESULTS_DIR=os.path.join(workdir, "shard-results"),
+            RUN_REPORT_FILE=report_path,
+        )
+        env.update(scenario.get("env", {}))
+        if scenario.get("ohlc"):
+            env["RENKO_DATA_DIR"] = os.path.join(workdir, "ohlc")
+            write_synthetic_ohlc(env["RENKO_DATA_DIR"], [stock.symbol for stock in STOCKS], seed)
+
+        command = [sys.executable, MAIN_SCRIPT, "run"]
+        if shard:
+            command += ["--shard", shard]
+
+        start_time = time.time()
+        process = await asyncio.create_subprocess_exec(
+            *command, cwd=workdir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        wall_time = time.time() - start_time
+
+        if not os.path.exists(report_path):
+            tail = stderr.decode(errors="replace").strip().splitlines()[-5:]
+            logger.error(f"❌ السيناريو {name} لم يكتب تقريراً (exit {process.returncode})")
+            return {"scenario": name, "exit_code": process.returncode, "error": "\n".join(tail)}
+
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+
+    results = report["results"]
+    successful = [result for result in results if result["success"]]
+    durations = [result["duration"] for result in successful]
+    ready_times = [result["ready_time"] for result in successful if result.get("ready_time") is not None]
+    total_duration = report["total_duration"]
+
+    return {
+        "scenario": name,
+        "exit_code": process.returncode,
+        "config": {"env": scenario.get("env", {}), "page": server.page, "api": server.api, "shard": shard},
+        "wall_time": wall_time,
+        "total_duration": total_duration,
+        "parallel_duration": report["parallel_duration"],
+        "charts": len(results),
+        "successful": len(successful),
+        "failed": len(results) - len(successful),
+        "charts_per_min": len(successful) / total_duration * 60 if total_duration else 0,
+        # إنتاجية الالتقاط أو الرسم وحده لكل worker (دون حدود إرسال تليجرام)
+        "capture_per_min": 60 / (sum(durations) / len(durations)) if durations else 0,
+        "latency_p50": percentile(durations, 0.50),
+        "latency_p95": percentile(durations, 0.95),
+        "ready_p50": percentile(ready_times, 0.50),
+        "ready_p95": percentile(ready_times, 0.95),
+        "page_requests": server.page_requests,
+        "page_failures": server.page_failures,
+        "third_party_requests": server.third_party_requests,
+        "network": report.get("network", {}),
+        "api": server.api_stats(),
+        "stages": report.get("stages", {}),
+        "workers": report.get("workers", {}),
+        "cold_start": report.get("cold_start", {}),
+        "images": report.get("images", {}),
+        "variants": report.get("variants", {}),
+        "pool": report["pool"],
+        "concurrency": report.get("concurrency"),
+        "retry": report["retry"],
+    }
+
+def measure_startup(runs=STARTUP_RUNS):
+    """قياس زمن إقلاع الأوامر الخفيفة: استيراد main.py و dry-run كعمليات جديدة"""
+    commands = {
+        "import": [sys.executable, "-c", "import main"],
+        "dry_run": [sys.executable, MAIN_SCRIPT, "dry-run"],
+    }
+    # بلا بيانات تليجرام: الاستيراد و dry-run يجب ألا يحتاجا إليها
+    env = {key: value for key, value in os.environ.items() if not key.startswith("TELEGRAM_")}
+    startup = {}
+    for name, command in commands.items():
+        times = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            subprocess.run(command, cwd=os.path.dirname(MAIN_SCRIPT), env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start_time)
+        startup[name] = {"runs": runs, "p50": percentile(times, 0.50), "min": min(times)}
+        logger.info(f"⚡ إقلاع {name}: p50 {startup[name]['p50'] * 1000:.0f}ms (أدنى {startup[name]['min'] * 1000:.0f}ms)")
+    return startup
+
+def format_metric(value, unit="s"):
+    return "-" if value is None else f"{value:.2f}{unit}"
+
+def log_result(result):
+    if "error" in result:
+        logger.info(f"   {result['scenario']}: خطأ\n{result['error']}")
+        return
+    logger.info(
+        f"📊 {result['scenario']}: {result['successful']}/{result['charts']} شارت | "
+        f"{result['charts_per_min']:.1f} شارت/دقيقة (الالتقاط وحده {result['capture_per_min']:.0f}/دقيقة لكل worker) | "
+        f"p50 {format_metric(result['latency_p50'])} p95 {format_metric(result['latency_p95'])} | "
+        f"API {result['api']['calls']} استدعاء ({result['api']['rate_limited']} × 429)"
+    )
+    variants = result.get("variants") or {}
+    if variants.get("captured"):
+        logger.info(
+            f"🔀 {result['scenario']}: {variants['captured']} إطار إضافي | التبديل p50 {format_metric(variants['switch_p50'])} "
+            f"مقابل تحميل الصفحة {format_metric(variants['first_load_p50'])} (توفير {variants['saved']:.1f}s)"
+        )
+
+def measure_speedup(results, baseline="baseline", reference="sequential"):
+    """التسريع المقاس: زمن التشغيل بـ worker واحد ÷ زمنه بعدة workers على نفس الأسهم والصفحة"""
+    by_name = {result["scenario"]: result for result in results if "error" not in result}
+    if baseline not in by_name or reference not in by_name:
+        return None
+    parallel, sequential = by_name[baseline], by_name[reference]
+    if not parallel["total_duration"]:
+        return None
+    speedup = {
+        "workers": int(parallel["config"]["env"].get("MAX_WORKERS", 1)),
+        "sequential_duration": sequential["total_duration"],
+        "parallel_duration": parallel["total_duration"],
+        "speedup": sequential["total_duration"] / parallel["total_duration"],
+    }
+    logger.info(
+        f"⚡ التسريع المقاس: {speedup['speedup']:.2f}x بـ {speedup['workers']} workers "
+        f"({speedup['sequential_duration']:.1f}s ← {speedup['parallel_duration']:.1f}s)"
+    )
+    return speedup
+
+def save_results(results, output_dir, startup=None):
+    """حفظ نتائج التشغيل في ملف JSON مختوم بالوقت"""
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(output_dir, f"bench-{stamp}.json")
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(MAIN_SCRIPT), capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    payload = {
+        "timestamp": stamp,
+        "commit": commit,
+        "startup": startup or {},
+        "speedup": measure_speedup(results),
+        "scenarios": {result["scenario"]: result for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1)
+    logger.info(f"💾 تم حفظ نتائج القياس في {path}")
+    return path
+
+def compare_results(old_path, new_path):
+    """مقارنة ملفي نتائج: الإنتاجية وزمن p95 لكل سيناريو مشترك"""
+    with open(old_path, encoding="utf-8") as f:
+        old_payload = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new_payload = json.load(f)
+    old, new = old_payload["scenarios"], new_payload["scenarios"]
+
+    for name, after in new_payload.get("startup", {}).items():
+        before = old_payload.get("startup", {}).get(name)
+        if before:
+            logger.info(f"⚖️ إقلاع {name}: {before['p50'] * 1000:.0f}ms → {after['p50'] * 1000:.0f}ms")
+
+    before, after = old_payload.get("speedup"), new_payload.get("speedup")
+    if before and after:
+        logger.info(f"⚖️ التسريع المقاس: {before['speedup']:.2f}x → {after['speedup']:.2f}x")
+
+    for name in new:
+        if name not in old or "error" in old[name] or "error" in new[name]:
+            continue
+        before, after = old[name], new[name]
+        change = (after["charts_per_min"] / before["charts_per_min"] - 1) * 100 if before["charts_per_min"] else 0
+        logger.info(
+            f"⚖️ {name}: {before['charts_per_min']:.1f} → {after['charts_per_min']:.1f} شارت/دقيقة ({change:+.1f}%) | "
+            f"p95 {format_metric(before['latency_p95'])} → {format_metric(after['latency_p95'])} | "
+            f"API {before['api']['calls']} → {after['api']['calls']}"
+        )
+
+async def bench_main(args):
+    overrides = {
+        "page": {key: value for key, value in (
+            ("render_delay", args.render_delay),
+            ("failure_rate", args.failure_rate),
+            ("content", args.content),
+        ) if value is not None},
+        "api": {"rate_limit_every": args.rate_limit_every} if args.rate_limit_every is not None else {},
+    }
+
+    startup = measure_startup(args.startup_runs) if args.startup_runs else None
+    if args.startup_only:
+        return save_results([], args.output, startup)
+
+    server = BenchServer(port=args.port)
+    await server.start()
+    results = []
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            scenario = SCENARIOS[name]
+            scenario = dict(
+                scenario,
+                page=dict(scenario.get("page", {}), **overrides["page"]),
+                api=dict(scenario.get("api", {}), **overrides["api"]),
+            )
+            result = await run_scenario(server, name, scenario, args.shard, args.seed)
+            log_result(result)
+            results.append(result)
+    finally:
+        await server.close()
+
+    return save_results(results, args.output, startup)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء البوت محلياً دون TradingView أو تليجرام")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="السيناريوهات المطلوبة (الافتراضي: الكل)")
+    parser.add_argument("--shard", metavar="i/N", help="قياس جزء من قائمة الأسهم فقط لتشغيل أسرع (مثل 1/4)")
+    parser.add_argument("--render-delay", type=float, help="زمن رسم الشارت بالثواني في الصفحة الاصطناعية")
+    parser.add_argument("--failure-rate", type=float, help="نسبة الصفحات التي لا يُرسم فيها الشارت")
+    parser.add_argument("--content", choices=["candles", "blank"], help="محتوى الـ canvas")
+    parser.add_argument("--rate-limit-every", type=int, help="رد 429 على كل N استدعاء لـ Bot API")
+    parser.add_argument("--seed", type=int, default=0, help="بذرة العشوائية للتأخير والفشل")
+    parser.add_argument("--port", type=int, default=BENCH_PORT)
+    parser.add_argument("--output", default=BENCH_RESULTS_DIR, help="مجلد ملفات النتائج")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="مقارنة ملفي نتائج سابقين بدلاً من التشغيل")
+    parser.add_argument("--startup-runs", type=int, default=STARTUP_RUNS, help="عدد مرات قياس زمن الإقلاع (0 لتعطيله)")
+    parser.add_argument("--startup-only", action="store_true", help="قياس زمن الإقلاع فقط دون السيناريوهات")
+    return parser.parse_args(argv)
+
+def cli(argv=None):
+    """نقطة الدخول المشتركة بين python bench.py و python main.py bench"""
+    args = parse_args(argv)
+    if args.compare:
+        compare_results(*args.compare)
+    else:
+        asyncio.run(bench_main(args))
+
+if __name__ == "__main__":
+    cli()
@@ -1,35 +1,223 @@
+import time
+# لحظة بدء تحميل الوحدة لقياس زمن الإقلاع
+STARTUP_TIME = time.perf_counter()
+
+import argparse
 import asyncio
+import base64
+import collections
 import concurrent.futures
-import time
+import contextlib
+import csv
+import io
+import itertools
+import json
 import os
+import shutil
 import sys
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from aiogram import Bot
-from aiogram.types import FSInputFile
+import tempfile
+import uuid
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 import logging
-from datetime import datetime, timedelta
-import threading
-from queue import Queue
+import sqlite3
+import zlib
+from datetime import datetime, timezone
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# قراءة إعدادات تليجرام من متغيرات البيئة
+# قراءة إعدادات تليجرام من متغيرات البيئة (يُتحقق منها عند التشغيل فقط وليس عند الاستيراد)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
-# التحقق من وجود البيانات
-if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-    logger.error("❌ بيانات تليجرام غير مضبوطة!")
-    sys.exit(1)
+# خادم Bot API بديل (مثلاً خادم محلي وهمي للاختبار)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER")
+
+# البوت يُنشأ في configure_telegram() عند الحاجة إليه فقط
+bot = None
+
+# حدود تليجرام: رسالة تقريباً كل ثانية لكل محادثة و30 طلباً في الثانية إجمالاً
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_MAX_RETRIES = 5
+# حد تليجرام 4096 حرفاً للرسالة مع هامش؛ القوائم الأطول تُقسم على عدة رسائل
+TELEGRAM_TEXT_LIMIT = 4000
+
+# أولويات الإرسال: الأقل يُرسل أولاً (ردود أوامر /chart في الوضع الدائم قبل ألبومات التقرير الشهري)
+PRIORITY_COMMAND = 0
+PRIORITY_CHART = 1
+PRIORITY_REPORT = 2
+PRIORITY_PROGRESS = 3
+# رسالة التقدم تُعدل في مكانها مرة كل PROGRESS_INTERVAL ثانية كحد أقصى، والتقدير من آخر PROGRESS_WINDOW شارت
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "10"))
+PROGRESS_WINDOW = int(os.getenv("PROGRESS_WINDOW", "20"))
+
+# عدد الـ workers المتوازية (يمكن تغييره لقياس التسريع مقارنة بـ worker واحد)
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "3"))
+# راحة قصيرة لكل worker بين سهم وآخر
+STOCK_PAUSE_SECONDS = 1
+# التحكم التكيفي (AIMD): MAX_WORKERS هو نقطة البداية ثم يزيد العدد واحداً واحداً ما دام النظام سليماً
+# ويُخفض بنسبة عند ارتفاع زمن الرسم أو الفشل أو الحمل أو نقص الذاكرة
+ADAPTIVE_WORKERS = os.getenv("ADAPTIVE_WORKERS", "0") == "1"
+ADAPTIVE_MIN_WORKERS = int(os.getenv("ADAPTIVE_MIN_WORKERS", "1"))
+ADAPTIVE_MAX_WORKERS = int(os.getenv("ADAPTIVE_MAX_WORKERS", str(max(MAX_WORKERS, os.cpu_count() or 1))))
+ADAPTIVE_INTERVAL = float(os.getenv("ADAPTIVE_INTERVAL", "15"))
+ADAPTIVE_MIN_SAMPLES = 4
+ADAPTIVE_DECREASE_FACTOR = 0.7
+ADAPTIVE_MAX_FAILURE_RATE = float(os.getenv("ADAPTIVE_MAX_FAILURE_RATE", "0.2"))
+# زمن الرسم مقارنة بأفضل نافذة سابقة، والحمل لكل نواة، والذاكرة المتاحة الدنيا
+ADAPTIVE_LATENCY_FACTOR = 1.5
+ADAPTIVE_MAX_LOAD = float(os.getenv("ADAPTIVE_MAX_LOAD", "1.5"))
+ADAPTIVE_MIN_FREE_MB = int(os.getenv("ADAPTIVE_MIN_FREE_MB", "700"))
+
+# الحد الأقصى لانتظار جاهزية الشارت قبل اعتباره فاشلاً (بدلاً من 5 ثوان ثابتة)
+CHART_READY_TIMEOUT = float(os.getenv("CHART_READY_TIMEOUT", "12"))
+CHART_READY_POLL_INTERVAL = 0.25
+# الفحوص المفعلة لكاشف الجاهزية مفصولة بفواصل
+CHART_READY_CHECKS = os.getenv("CHART_READY_CHECKS", "canvas,stable_layout,network_idle")
+
+# طريقة الالتقاط: element (لقطة العنصر) أو cdp_clip (قص منطقة الشارت عبر DevTools)
+CHART_CAPTURE_MODE = os.getenv("CHART_CAPTURE_MODE", "element")
+MIN_CHART_BYTES = 1000
+MIN_CHART_COLORS = 4
+
+# الإطار الزمني ونوع الشارت (4 = رينكو)
+CHART_INTERVAL = "1M"
+CHART_STYLE = "4"
+# أطر وأنواع إضافية تُلتقط من نفس الصفحة المحملة بتبديل الإطار في مكانه، بصيغة interval:style (مثال: "1W:4,1D:1")
+CHART_VARIANTS = tuple(
+    tuple(item.strip().split(":", 1)) if ":" in item else (item.strip(), CHART_STYLE)
+    for item in os.getenv("CHART_VARIANTS", "").split(",") if item.strip()
+)
+CHART_STYLE_NAMES = {"0": "أعمدة", "1": "شموع", "2": "خط", "3": "منطقة", "4": "رينكو", "8": "هايكن آشي"}
+# قالب رابط الشارت (يمكن توجيهه إلى صفحة محلية عند القياس عبر bench.py)
+CHART_URL_TEMPLATE = os.getenv(
+    "CHART_URL_TEMPLATE",
+    "https://www.tradingview.com/chart/?symbol={exchange}%3A{symbol}&interval={interval}&style={style}&theme=dark"
+)
+# محرك الشارت: browser (لقطة TradingView عبر Chrome) أو renko (رسم محلي من ملفات OHLC دون متصفح، انظر renko.py)
+CHART_BACKEND = os.getenv("CHART_BACKEND", "browser")
+CHART_BACKENDS = ("browser", "renko")
+# عدد الأسهم في كل دفعة حساب رينكو متجهة
+RENKO_BATCH_SIZE = int(os.getenv("RENKO_BATCH_SIZE", "256"))
+# فلتر مسبق: حساب طوب كل الأسهم من الأسعار المحلية والتقاط من ظهرت له طوبة جديدة أو انعكاس فقط (مع أي محرك)
+RENKO_PREFILTER = os.getenv("RENKO_PREFILTER", "0") == "1"
+# تسميات نتيجة الفلتر المسبق
+RENKO_CHANGE_LABELS = {
+    "new": "بلا حالة سابقة",
+    "new_brick": "طوبة جديدة",
+    "reversal": "انعكاس",
+    "no_data": "بلا بيانات أسعار",
+    "unchanged": "بلا تغيير",
+}
+
+# ملف قائمة الأسهم (CSV: symbol,name,sector,exchange) والبورصات المقبولة
+STOCK_UNIVERSE_FILE = os.getenv("STOCK_UNIVERSE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "stocks.csv"))
+KNOWN_EXCHANGES = {"NASDAQ", "NYSE", "AMEX"}
+
+# ذاكرة الشارتات السابقة: إعادة الإرسال بـ file_id (resend) أو التخطي (skip) أو التعطيل (off)
+CHART_CACHE_FILE = os.getenv("CHART_CACHE_FILE", "chart_cache.json")
+CHART_DEDUP_MODE = os.getenv("CHART_DEDUP_MODE", "resend")
+# دقة البصمة: dHash بـ 16×16 بت للشارت كله ومثلها لربعه الأيمن حيث تظهر الطوبة الجديدة
+FINGERPRINT_SIZE = 16
+# أقصى فرق (بالبت من 512) بين بصمتي صورتين لاعتبارهما نفس الشارت؛ 0 = تطابق تام
+# طوبة جديدة واحدة قد تغير بتات قليلة فقط، والحد الأعلى يعيد إرسال شارت قديم بدلها
+CHART_DEDUP_THRESHOLD = int(os.getenv("CHART_DEDUP_THRESHOLD", "0"))
+
+# مسار إعادة المحاولة داخل نفس التشغيل للأسهم الفاشلة
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BUDGET_SECONDS = float(os.getenv("RETRY_BUDGET_SECONDS", "300"))
+RETRY_BACKOFF_SECONDS = 2
+# كل محاولة تحصل على مهلة رسم أطول من سابقتها
+RETRY_DEADLINE_FACTOR = 1.5
+RETRY_FRESH_DRIVER = os.getenv("RETRY_FRESH_DRIVER", "1") == "1"
+
+# مخزن حالة التشغيل لاستئناف التشغيل بعد الانقطاع وإعادة محاولة الفاشلة
+RUN_STATE_DB = os.getenv("RUN_STATE_DB", "run_state.db")
+
+# الوضع الدائم (python main.py daemon): موعد التقرير الشهري بتوقيت UTC (مثل جدولة GitHub Actions)
+DAEMON_RUN_DAY = int(os.getenv("DAEMON_RUN_DAY", "1"))
+DAEMON_RUN_HOUR = int(os.getenv("DAEMON_RUN_HOUR", "18"))
+# المحادثات المسموح لها بأوامر /chart (مفصولة بفواصل؛ الافتراضي محادثة التقرير)
+DAEMON_ALLOWED_CHATS = {chat.strip() for chat in os.getenv("DAEMON_ALLOWED_CHATS", os.getenv("TELEGRAM_CHAT_ID", "")).split(",") if chat.strip()}
+# الأطر المسموحة في /chart SYMBOL [interval]
+ON_DEMAND_INTERVALS = tuple(interval.strip().upper() for interval in os.getenv("ON_DEMAND_INTERVALS", "1D,1W,1M").split(",") if interval.strip())
+# مدة صلاحية الشارت المرسل في ذاكرة الطلبات الفورية بالثواني
+ON_DEMAND_CACHE_TTL = float(os.getenv("ON_DEMAND_CACHE_TTL", "900"))
+# عدد الطلبات الأخيرة في حساب زمن الاستجابة p50/p95
+ON_DEMAND_METRICS_WINDOW = 500
+# مقاييس الطلبات الفورية كـ JSON تُحدث بعد كل طلب (فارغ = تعطيل)
+DAEMON_METRICS_FILE = os.getenv("DAEMON_METRICS_FILE", "daemon_metrics.json")
+
+# مجلد ملفات نتائج الأجزاء عند التشغيل الموزع (--shard)
+SHARD_RESULTS_DIR = os.getenv("SHARD_RESULTS_DIR", "shard-results")
+# تقرير التشغيل كاملاً كـ JSON مع إحصائيات المراحل (يستخدمه bench.py أيضاً؛ فارغ = تعطيل)
+RUN_REPORT_FILE = os.getenv("RUN_REPORT_FILE", "run_report.json")
+# زمن كل مرحلة لكل شارت كملف CSV (صف لكل مرحلة)
+SPANS_CSV_FILE = os.getenv("SPANS_CSV_FILE", "run_spans.csv")
+
+# مرحلة الإرسال: طابور محدود بين الالتقاط والرفع، وألبومات حتى 10 صور
+DELIVERY_QUEUE_SIZE = int(os.getenv("DELIVERY_QUEUE_SIZE", "20"))
+MEDIA_GROUP_SIZE = 10
+MEDIA_GROUP_FLUSH_SECONDS = float(os.getenv("MEDIA_GROUP_FLUSH_SECONDS", "3"))
+
+# مرحلة معالجة الصور في عمليات منفصلة: قص الهوامش ثم ترميز بحجم محدود (jpeg / webp / png / off = الصورة الخام)
+CHART_IMAGE_FORMAT = os.getenv("CHART_IMAGE_FORMAT", "jpeg")
+CHART_IMAGE_QUALITY = int(os.getenv("CHART_IMAGE_QUALITY", "85"))
+CHART_IMAGE_MIN_QUALITY = 40
+CHART_IMAGE_MAX_BYTES = int(os.getenv("CHART_IMAGE_MAX_BYTES", "400000"))
+CHART_IMAGE_TRIM = os.getenv("CHART_IMAGE_TRIM", "1") == "1"
+# ختم الرمز والتاريخ أعلى الصورة (بعد حساب البصمة حتى لا يغير الختم مقارنة الشهر التالي)
+CHART_IMAGE_STAMP = os.getenv("CHART_IMAGE_STAMP", "0") == "1"
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# فرق اللون عن الخلفية الذي يُعتبر محتوى عند القص، والهامش المتروك حول المحتوى
+TRIM_TOLERANCE = 12
+TRIM_PADDING = 8
+
+# إعادة تشغيل Chrome بعد عدد معين من الصفحات للحد من تضخم الذاكرة
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "40"))
+DRIVER_LAUNCH_ATTEMPTS = 2
+# عدد تبويبات الشارت في كل متصفح: تبويب يحمّل بينما آخر ينتظر الرسم
+TABS_PER_BROWSER = int(os.getenv("TABS_PER_BROWSER", "1"))
+DRIVER_HEALTH_TIMEOUT = 5
+
+# طلبات لا يحتاجها شارت رينكو تُحظر عبر DevTools (Network.setBlockedURLs) لكل تبويب
+DEFAULT_BLOCKED_URLS = (
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*facebook.net*",
+    "*facebook.com/tr*",
+    "*platform.twitter.com*",
+    "*hotjar.com*",
+    "*sentry.io*",
+    "*snowplowanalytics.com*",
+    "*amplitude.com*",
+    "*telemetry.tradingview.com*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    "*.woff2*",
+    "*.woff*",
+    "*.ttf*",
+    "*youtube.com*",
+)
+# قائمة أنماط مفصولة بفواصل تستبدل القائمة الافتراضية (فارغة = تعطيل الحظر)
+_blocked_urls = os.getenv("CHART_BLOCKED_URLS")
+CHART_BLOCKED_URLS = DEFAULT_BLOCKED_URLS if _blocked_urls is None else tuple(
+    pattern.strip() for pattern in _blocked_urls.split(",") if pattern.strip()
+)
+# عد الطلبات المحظورة والبايتات المنقولة لكل صفحة من سجل أداء Chrome
+CHART_NETWORK_STATS = os.getenv("CHART_NETWORK_STATS", "1") == "1"
 
-# إعداد البوت
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+# ملف Chrome دافئ (كاش حزم JS الخاصة بـ TradingView) يُنسخ لكل متصفح ويُحفظ في نهاية التشغيل (فارغ = ملف مؤقت جديد)
+CHROME_PROFILE_DIR = os.getenv("CHROME_PROFILE_DIR", "")
+CHROME_PROFILE_SAVE = os.getenv("CHROME_PROFILE_SAVE", "1") == "1"
+# أقفال Chrome وملفات الأعطال لا تُنسخ بين المتصفحات
+PROFILE_COPY_IGNORE = shutil.ignore_patterns("Singleton*", "lockfile", "Crashpad", "*.tmp")
 
 def format_duration(seconds):
     """تحويل الثواني إلى تنسيق مقروء"""
@@ -43,11 +231,231 @@ def format_duration(seconds):
         minutes = (seconds % 3600) / 60
         return f"{hours:.1f} ساعة و {minutes:.0f} دقيقة"
 
-def setup_ultra_fast_driver():
+class TokenBucket:
+    """دلو رموز بسيط لتنظيم معدل الطلبات"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def reserve(self):
+        """حجز رمز وإرجاع زمن الانتظار اللازم قبل استخدامه"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class OutboundDispatcher:
+    """موزع صادر واحد لكل طلبات تليجرام: تنظيم المعدل لكل محادثة، احترام RetryAfter، وترتيب حسب الأولوية"""
+    
+    def __init__(self, bot, chat_rate=TELEGRAM_CHAT_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                 global_rate=TELEGRAM_GLOBAL_RATE, max_retries=TELEGRAM_MAX_RETRIES):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = {}
+        self.max_retries = max_retries
+        self.sequence = itertools.count()
+        self.queue = None
+        self.worker = None
+        self.calls = {}
+        self.retry_after_count = 0
+        self.throttled_time = 0
+        self.failures = 0
+    
+    def start(self):
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.PriorityQueue()
+            self.worker = asyncio.create_task(self._run())
+    
+    async def send(self, method, priority=PRIORITY_REPORT, **kwargs):
+        """جدولة استدعاء Bot API وانتظار نتيجته"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # الرقم التسلسلي يحافظ على ترتيب الوصول داخل نفس الأولوية
+        await self.queue.put((priority, next(self.sequence), method, kwargs, future))
+        return await future
+    
+    async def _pace(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        delay = max(bucket.reserve(), self.global_bucket.reserve())
+        if delay > 0:
+            self.throttled_time += delay
+            await asyncio.sleep(delay)
+    
+    async def _call(self, method, kwargs):
+        from aiogram.exceptions import TelegramRetryAfter
+        
+        for attempt in range(self.max_retries + 1):
+            await self._pace(kwargs.get("chat_id"))
+            try:
+                self.calls[method] = self.calls.get(method, 0) + 1
+                return await getattr(self.bot, method)(**kwargs)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retry_after_count += 1
+                self.throttled_time += e.retry_after
+                logger.warning(f"⏳ تليجرام طلب الانتظار {e.retry_after} ثانية ({method})")
+                await asyncio.sleep(e.retry_after)
+    
+    async def _run(self):
+        while True:
+            priority, _, method, kwargs, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            try:
+                future.set_result(await self._call(method, kwargs))
+            except Exception as e:
+                self.failures += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+    
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.worker
+            self.worker = None
+    
+    def stats(self, since=None):
+        """المجاميع منذ بدء العملية، أو الفرق عن لقطة سابقة من stats() (تقرير تشغيل واحد في الوضع الدائم)"""
+        stats = {
+            "api_calls": sum(self.calls.values()),
+            "calls_by_method": dict(self.calls),
+            "retry_after_count": self.retry_after_count,
+            "throttled_time": self.throttled_time,
+            "failures": self.failures,
+        }
+        if since:
+            for field in ("api_calls", "retry_after_count", "throttled_time", "failures"):
+                stats[field] -= since[field]
+            stats["calls_by_method"] = {
+                method: count - since["calls_by_method"].get(method, 0)
+                for method, count in stats["calls_by_method"].items()
+                if count > since["calls_by_method"].get(method, 0)
+            }
+        return stats
+
+# كل الإرسال إلى تليجرام يمر عبر هذا الموزع (يُربط بالبوت في configure_telegram)
+outbound = OutboundDispatcher(bot)
+
+def configure_telegram():
+    """إنشاء البوت من متغيرات البيئة عند التشغيل؛ aiogram بطيء الاستيراد فلا يُحمّل إلا هنا"""
+    global bot
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        logger.error("❌ بيانات تليجرام غير مضبوطة!")
+        return False
+    
+    from aiogram import Bot
+    if TELEGRAM_API_SERVER:
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        bot = Bot(token=TELEGRAM_BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER)))
+    else:
+        bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    outbound.bot = bot
+    return True
+
+def apply_request_blocking(driver):
+    """تفعيل حظر الطلبات غير الضرورية على التبويب الحالي (أوامر DevTools تخص تبويباً واحداً)"""
+    if not CHART_BLOCKED_URLS:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(CHART_BLOCKED_URLS)})
+
+class NetworkStats:
+    """عدادات الشبكة للصفحات المحملة: الطلبات المحظورة والطلبات والبايتات المنقولة فعلاً"""
+    
+    def __init__(self):
+        self.pages = 0
+        self.blocked_requests = 0
+        self.requests = 0
+        self.transferred_bytes = 0
+    
+    def record(self, blocked, requests, transferred):
+        self.pages += 1
+        self.blocked_requests += blocked
+        self.requests += requests
+        self.transferred_bytes += transferred
+    
+    def stats(self, since=None):
+        """المجاميع منذ بدء العملية، أو الفرق عن لقطة سابقة من stats()"""
+        stats = {
+            "pages": self.pages,
+            "blocked_patterns": len(CHART_BLOCKED_URLS),
+            "blocked_requests": self.blocked_requests,
+            "requests": self.requests,
+            "transferred_bytes": self.transferred_bytes,
+        }
+        if since:
+            for field in ("pages", "blocked_requests", "requests", "transferred_bytes"):
+                stats[field] -= since[field]
+        return stats
+
+network_stats = NetworkStats()
+
+def drain_network_log(driver):
+    """قراءة أحداث الشبكة المتراكمة منذ القراءة السابقة وإرجاع (محظورة، طلبات، بايتات)"""
+    blocked = requests = transferred = 0
+    for entry in driver.get_log("performance"):
+        message = entry["message"]
+        # تصفية نصية سريعة قبل تحليل JSON: السجل يحتوي آلاف الأحداث الأخرى
+        if "Network.loadingFinished" in message:
+            params = json.loads(message)["message"]["params"]
+            requests += 1
+            transferred += int(params.get("encodedDataLength", 0))
+        elif "Network.loadingFailed" in message:
+            params = json.loads(message)["message"]["params"]
+            # setBlockedURLs يظهر بسبب الحظر "inspector"
+            if params.get("blockedReason") == "inspector":
+                blocked += 1
+    return blocked, requests, transferred
+
+def prepare_worker_profile(seed_dir, worker_dir):
+    """نسخة مستقلة من الملف الدافئ لكل متصفح حتى لا تتنافس المتصفحات على أقفال Chrome"""
+    if os.path.isdir(worker_dir):
+        # إعادة التشغيل تحتفظ بالكاش الذي دفّأه هذا المتصفح؛ تُزال فقط أقفال النسخة السابقة
+        for name in os.listdir(worker_dir):
+            if name.startswith("Singleton"):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(worker_dir, name))
+        return
+    if seed_dir and os.path.isdir(seed_dir):
+        shutil.copytree(seed_dir, worker_dir, ignore=PROFILE_COPY_IGNORE, symlinks=True)
+    else:
+        os.makedirs(worker_dir)
+
+def save_profile_seed(worker_dir, seed_dir):
+    """حفظ ملف متصفح دافئ كبذرة للتشغيلات القادمة بدلاً من البذرة السابقة"""
+    staging = seed_dir.rstrip("/") + ".new"
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(worker_dir, staging, ignore=PROFILE_COPY_IGNORE, symlinks=True)
+    shutil.rmtree(seed_dir, ignore_errors=True)
+    os.replace(staging, seed_dir)
+
+def launch_driver(profile_dir=None, seed_dir=None):
+    """تجهيز ملف المتصفح (إن وُجد) ثم تشغيل Chrome؛ تُنفذ داخل خيط الـ slot"""
+    if profile_dir:
+        prepare_worker_profile(seed_dir, profile_dir)
+    return setup_ultra_fast_driver(profile_dir)
+
+def setup_ultra_fast_driver(profile_dir=None):
     """إعداد Chrome Driver محسن للسرعة القصوى"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
     logger.info("🔧 إعداد Chrome Driver السريع...")
     
     chrome_options = Options()
+    if profile_dir:
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
     
     # إعدادات السرعة القصوى
     chrome_options.add_argument("--headless=new")
@@ -98,6 +506,8 @@ def setup_ultra_fast_driver():
     chrome_options.add_experimental_option("prefs", prefs)
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
+    if CHART_NETWORK_STATS:
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
     
     try:
         driver = webdriver.Chrome(options=chrome_options)
@@ -109,256 +519,1698 @@ def setup_ultra_fast_driver():
         # إخفاء أتمتة المتصفح
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
+        apply_request_blocking(driver)
+        
         logger.info("✅ تم إعداد Chrome Driver السريع بنجاح")
         return driver
     except Exception as e:
         logger.error(f"❌ خطأ في إعداد Chrome: {e}")
-        sys.exit(1)
-
-# 📊 قائمة الأسهم الأمريكية المُحدثة (100 سهم)
-STOCKS = [
-    {"symbol": "NVDA", "name": "NVIDIA Corporation", "sector": "Electronic technology"},
-    {"symbol": "MSFT", "name": "Microsoft Corporation", "sector": "Technology services"},
-    {"symbol": "AAPL", "name": "Apple Inc.", "sector": "Electronic technology"},
-    {"symbol": "GOOG", "name": "Alphabet Inc.", "sector": "Technology services"},
-    {"symbol": "AMZN", "name": "Amazon.com, Inc.", "sector": "Retail trade"},
-    {"symbol": "META", "name": "Meta Platforms, Inc.", "sector": "Technology services"},
-    {"symbol": "AVGO", "name": "Broadcom Inc.", "sector": "Electronic technology"},
-    {"symbol": "BRK.A", "name": "Berkshire Hathaway Inc.", "sector": "Finance"},
-    {"symbol": "TSLA", "name": "Tesla, Inc.", "sector": "Consumer durables"},
-    {"symbol": "JPM", "name": "JP Morgan Chase & Co.", "sector": "Finance"},
-    {"symbol": "WMT", "name": "Walmart Inc.", "sector": "Retail trade"},
-    {"symbol": "LLY", "name": "Eli Lilly and Company", "sector": "Health technology"},
-    {"symbol": "ORCL", "name": "Oracle Corporation", "sector": "Technology services"},
-    {"symbol": "V", "name": "Visa Inc.", "sector": "Finance"},
-    {"symbol": "MA", "name": "Mastercard Incorporated", "sector": "Finance"},
-    {"symbol": "NFLX", "name": "Netflix, Inc.", "sector": "Technology services"},
-    {"symbol": "XOM", "name": "Exxon Mobil Corporation", "sector": "Energy minerals"},
-    {"symbol": "COST", "name": "Costco Wholesale Corporation", "sector": "Retail trade"},
-    {"symbol": "JNJ", "name": "Johnson & Johnson", "sector": "Health technology"},
-    {"symbol": "PLTR", "name": "Palantir Technologies Inc.", "sector": "Technology services"},
-    {"symbol": "HD", "name": "Home Depot, Inc. (The)", "sector": "Retail trade"},
-    {"symbol": "PG", "name": "Procter & Gamble Company (The)", "sector": "Consumer non-durables"},
-    {"symbol": "ABBV", "name": "AbbVie Inc.", "sector": "Health technology"},
-    {"symbol": "BAC", "name": "Bank of America Corporation", "sector": "Finance"},
-    {"symbol": "CVX", "name": "Chevron Corporation", "sector": "Energy minerals"},
-    {"symbol": "KO", "name": "Coca-Cola Company (The)", "sector": "Consumer non-durables"},
-    {"symbol": "GE", "name": "GE Aerospace", "sector": "Electronic technology"},
-    {"symbol": "AMD", "name": "Advanced Micro Devices, Inc.", "sector": "Electronic technology"},
-    {"symbol": "BABA", "name": "Alibaba Group Holding Limited", "sector": "Retail trade"},
-    {"symbol": "TMUS", "name": "T-Mobile US, Inc.", "sector": "Communications"},
-    {"symbol": "CSCO", "name": "Cisco Systems, Inc.", "sector": "Electronic technology"},
-    {"symbol": "PM", "name": "Philip Morris International Inc", "sector": "Consumer non-durables"},
-    {"symbol": "WFC", "name": "Wells Fargo & Company", "sector": "Finance"},
-    {"symbol": "CRM", "name": "Salesforce, Inc.", "sector": "Technology services"},
-    {"symbol": "IBM", "name": "International Business Machines Corporation", "sector": "Technology services"},
-    {"symbol": "UNH", "name": "UnitedHealth Group Incorporated", "sector": "Health services"},
-    {"symbol": "ABT", "name": "Abbott Laboratories", "sector": "Health technology"},
-    {"symbol": "MS", "name": "Morgan Stanley", "sector": "Finance"},
-    {"symbol": "LIN", "name": "Linde plc", "sector": "Process industries"},
-    {"symbol": "GS", "name": "Goldman Sachs Group, Inc. (The)", "sector": "Finance"},
-    {"symbol": "INTU", "name": "Intuit Inc.", "sector": "Technology services"},
-    {"symbol": "MCD", "name": "McDonald's Corporation", "sector": "Consumer services"},
-    {"symbol": "DIS", "name": "Walt Disney Company (The)", "sector": "Consumer services"},
-    {"symbol": "RTX", "name": "RTX Corporation", "sector": "Electronic technology"},
-    {"symbol": "AXP", "name": "American Express Company", "sector": "Finance"},
-    {"symbol": "BX", "name": "Blackstone Inc.", "sector": "Finance"},
-    {"symbol": "CAT", "name": "Caterpillar, Inc.", "sector": "Producer manufacturing"},
-    {"symbol": "MRK", "name": "Merck & Company, Inc.", "sector": "Health technology"},
-    {"symbol": "T", "name": "AT&T Inc.", "sector": "Communications"},
-    {"symbol": "PEP", "name": "PepsiCo, Inc.", "sector": "Consumer non-durables"},
-    {"symbol": "NOW", "name": "ServiceNow, Inc.", "sector": "Technology services"},
-    {"symbol": "UBER", "name": "Uber Technologies, Inc.", "sector": "Transportation"},
-    {"symbol": "VZ", "name": "Verizon Communications Inc.", "sector": "Communications"},
-    {"symbol": "BKNG", "name": "Booking Holdings Inc.", "sector": "Consumer services"},
-    {"symbol": "GEV", "name": "GE Vernova Inc.", "sector": "Producer manufacturing"},
-    {"symbol": "TMO", "name": "Thermo Fisher Scientific Inc", "sector": "Health technology"},
-    {"symbol": "SCHW", "name": "Charles Schwab Corporation (The)", "sector": "Finance"},
-    {"symbol": "BLK", "name": "BlackRock, Inc.", "sector": "Finance"},
-    {"symbol": "SPGI", "name": "S&P Global Inc.", "sector": "Commercial services"},
-    {"symbol": "ISRG", "name": "Intuitive Surgical, Inc.", "sector": "Health technology"},
-    {"symbol": "C", "name": "Citigroup, Inc.", "sector": "Finance"},
-    {"symbol": "BA", "name": "Boeing Company (The)", "sector": "Electronic technology"},
-    {"symbol": "TXN", "name": "Texas Instruments Incorporated", "sector": "Electronic technology"},
-    {"symbol": "SHOP", "name": "Shopify Inc.", "sector": "Commercial services"},
-    {"symbol": "AMGN", "name": "Amgen Inc.", "sector": "Health technology"},
-    {"symbol": "QCOM", "name": "QUALCOMM Incorporated", "sector": "Electronic technology"},
-    {"symbol": "PDD", "name": "PDD Holdings Inc.", "sector": "Retail trade"},
-    {"symbol": "BSX", "name": "Boston Scientific Corporation", "sector": "Health technology"},
-    {"symbol": "ACN", "name": "Accenture plc", "sector": "Technology services"},
-    {"symbol": "ANET", "name": "Arista Networks, Inc.", "sector": "Electronic technology"},
-    {"symbol": "NEE", "name": "NextEra Energy, Inc.", "sector": "Utilities"},
-    {"symbol": "SYK", "name": "Stryker Corporation", "sector": "Health technology"},
-    {"symbol": "ARM", "name": "Arm Holdings plc", "sector": "Electronic technology"},
-    {"symbol": "AMAT", "name": "Applied Materials, Inc.", "sector": "Producer manufacturing"},
-    {"symbol": "ADBE", "name": "Adobe Inc.", "sector": "Technology services"},
-    {"symbol": "TJX", "name": "TJX Companies, Inc. (The)", "sector": "Retail trade"},
-    {"symbol": "DHR", "name": "Danaher Corporation", "sector": "Health technology"},
-    {"symbol": "PGR", "name": "Progressive Corporation (The)", "sector": "Finance"},
-    {"symbol": "PFE", "name": "Pfizer, Inc.", "sector": "Health technology"},
-    {"symbol": "HON", "name": "Honeywell International Inc.", "sector": "Electronic technology"},
-    {"symbol": "GILD", "name": "Gilead Sciences, Inc.", "sector": "Health technology"},
-    {"symbol": "ETN", "name": "Eaton Corporation, PLC", "sector": "Producer manufacturing"},
-    {"symbol": "DE", "name": "Deere & Company", "sector": "Producer manufacturing"},
-    {"symbol": "COF", "name": "Capital One Financial Corporation", "sector": "Finance"},
-    {"symbol": "LOW", "name": "Lowe's Companies, Inc.", "sector": "Retail trade"},
-    {"symbol": "UNP", "name": "Union Pacific Corporation", "sector": "Transportation"},
-    {"symbol": "APH", "name": "Amphenol Corporation", "sector": "Electronic technology"},
-    {"symbol": "SPOT", "name": "Spotify Technology S.A.", "sector": "Technology services"},
-    {"symbol": "APP", "name": "Applovin Corporation", "sector": "Technology services"},
-    {"symbol": "KKR", "name": "KKR & Co. Inc.", "sector": "Finance"},
-    {"symbol": "LRCX", "name": "Lam Research Corporation", "sector": "Producer manufacturing"},
-    {"symbol": "MELI", "name": "MercadoLibre, Inc.", "sector": "Retail trade"},
-    {"symbol": "MU", "name": "Micron Technology, Inc.", "sector": "Electronic technology"},
-    {"symbol": "ADP", "name": "Automatic Data Processing, Inc.", "sector": "Technology services"},
-    {"symbol": "CMCSA", "name": "Comcast Corporation", "sector": "Consumer services"},
-    {"symbol": "COP", "name": "ConocoPhillips", "sector": "Energy minerals"},
-    {"symbol": "KLAC", "name": "KLA Corporation", "sector": "Electronic technology"},
-    {"symbol": "SNPS", "name": "Synopsys, Inc.", "sector": "Technology services"},
-    {"symbol": "MDT", "name": "Medtronic plc.", "sector": "Health technology"},
-    {"symbol": "WELL", "name": "Welltower Inc.", "sector": "Finance"},
-    {"symbol": "PANW", "name": "Palo Alto Networks, Inc.", "sector": "Technology services"},
-    {"symbol": "BN", "name": "Brookfield Corporation", "sector": "Finance"},
-    {"symbol": "CRWD", "name": "CrowdStrike Holdings, Inc.", "sector": "Technology services"},
-    {"symbol": "NKE", "name": "Nike, Inc.", "sector": "Consumer non-durables"},
-    {"symbol": "ADI", "name": "Analog Devices, Inc.", "sector": "Electronic technology"},
-    {"symbol": "DASH", "name": "DoorDash, Inc.", "sector": "Transportation"},
-    {"symbol": "CEG", "name": "Constellation Energy Corporation", "sector": "Utilities"},
-    {"symbol": "ICE", "name": "Intercontinental Exchange Inc.", "sector": "Finance"}
-]
-
-# مجموعة أسهم NASDAQ للسرعة
-NASDAQ_SET = {
-    'AAPL', 'MSFT', 'GOOG', 'GOOGL', 'AMZN', 'META', 'NVDA', 'NFLX', 
-    'ADBE', 'CRM', 'ORCL', 'CSCO', 'INTC', 'AMD', 'QCOM', 'AVGO', 
-    'TXN', 'COST', 'SBUX', 'PYPL', 'ZOOM', 'DOCU', 'PLTR', 'BABA',
-    'TMUS', 'INTU', 'NOW', 'UBER', 'BKNG', 'ISRG', 'SHOP', 'PDD',
-    'ANET', 'ARM', 'AMAT', 'PANW', 'CRWD', 'DASH', 'SPOT', 'APP',
-    'LRCX', 'MELI', 'MU', 'ADP', 'CMCSA', 'KLAC', 'SNPS', 'WELL'
-}
+        raise
+
+# سجل مضغوط لكل سهم: tuple بأسماء حقول بدلاً من dict لكل سهم
+Stock = collections.namedtuple("Stock", ["symbol", "name", "sector", "exchange"])
+
+def chart_url(exchange, symbol, interval=CHART_INTERVAL, style=CHART_STYLE):
+    """رابط شارت السهم بإطار ونوع محددين"""
+    return CHART_URL_TEMPLATE.format(exchange=exchange, symbol=symbol.replace('.', '-'), interval=interval, style=style)
+
+def load_stock_universe(path):
+    """قراءة قائمة الأسهم سطراً بسطر مع بناء فهرس الرمز ← الرابط ورفض الرموز بلا بورصة معروفة"""
+    stocks = []
+    urls = {}
+    rejected = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            symbol = row["symbol"].strip().upper()
+            exchange = row.get("exchange", "").strip().upper()
+            if exchange not in KNOWN_EXCHANGES or not symbol or symbol in urls:
+                rejected.append(symbol or "?")
+                continue
+            # القطاعات والبورصات تتكرر آلاف المرات: نسخة واحدة من كل نص
+            stock = Stock(symbol, row["name"].strip(), sys.intern(row["sector"].strip()), sys.intern(exchange))
+            stocks.append(stock)
+            urls[symbol] = chart_url(exchange, symbol)
+    if rejected:
+        logger.warning(f"⚠️ رُفض {len(rejected)} رمز بلا بورصة معروفة أو مكرر: {', '.join(rejected[:20])}")
+    return tuple(stocks), urls, rejected
+
+# 📊 قائمة الأسهم الأمريكية وفهرس روابط الشارتات
+STOCKS, CHART_URLS, REJECTED_SYMBOLS = load_stock_universe(STOCK_UNIVERSE_FILE)
+
+def open_browser_tabs(driver, count):
+    """فتح تبويبات إضافية في نفس المتصفح وإرجاع معرفات النوافذ"""
+    handles = [driver.current_window_handle]
+    for _ in range(count - 1):
+        driver.switch_to.new_window("tab")
+        apply_request_blocking(driver)
+        handles.append(driver.current_window_handle)
+    return handles
+
+def replace_browser_tab(driver, old_handle):
+    """فتح تبويب جديد مكان تبويب قديم وإغلاق القديم"""
+    driver.switch_to.window(old_handle)
+    driver.switch_to.new_window("tab")
+    apply_request_blocking(driver)
+    new_handle = driver.current_window_handle
+    driver.switch_to.window(old_handle)
+    driver.close()
+    driver.switch_to.window(new_handle)
+    return new_handle
+
+def process_tree_rss_mb(root_pid):
+    """ذاكرة RSS لعملية ChromeDriver وكل عمليات Chrome التابعة لها بالميغابايت (Linux فقط)"""
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0
+    
+    children = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # اسم العملية بين قوسين وقد يحتوي مسافات، و ppid هو الحقل الثاني بعده
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    
+    total_kb = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+        stack.extend(children.get(pid, []))
+    return total_kb / 1024
+
+class ChartTab:
+    """تبويب واحد داخل متصفح: هذا ما يُعار للـ worker"""
+    
+    def __init__(self, slot, handle):
+        self.slot = slot
+        self.handle = handle
+    
+    @property
+    def driver(self):
+        return self.slot.driver
+    
+    @property
+    def executor(self):
+        return self.slot.executor
+    
+    @property
+    def multi_tab(self):
+        return len(self.slot.tabs) > 1
+    
+    def _run_on_tab(self, func, args):
+        # التبديل فقط عند الحاجة: كل تبديل رحلة إضافية إلى المتصفح
+        if self.slot.current_handle != self.handle:
+            self.slot.driver.switch_to.window(self.handle)
+            self.slot.current_handle = self.handle
+        return func(*args)
+    
+    async def run(self, func, *args):
+        """تنفيذ أمر WebDriver على هذا التبويب داخل خيط المتصفح"""
+        return await run_in_driver_thread(self.executor, self._run_on_tab, func, args)
+
+class DriverSlot:
+    """متصفح واحد مع خيط التنفيذ المخصص له وتبويباته وعدد الصفحات التي حمّلها"""
+    
+    def __init__(self, slot_id):
+        self.slot_id = slot_id
+        self.driver = None
+        self.pages = 0
+        self.tabs = []
+        self.current_handle = None
+        # التبويبات المُعارة حالياً، والمركونة بانتظار إعادة تشغيل المتصفح
+        self.leased = 0
+        self.parked = []
+        self.relaunch_reason = None
+        self.profile_dir = None
+        self.executor = self._new_executor()
+    
+    def _new_executor(self):
+        # خيط واحد لكل driver: أوامر WebDriver حاجبة وليست آمنة للخيوط
+        return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"driver-{self.slot_id}")
+    
+    def reset_executor(self):
+        """استبدال الخيط (قد يكون عالقاً في أمر على driver ميت)"""
+        self.executor.shutdown(wait=False)
+        self.executor = self._new_executor()
+
+class DriverPool:
+    """مجموعة متصفحات تُشغَّل بالتوازي وتُعار تبويباتها للـ workers مع فحص الصحة وإعادة التدوير"""
+    
+    def __init__(self, size, max_pages=DRIVER_MAX_PAGES, tabs_per_browser=TABS_PER_BROWSER):
+        self.size = size
+        self.max_pages = max_pages
+        self.tabs_per_browser = tabs_per_browser
+        self.slots = []
+        self.idle = asyncio.Queue()
+        self.startup_time = 0
+        self.recycle_count = 0
+        self.replacement_count = 0
+        self.fresh_count = 0
+        self.launch_failures = 0
+        self.releases = 0
+        self.peak_memory_mb = 0
+        self.profile_seed = CHROME_PROFILE_DIR
+        self.profile_root = None
+        self.profile_seeded = False
+        self.next_slot_id = size
+        self.peak_drivers = 0
+        self.retired_count = 0
+    
+    def tab_count(self):
+        return sum(len(slot.tabs) for slot in self.slots)
+    
+    async def start(self):
+        """تشغيل جميع المتصفحات بالتوازي؛ يكفي نجاح واحد منها للمتابعة"""
+        start_time = time.time()
+        logger.info(f"🔧 تشغيل {self.size} drivers بالتوازي ({self.tabs_per_browser} تبويب لكل متصفح)...")
+        
+        slots = [DriverSlot(i) for i in range(self.size)]
+        if self.profile_seed:
+            self.profile_seeded = os.path.isdir(self.profile_seed)
+            self.profile_root = tempfile.mkdtemp(prefix="chart-profiles-")
+            for slot in slots:
+                slot.profile_dir = os.path.join(self.profile_root, f"worker-{slot.slot_id}")
+            state = "دافئ" if self.profile_seeded else "جديد (سيُحفظ في نهاية التشغيل)"
+            logger.info(f"🔥 ملف المتصفح {self.profile_seed}: {state}")
+        launched = await asyncio.gather(*(self._launch(slot) for slot in slots))
+        
+        for slot, ok in zip(slots, launched):
+            if ok:
+                self.slots.append(slot)
+                logger.info(f"✅ Driver {slot.slot_id + 1} جاهز")
+            else:
+                slot.executor.shutdown(wait=False)
+        
+        self.startup_time = time.time() - start_time
+        if not self.slots:
+            raise RuntimeError("تعذر تشغيل أي Chrome Driver")
+        
+        # ترتيب دوري: التبويب الأول من كل متصفح ثم الثاني... حتى يتوزع الحمل على المتصفحات
+        for index in range(self.tabs_per_browser):
+            for slot in self.slots:
+                if index < len(slot.tabs):
+                    self.idle.put_nowait(slot.tabs[index])
+        
+        self.sample_memory()
+        self.peak_drivers = len(self.slots)
+        logger.info(f"🚀 {len(self.slots)}/{self.size} drivers جاهزة في {format_duration(self.startup_time)}")
+    
+    async def grow(self):
+        """تشغيل متصفح إضافي أثناء التشغيل وإتاحة تبويباته فوراً"""
+        slot = DriverSlot(self.next_slot_id)
+        self.next_slot_id += 1
+        if self.profile_root:
+            slot.profile_dir = os.path.join(self.profile_root, f"worker-{slot.slot_id}")
+        if not await self._launch(slot):
+            slot.executor.shutdown(wait=False)
+            return False
+        self.slots.append(slot)
+        for tab in slot.tabs:
+            self.idle.put_nowait(tab)
+        self.peak_drivers = max(self.peak_drivers, len(self.slots))
+        logger.info(f"➕ Driver {slot.slot_id + 1} أُضيف إلى المجموعة ({len(self.slots)} متصفح)")
+        return True
+    
+    def retire(self):
+        """تعليم آخر متصفح للإغلاق عند عودة كل تبويباته (يبقى متصفح واحد على الأقل)"""
+        active = [slot for slot in self.slots if slot.relaunch_reason is None]
+        if len(active) <= 1:
+            return False
+        active[-1].relaunch_reason = "retire"
+        return True
+    
+    async def _launch(self, slot):
+        """تشغيل Chrome وفتح تبويباته داخل خيط الـ slot مع إعادة المحاولة"""
+        for attempt in range(1, DRIVER_LAUNCH_ATTEMPTS + 1):
+            try:
+                slot.driver = await run_in_driver_thread(slot.executor, launch_driver, slot.profile_dir, self.profile_seed)
+                handles = await run_in_driver_thread(slot.executor, open_browser_tabs, slot.driver, self.tabs_per_browser)
+                slot.tabs = [ChartTab(slot, handle) for handle in handles]
+                slot.current_handle = handles[-1]
+                slot.pages = 0
+                slot.leased = 0
+                slot.parked = []
+                slot.relaunch_reason = None
+                return True
+            except Exception as e:
+                self.launch_failures += 1
+                logger.warning(f"⚠️ فشل تشغيل Driver {slot.slot_id + 1} (محاولة {attempt}/{DRIVER_LAUNCH_ATTEMPTS}): {e}")
+                await self._quit(slot)
+        slot.driver = None
+        slot.tabs = []
+        return False
+    
+    async def _quit(self, slot):
+        if slot.driver is None:
+            return
+        try:
+            await asyncio.wait_for(run_in_driver_thread(slot.executor, slot.driver.quit), timeout=DRIVER_HEALTH_TIMEOUT)
+        except Exception:
+            pass
+        slot.driver = None
+    
+    async def _is_alive(self, slot):
+        try:
+            await asyncio.wait_for(
+                run_in_driver_thread(slot.executor, lambda: slot.driver.current_url),
+                timeout=DRIVER_HEALTH_TIMEOUT
+            )
+            return True
+        except Exception:
+            return False
+    
+    async def _relaunch(self, slot):
+        """إعادة تشغيل المتصفح وإرجاع تبويباته الجديدة (قائمة فارغة إذا فشل التشغيل)"""
+        await self._quit(slot)
+        slot.reset_executor()
+        if await self._launch(slot):
+            return list(slot.tabs)
+        return []
+    
+    async def _replace_tab(self, tab):
+        """تبويب جديد لإعادة المحاولة بدلاً من إعادة تشغيل متصفح تعمل فيه تبويبات أخرى"""
+        tab.handle = await run_in_driver_thread(tab.executor, replace_browser_tab, tab.driver, tab.handle)
+        tab.slot.current_handle = tab.handle
+    
+    async def acquire(self, fresh=False):
+        """استعارة تبويب سليم؛ يُعاد تدوير المتصفح إذا تجاوز حد الصفحات ويُستبدل إذا مات. مع fresh يكون التبويب المُعاد دائماً جديداً (تبويب مستبدل أو متصفح أُعيد تشغيله)"""
+        while True:
+            if not self.slots:
+                raise RuntimeError("لا توجد drivers صالحة في المجموعة")
+            
+            tab = await self.idle.get()
+            if tab is None:
+                # المجموعة فرغت: تمرير الإشارة لمن ينتظر بعده ثم الفشل بدل الانتظار إلى الأبد
+                if self.slots:
+                    continue
+                self.idle.put_nowait(None)
+                raise RuntimeError("لا توجد drivers صالحة في المجموعة")
+            slot = tab.slot
+            # تبويب من متصفح أُعيد تشغيله أو أُزيل
+            if slot not in self.slots or tab not in slot.tabs:
+                continue
+            
+            reason = slot.relaunch_reason
+            if reason is None and fresh and tab.multi_tab:
+                try:
+                    await self._replace_tab(tab)
+                    logger.info(f"🆕 تبويب جديد في Driver {slot.slot_id + 1} لإعادة المحاولة")
+                    self.fresh_count += 1
+                    slot.leased += 1
+                    return tab
+                except Exception:
+                    reason = "dead"
+            
+            if reason is None:
+                if fresh:
+                    reason = "fresh"
+                elif slot.pages >= self.max_pages:
+                    reason = "recycle"
+                elif not await self._is_alive(slot):
+                    reason = "dead"
+            
+            if reason is None:
+                slot.leased += 1
+                return tab
+            
+            # لا يُعاد تشغيل المتصفح بينما تبويب آخر فيه قيد الاستخدام
+            slot.relaunch_reason = reason
+            slot.parked.append(tab)
+            if slot.leased > 0:
+                continue
+            
+            if reason == "retire":
+                await self._quit(slot)
+                slot.executor.shutdown(wait=False)
+                self._remove(slot)
+                self.retired_count += 1
+                logger.info(f"➖ Driver {slot.slot_id + 1} أُغلق لتقليص التوازي ({len(self.slots)} متصفح)")
+                continue
+            
+            if reason == "fresh":
+                logger.info(f"🆕 تشغيل Driver {slot.slot_id + 1} من جديد لإعادة المحاولة")
+                self.fresh_count += 1
+            elif reason == "recycle":
+                logger.info(f"♻️ إعادة تدوير Driver {slot.slot_id + 1} بعد {slot.pages} صفحة")
+                self.recycle_count += 1
+            else:
+                logger.warning(f"💀 Driver {slot.slot_id + 1} لا يستجيب - جاري الاستبدال")
+                self.replacement_count += 1
+            
+            tabs = await self._relaunch(slot)
+            if not tabs:
+                logger.error(f"❌ إزالة Driver {slot.slot_id + 1} من المجموعة")
+                self._remove(slot)
+                continue
+            
+            # المتصفح الذي أُعيد تشغيله للتو جديد أياً كان السبب: من طلب تبويباً جديداً يأخذ أول تبويب فيه
+            if fresh or reason == "fresh":
+                tab, tabs = tabs[0], tabs[1:]
+            for other in tabs:
+                self.idle.put_nowait(other)
+            if fresh or reason == "fresh":
+                slot.leased += 1
+                return tab
+    
+    def _remove(self, slot):
+        """إزالة متصفح من المجموعة؛ عند خروج آخر متصفح تُوقظ الـ workers المنتظرة على idle.get() بإشارة None"""
+        self.slots.remove(slot)
+        if not self.slots:
+            self.idle.put_nowait(None)
+    
+    def release(self, tab):
+        """إعادة التبويب إلى المجموعة بعد استخدامه لصفحة واحدة"""
+        slot = tab.slot
+        slot.pages += 1
+        slot.leased -= 1
+        self.releases += 1
+        if self.releases % 10 == 0:
+            self.sample_memory()
+        self.idle.put_nowait(tab)
+    
+    @contextlib.asynccontextmanager
+    async def lease(self, fresh=False):
+        tab = await self.acquire(fresh)
+        try:
+            yield tab
+        finally:
+            self.release(tab)
+    
+    def sample_memory(self):
+        """قياس ذاكرة جميع المتصفحات وتحديث الذروة"""
+        total = 0
+        for slot in self.slots:
+            try:
+                total += process_tree_rss_mb(slot.driver.service.process.pid)
+            except Exception:
+                pass
+        self.peak_memory_mb = max(self.peak_memory_mb, total)
+        return total
+    
+    async def close(self):
+        """إغلاق جميع الـ drivers وحفظ ملف متصفح دافئ للتشغيل القادم"""
+        self.sample_memory()
+        for slot in self.slots:
+            await self._quit(slot)
+            slot.executor.shutdown(wait=False)
+            logger.info(f"🔒 تم إغلاق Driver {slot.slot_id + 1}")
+        
+        if self.profile_root:
+            if CHROME_PROFILE_SAVE and self.slots:
+                try:
+                    await asyncio.to_thread(save_profile_seed, self.slots[0].profile_dir, self.profile_seed)
+                    logger.info(f"🔥 تم حفظ ملف المتصفح الدافئ في {self.profile_seed}")
+                except OSError as e:
+                    logger.warning(f"⚠️ تعذر حفظ ملف المتصفح: {e}")
+            shutil.rmtree(self.profile_root, ignore_errors=True)
+            self.profile_root = None
+        self.slots.clear()
+    
+    def reset_counters(self):
+        """تصفير عدادات التقرير مع إبقاء المتصفحات؛ التشغيل على متصفحات دافئة لا يدفع زمن تشغيلها"""
+        self.startup_time = 0
+        self.recycle_count = 0
+        self.replacement_count = 0
+        self.fresh_count = 0
+        self.launch_failures = 0
+        self.retired_count = 0
+        self.peak_memory_mb = 0
+        self.peak_drivers = len(self.slots)
+        self.sample_memory()
+    
+    def stats(self):
+        return {
+            "startup_time": self.startup_time,
+            "drivers": len(self.slots),
+            "peak_drivers": self.peak_drivers,
+            "retired_count": self.retired_count,
+            "tabs_per_browser": self.tabs_per_browser,
+            "recycle_count": self.recycle_count,
+            "replacement_count": self.replacement_count,
+            "fresh_count": self.fresh_count,
+            "launch_failures": self.launch_failures,
+            "peak_memory_mb": self.peak_memory_mb,
+            "profile": ("warm" if self.profile_seeded else "cold") if self.profile_seed else "off",
+        }
+
+class RetryLane:
+    """مسار إعادة المحاولة: السهم الفاشل يعود بعد تأخير متزايد ضمن حد للمحاولات وميزانية زمنية كلية"""
+    
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, budget=RETRY_BUDGET_SECONDS):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.spent = 0
+        self.queue = asyncio.Queue()
+        # المحاولات المجدولة أو المنتظرة أو الجارية: الـ workers لا تنتهي قبل أن تصبح صفراً
+        self.pending = 0
+        self.changed = asyncio.Event()
+        self.scheduled_count = 0
+    
+    def schedule(self, stock, attempt):
+        """جدولة محاولة جديدة إذا سمح الحد والميزانية؛ تُرجع False إذا كانت النتيجة نهائية"""
+        if attempt >= self.max_attempts or self.spent >= self.budget:
+            return False
+        
+        delay = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        self.pending += 1
+        self.scheduled_count += 1
+        logger.info(f"🔁 إعادة محاولة {stock.symbol} بعد {delay} ثانية (المحاولة {attempt + 1}/{self.max_attempts})")
+        asyncio.get_running_loop().call_later(delay, self._enqueue, stock, attempt + 1)
+        return True
+    
+    def _enqueue(self, stock, attempt):
+        # وقت الإتاحة يُسجل لقياس انتظار الطابور بعد انتهاء مهلة التأخير
+        self.queue.put_nowait((stock, attempt, time.time()))
+        self.changed.set()
+    
+    async def get(self):
+        """انتظار المحاولة التالية، أو None عندما لا تتبقى محاولات معلقة"""
+        while True:
+            if not self.queue.empty():
+                return self.queue.get_nowait()
+            if self.pending == 0:
+                return None
+            self.changed.clear()
+            await self.changed.wait()
+    
+    def done(self, duration):
+        """انتهاء محاولة إعادة (بعد جدولة ما يليها إن وُجد)"""
+        self.spent += duration
+        self.pending -= 1
+        self.changed.set()
+
+def system_pressure():
+    """الحمل لكل نواة (متوسط دقيقة) والذاكرة المتاحة بالميغابايت؛ None لما لا يمكن قياسه"""
+    try:
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        load = None
+    free_mb = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    free_mb = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        pass
+    return load, free_mb
+
+class ConcurrencyController:
+    """حد قابل للتعديل لعدد الالتقاطات المتزامنة: زيادة جمعية ما دام النظام سليماً وخفض ضربي عند الضغط (AIMD)"""
+    
+    def __init__(self, pool, initial, minimum=ADAPTIVE_MIN_WORKERS, maximum=ADAPTIVE_MAX_WORKERS, adaptive=ADAPTIVE_WORKERS):
+        self.pool = pool
+        self.adaptive = adaptive
+        self.minimum = min(minimum, initial) if adaptive else initial
+        self.maximum = max(maximum, initial) if adaptive else initial
+        self.initial = initial
+        self.limit = initial
+        self.peak = initial
+        self.active = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+        self.start_time = time.time()
+        self.best_latency = None
+        self.decisions = []
+        self.growing = None
+        self._reset_window()
+    
+    def new_run(self):
+        """سجل قرارات جديد يبدأ من الحد الحالي (تشغيل جديد في الوضع الدائم)"""
+        self.initial = self.limit
+        self.peak = self.limit
+        self.decisions = []
+        self.start_time = time.time()
+        self._reset_window()
+    
+    def _reset_window(self):
+        self.completed = 0
+        self.failed = 0
+        self.latencies = []
+    
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """تصريح التقاط واحد؛ الـ workers الزائدة عن الحد تنتظر هنا"""
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.active < self.limit)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+    
+    def observe(self, result):
+        """تسجيل نتيجة التقاط في نافذة القرار الحالية"""
+        self.completed += 1
+        if not result["success"]:
+            self.failed += 1
+        elif result.get("ready_time") is not None:
+            self.latencies.append(result["ready_time"])
+    
+    async def run(self, interval=ADAPTIVE_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.evaluate()
+    
+    async def evaluate(self):
+        """قرار واحد: زيادة أو خفض أو إبقاء الحد، ويُسجل مع القياسات التي بُني عليها"""
+        if self.completed < ADAPTIVE_MIN_SAMPLES:
+            return
+        
+        failure_rate = self.failed / self.completed
+        latency = sum(self.latencies) / len(self.latencies) if self.latencies else None
+        load, free_mb = system_pressure()
+        
+        reason = None
+        if failure_rate > ADAPTIVE_MAX_FAILURE_RATE:
+            reason = "failures"
+        elif free_mb is not None and free_mb < ADAPTIVE_MIN_FREE_MB:
+            reason = "memory"
+        elif load is not None and load > ADAPTIVE_MAX_LOAD:
+            reason = "load"
+        elif latency is not None and self.best_latency and latency > self.best_latency * ADAPTIVE_LATENCY_FACTOR:
+            reason = "latency"
+        
+        previous = self.limit
+        if reason and self.limit > self.minimum:
+            self.limit = max(self.minimum, min(self.limit - 1, int(self.limit * ADAPTIVE_DECREASE_FACTOR)))
+            action = "decrease"
+        elif reason:
+            action = "hold"
+        elif self.waiting and self.limit < self.maximum:
+            self.limit += 1
+            action = "increase"
+            reason = "healthy"
+        else:
+            action = "hold"
+            reason = "at_max" if self.limit >= self.maximum else "no_demand"
+        
+        if latency is not None and not (action == "decrease" and reason == "latency"):
+            self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+        
+        self.decisions.append({
+            "at": time.time() - self.start_time,
+            "action": action,
+            "reason": reason,
+            "limit": self.limit,
+            "completed": self.completed,
+            "failure_rate": failure_rate,
+            "latency": latency,
+            "load": load,
+            "free_mb": free_mb,
+        })
+        self._reset_window()
+        
+        # المواءمة في كل قرار: متصفح أُضيف في الخلفية بعد خفض الحد يُغلق في القرار التالي
+        self._resize_pool()
+        if action != "hold":
+            logger.info(f"🎚️ التوازي {previous} ← {self.limit} ({reason}: فشل {failure_rate:.0%}، رسم {format_duration(latency or 0)})")
+            self.peak = max(self.peak, self.limit)
+            async with self.condition:
+                self.condition.notify_all()
+    
+    def _resize_pool(self):
+        """مواءمة عدد المتصفحات مع الحد: تشغيل متصفح في الخلفية عند النقص وإغلاق الزائد عند عودة تبويباته"""
+        needed = -(-self.limit // self.pool.tabs_per_browser)
+        active = [slot for slot in self.pool.slots if slot.relaunch_reason != "retire"]
+        if len(active) < needed and (self.growing is None or self.growing.done()):
+            self.growing = asyncio.create_task(self.pool.grow())
+        elif len(active) > needed:
+            self.pool.retire()
+    
+    async def close(self):
+        if self.growing is not None:
+            with contextlib.suppress(Exception):
+                await self.growing
+    
+    def stats(self):
+        return {
+            "adaptive": self.adaptive,
+            "initial": self.initial,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "final": self.limit,
+            "peak": self.peak,
+            "decisions": self.decisions,
+        }
 
 class UltraFastStockProcessor:
     def __init__(self, max_workers=3):
         self.max_workers = max_workers
-        self.drivers = []
-        self.results_queue = Queue()
-        
-    def create_driver_pool(self):
-        """إنشاء مجموعة من الـ drivers"""
-        logger.info(f"🔧 إنشاء {self.max_workers} drivers...")
-        for i in range(self.max_workers):
-            driver = setup_ultra_fast_driver()
-            self.drivers.append(driver)
-            logger.info(f"✅ Driver {i+1} جاهز")
-    
-    def cleanup_drivers(self):
-        """تنظيف جميع الـ drivers"""
-        for i, driver in enumerate(self.drivers):
-            try:
-                driver.quit()
-                logger.info(f"🔒 تم إغلاق Driver {i+1}")
-            except:
-                pass
-        self.drivers.clear()
+        self.pool = DriverPool(max_workers)
+        self.controller = None
+        self.retry_lane = RetryLane()
+        # النتائج تُبث هنا فور اكتمال كل سهم
+        self.results_queue = asyncio.Queue()
+        # زمن العمل الفعلي لكل worker (كل المحاولات) لحساب نسبة الاستغلال
+        self.worker_busy = {}
+        # معالجة الصور ثقيلة على المعالج فتعمل في عمليات منفصلة بعيداً عن حلقة asyncio
+        self.image_pool = None
+        if CHART_IMAGE_FORMAT != "off":
+            self.image_pool = concurrent.futures.ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        
+    def new_run(self):
+        """تصفير حالة التشغيل مع إبقاء المتصفحات وعمليات الصور (للوضع الدائم)"""
+        self.retry_lane = RetryLane()
+        self.results_queue = asyncio.Queue()
+        self.worker_busy = {}
+        self.pool.reset_counters()
+        if self.controller:
+            self.controller.new_run()
+    
+    async def create_driver_pool(self):
+        """تشغيل مجموعة الـ drivers ثم ضبط حد التوازي على عدد تبويباتها"""
+        await self.pool.start()
+        self.controller = ConcurrencyController(self.pool, self.pool.tab_count())
+    
+    async def cleanup_drivers(self):
+        """تنظيف جميع الـ drivers وعمليات معالجة الصور"""
+        if self.controller:
+            await self.controller.close()
+        await self.pool.close()
+        if self.image_pool:
+            self.image_pool.shutdown(wait=False, cancel_futures=True)
+
+async def run_in_driver_thread(executor, func, *args):
+    """تنفيذ أمر WebDriver حاجب في خيط الـ driver الخاص دون تجميد حلقة asyncio"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
 
-async def capture_ultra_fast_chart(stock_info, driver, worker_id):
+# مراحل الشارت الواحد بالترتيب كما تظهر في التقرير
+SPAN_STAGES = {
+    "queue_wait": "انتظار الطابور",
+    "lease": "استعارة المتصفح",
+    "navigate": "التنقل",
+    "render_wait": "انتظار الرسم",
+    "screenshot": "لقطة الشاشة",
+    "switch": "تبديل الإطار في نفس الصفحة",
+    "encode": "فحص الصورة والبصمة",
+    "renko": "حساب طوب الرينكو",
+    "render": "رسم الشارت محلياً",
+    "image": "قص الصورة وضغطها",
+    "delivery_wait": "انتظار الإرسال",
+    "send": "الإرسال إلى تليجرام",
+}
+# حدود فئات المدرج التكراري بالثواني (الأخيرة مفتوحة)
+SPAN_HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+class StageTimer:
+    """تسجيل زمن كل مرحلة لشارت واحد كقائمة [المرحلة، البداية، المدة]"""
+    
+    def __init__(self):
+        self.spans = []
+    
+    def add(self, stage, start, end=None):
+        end = time.time() if end is None else end
+        self.spans.append([stage, start, end - start])
+    
+    @contextlib.contextmanager
+    def span(self, stage):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, start)
+
+def percentile(values, fraction):
+    """النسبة المئوية بطريقة أقرب رتبة"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def stage_statistics(records):
+    """تجميع مدد المراحل من كل النتائج: p50/p95/p99 والمجموع ومدرج تكراري لكل مرحلة"""
+    durations = {}
+    for record in records:
+        for stage, _, duration in record.get("spans", []):
+            durations.setdefault(stage, []).append(duration)
+    
+    stats = {}
+    for stage in SPAN_STAGES:
+        values = durations.get(stage)
+        if not values:
+            continue
+        histogram = [0] * (len(SPAN_HISTOGRAM_BUCKETS) + 1)
+        for value in values:
+            histogram[sum(value > edge for edge in SPAN_HISTOGRAM_BUCKETS)] += 1
+        stats[stage] = {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "max": max(values),
+            "histogram": histogram,
+        }
+    return stats
+
+def cold_start_statistics(records):
+    """مقارنة زمن أول شارت على كل متصفح بزمن بقية الشارتات (فرق البدء البارد)"""
+    successful = [record for record in records if record["success"]]
+    first = [record["duration"] for record in successful if record.get("first_on_driver")]
+    steady = [record["duration"] for record in successful if not record.get("first_on_driver")]
+    first_p50 = percentile(first, 0.50)
+    steady_p50 = percentile(steady, 0.50)
+    return {
+        "first_count": len(first),
+        "first_p50": first_p50,
+        "steady_p50": steady_p50,
+        "penalty": first_p50 - steady_p50 if first and steady else 0,
+    }
+
+def image_statistics(records):
+    """حجم الصور قبل المعالجة وبعدها للشارتات المرفوعة فعلاً"""
+    processed = [record for record in records if record.get("sent_bytes")]
+    raw_bytes = sum(record["raw_bytes"] for record in processed)
+    sent_bytes = sum(record["sent_bytes"] for record in processed)
+    return {
+        "format": CHART_IMAGE_FORMAT,
+        "processed": len(processed),
+        "raw_bytes": raw_bytes,
+        "sent_bytes": sent_bytes,
+        "saved_ratio": 1 - sent_bytes / raw_bytes if raw_bytes else 0,
+    }
+
+def variant_statistics(records):
+    """زمن تبديل الإطار في نفس الصفحة مقابل زمن تحميل الصفحة الأولى (التنقل + انتظار الرسم) والوقت الموفر"""
+    first_loads = [
+        sum(duration for stage, _, duration in record["spans"] if stage in ("navigate", "render_wait"))
+        for record in records if record["success"] and record.get("variants")
+    ]
+    timings = [timing for record in records for timing in record.get("variants", [])]
+    switches = [timing["load"] for timing in timings if timing["method"] == "switch" and timing["success"]]
+    first_p50 = percentile(first_loads, 0.50)
+    return {
+        "variants": len(CHART_VARIANTS),
+        "captured": sum(timing["success"] for timing in timings),
+        "failed": sum(not timing["success"] for timing in timings),
+        "reloads": sum(timing["method"] == "reload" for timing in timings),
+        "first_load_p50": first_p50,
+        "switch_p50": percentile(switches, 0.50),
+        # ما كانت ستكلفه الأطر نفسها لو حُمّلت كل منها كصفحة منفصلة
+        "saved": sum(first_p50 - load for load in switches),
+    }
+
+def write_spans_csv(records, started_at, path):
+    """كتابة كل المراحل كصفوف CSV مع بداية كل مرحلة نسبةً لبداية التشغيل"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "attempts", "worker", "stage", "start", "duration"])
+        for record in records:
+            for stage, start, duration in record.get("spans", []):
+                writer.writerow([
+                    record["symbol"], record["attempts"], record.get("worker"),
+                    stage, f"{start - started_at:.3f}", f"{duration:.3f}"
+                ])
+
+# سكربت فحص واحد يجمع كل ما تحتاجه فحوص الجاهزية في رحلة واحدة إلى المتصفح
+CHART_PROBE_SCRIPT = """
+const pane = document.querySelector('.layout__area--center');
+const result = {
+    stale: document.documentElement.dataset.chartStale === '1',
+    ready_state: document.readyState,
+    resources: performance.getEntriesByType('resource').length,
+    pane: null,
+    canvases: 0,
+    non_blank: false
+};
+if (!pane) return result;
+const r = pane.getBoundingClientRect();
+result.pane = [Math.round(r.x), Math.round(r.y), Math.round(r.width), Math.round(r.height)].join(',');
+const canvases = pane.querySelectorAll('canvas');
+result.canvases = canvases.length;
+// تصغير كل canvas إلى 32x32 ثم عد الألوان المختلفة: الشارت الفارغ لون واحد تقريباً
+const sample = document.createElement('canvas');
+sample.width = 32; sample.height = 32;
+const ctx = sample.getContext('2d');
+for (const canvas of canvases) {
+    if (canvas.width < 50 || canvas.height < 50) continue;
+    try {
+        ctx.clearRect(0, 0, 32, 32);
+        ctx.drawImage(canvas, 0, 0, 32, 32);
+        const data = ctx.getImageData(0, 0, 32, 32).data;
+        const colors = new Set();
+        for (let i = 0; i < data.length; i += 4) {
+            if (data[i + 3] === 0) continue;
+            colors.add((data[i] << 16) | (data[i + 1] << 8) | data[i + 2]);
+            if (colors.size > 3) break;
+        }
+        if (colors.size > 3) { result.non_blank = true; break; }
+    } catch (e) {}
+}
+return result;
+"""
+
+def check_canvas_rendered(probe, history):
+    """وجود canvas داخل منطقة الشارت وعليه محتوى غير فارغ"""
+    return probe["canvases"] > 0 and probe["non_blank"]
+
+def check_stable_layout(probe, history):
+    """منطقة .layout__area--center موجودة وأبعادها ثابتة منذ الفحص السابق"""
+    if not probe["pane"] or not history:
+        return False
+    return history[-1]["pane"] == probe["pane"]
+
+def check_network_idle(probe, history, idle_polls=2):
+    """اكتمال تحميل الصفحة وعدم ظهور طلبات شبكة جديدة خلال آخر فحصين"""
+    if probe["ready_state"] != "complete" or len(history) < idle_polls:
+        return False
+    return all(previous["resources"] == probe["resources"] for previous in history[-idle_polls:])
+
+READINESS_CHECKS = {
+    "canvas": check_canvas_rendered,
+    "stable_layout": check_stable_layout,
+    "network_idle": check_network_idle,
+}
+
+class ChartReadinessDetector:
+    """كاشف جاهزية الشارت: يعتبر الشارت جاهزاً عند نجاح جميع الفحوص المفعلة"""
+    
+    def __init__(self, checks=None, probe_script=CHART_PROBE_SCRIPT):
+        if checks is None:
+            checks = [READINESS_CHECKS[name.strip()] for name in CHART_READY_CHECKS.split(",") if name.strip()]
+        self.checks = checks
+        self.probe_script = probe_script
+    
+    def probe(self, driver):
+        """قراءة حالة الصفحة (تُنفذ داخل خيط الـ driver)"""
+        return driver.execute_script(self.probe_script)
+    
+    def is_ready(self, probe, history):
+        # الصفحة السابقة ما زالت معروضة في تبويب لم يبدأ تحميله الجديد بعد
+        if probe.get("stale"):
+            return False
+        return all(check(probe, history) for check in self.checks)
+
+async def wait_for_chart_ready(tab, detector, deadline):
+    """الانتظار حتى جاهزية الشارت أو انقضاء المهلة، وإرجاع (جاهز؟, الزمن الفعلي)"""
+    start_time = time.time()
+    history = []
+    
+    while True:
+        try:
+            probe = await tab.run(detector.probe, tab.driver)
+        except Exception as e:
+            logger.debug(f"فشل فحص الجاهزية: {e}")
+            probe = None
+        
+        elapsed = time.time() - start_time
+        if probe:
+            if detector.is_ready(probe, history):
+                return True, elapsed
+            history.append(probe)
+        
+        if elapsed >= deadline:
+            return False, elapsed
+        
+        await asyncio.sleep(CHART_READY_POLL_INTERVAL)
+
+# بدء التنقل دون انتظار اكتمال التحميل مع وسم الصفحة القديمة حتى لا يُخلط بينها وبين الجديدة
+NAVIGATE_SCRIPT = """
+document.documentElement.dataset.chartStale = '1';
+window.location.href = arguments[0];
+"""
+
+def start_navigation(driver, url):
+    driver.execute_script(NAVIGATE_SCRIPT, url)
+
+# تبديل الإطار والنوع في الصفحة المحملة دون إعادة تحميلها؛ وسم الصفحة قديمة حتى تكتمل بيانات الإطار الجديد
+SWITCH_VARIANT_SCRIPT = """
+const api = window.TradingViewApi;
+const chart = api && api.activeChart && api.activeChart();
+if (!chart) return false;
+const root = document.documentElement;
+const done = () => { delete root.dataset.chartStale; };
+root.dataset.chartStale = '1';
+chart.setChartType(Number(arguments[1]));
+if (chart.resolution() === arguments[0]) {
+    // نفس الإطار: لا تحميل بيانات، يكفي انتظار إطاري رسم
+    requestAnimationFrame(() => requestAnimationFrame(done));
+} else {
+    chart.setResolution(arguments[0], done);
+}
+return true;
+"""
+
+def switch_chart_variant(driver, interval, style):
+    """إرجاع False عندما لا تتوفر واجهة الشارت فيلزم تحميل الرابط كصفحة جديدة"""
+    return bool(driver.execute_script(SWITCH_VARIANT_SCRIPT, interval, style))
+
+def take_chart_screenshot(driver, symbol, worker_id, bring_to_front=False):
+    """أخذ لقطة شاشة لمنطقة الشارت في الذاكرة كبايتات PNG (تُنفذ داخل خيط الـ driver)"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
+    try:
+        if bring_to_front:
+            # التبويبات الخلفية لا تُرسم في لقطات الشاشة
+            driver.execute_cdp_cmd("Page.bringToFront", {})
+        
+        # محاولة العثور على منطقة الشارت بسرعة
+        wait = WebDriverWait(driver, 3)  # 3 ثوان فقط
+        chart_area = wait.until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".layout__area--center"))
+        )
+        
+        if CHART_CAPTURE_MODE == "cdp_clip":
+            rect = chart_area.rect
+            data = driver.execute_cdp_cmd("Page.captureScreenshot", {
+                "format": "png",
+                "clip": {"x": rect["x"], "y": rect["y"], "width": rect["width"], "height": rect["height"], "scale": 1},
+            })
+            png = base64.b64decode(data["data"])
+        else:
+            png = chart_area.screenshot_as_png
+        
+        logger.info(f"📸 [Worker {worker_id}] تم التقاط شارت {symbol}")
+        return png
+        
+    except Exception as e:
+        logger.warning(f"⚠️ [Worker {worker_id}] أخذ لقطة شاشة كاملة: {e}")
+        return driver.get_screenshot_as_png()
+
+def is_valid_chart_png(png):
+    """التحقق من الحجم وأن الصورة ليست فارغة (لون واحد تقريباً) مباشرة من الذاكرة"""
+    if not png or len(png) <= MIN_CHART_BYTES:
+        return False
+    try:
+        with Image.open(io.BytesIO(png)) as image:
+            thumbnail = image.convert("RGB").resize((64, 64))
+    except Exception:
+        return False
+    colors = thumbnail.getcolors(maxcolors=MIN_CHART_COLORS)
+    # getcolors تعيد None عندما يتجاوز عدد الألوان الحد
+    return colors is None
+
+def difference_hash(image, size=FINGERPRINT_SIZE):
+    """dHash بطول size×size بت: مقارنة كل بكسل بجاره الأيمن في صورة مصغرة"""
+    pixels = list(image.resize((size + 1, size)).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+def chart_fingerprint(png):
+    """بصمة إدراكية للشارت لمقارنته بشارت الشهر السابق: الصورة كلها ثم ربعها الأيمن (أحدث الطوب) بدقة مستقلة"""
+    with Image.open(io.BytesIO(png)) as image:
+        gray = image.convert("L")
+        recent = gray.crop((gray.width * 3 // 4, 0, gray.width, gray.height))
+        bits = (difference_hash(gray) << FINGERPRINT_SIZE ** 2) | difference_hash(recent)
+    return f"{bits:0{FINGERPRINT_SIZE ** 2 // 2}x}"
+
+def trim_chart_margins(image):
+    """قص الهوامش الفارغة بلون الخلفية (لون الزاوية) مع ترك هامش صغير"""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    difference = ImageChops.difference(image, background).convert("L")
+    box = difference.point(lambda value: 255 if value > TRIM_TOLERANCE else 0).getbbox()
+    if not box:
+        return image
+    left, top, right, bottom = box
+    return image.crop((
+        max(0, left - TRIM_PADDING),
+        max(0, top - TRIM_PADDING),
+        min(image.width, right + TRIM_PADDING),
+        min(image.height, bottom + TRIM_PADDING),
+    ))
+
+def encode_chart_image(image, image_format):
+    """ترميز الصورة مع خفض الجودة تدريجياً حتى تصبح تحت الحد الأقصى للحجم"""
+    quality = CHART_IMAGE_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        if image_format == "png":
+            image.save(buffer, "PNG", optimize=True)
+        elif image_format == "webp":
+            image.save(buffer, "WEBP", quality=quality, method=4)
+        else:
+            image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        data = buffer.getvalue()
+        if image_format == "png" or len(data) <= CHART_IMAGE_MAX_BYTES or quality <= CHART_IMAGE_MIN_QUALITY:
+            return data
+        quality = max(CHART_IMAGE_MIN_QUALITY, quality - 10)
+
+def process_chart_image(png, stamp=None, image_format=CHART_IMAGE_FORMAT):
+    """قص وختم وترميز صورة الشارت؛ تُنفذ في عملية منفصلة وتعيد (البايتات، الامتداد)"""
+    with Image.open(io.BytesIO(png)) as source:
+        image = source.convert("RGB")
+    if CHART_IMAGE_TRIM:
+        image = trim_chart_margins(image)
+    if stamp:
+        draw = ImageDraw.Draw(image)
+        draw.text((10, 10), stamp, fill=(209, 212, 220), font=ImageFont.load_default())
+    extension = {"jpeg": "jpg", "webp": "webp", "png": "png"}[image_format]
+    data = encode_chart_image(image, image_format)
+    # الشارتات ذات الألوان المسطحة قد تكون أصغر كـ PNG: لا تُرسل صورة أكبر من الأصل أبداً
+    if len(data) >= len(png) and image_format != "png":
+        data, extension = encode_chart_image(image, "png"), "png"
+    if len(data) >= len(png):
+        return png, "png"
+    return data, extension
+
+def fingerprint_distance(first, second):
+    # بصمة بطول مختلف (من نسخة سابقة) تُعد مختلفة كلياً
+    if len(first) != len(second):
+        return max(len(first), len(second)) * 4
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+class ChartCache:
+    """ذاكرة دائمة لآخر شارت لكل (سهم، إطار، نوع): البصمة و file_id الخاص بتليجرام"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+    
+    @staticmethod
+    def key(symbol, interval=CHART_INTERVAL, style=CHART_STYLE):
+        return f"{symbol}|{interval}|{style}"
+    
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+            logger.info(f"🗂️ تم تحميل ذاكرة الشارتات: {len(self.entries)} شارت")
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logger.warning(f"⚠️ تعذر قراءة ذاكرة الشارتات: {e}")
+            self.entries = {}
+    
+    def find_unchanged(self, key, fingerprint):
+        """إرجاع file_id الشارت السابق إذا كان الشارت الجديد مطابقاً له ضمن الحد المسموح"""
+        entry = self.entries.get(key)
+        if not entry or not entry.get("file_id"):
+            return None
+        if fingerprint_distance(entry["fingerprint"], fingerprint) > CHART_DEDUP_THRESHOLD:
+            return None
+        return entry["file_id"]
+    
+    def update(self, key, fingerprint, file_id):
+        self.entries[key] = {
+            "fingerprint": fingerprint,
+            "file_id": file_id,
+            "updated": time.strftime('%Y-%m-%d %H:%M UTC'),
+        }
+    
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+chart_cache = ChartCache(CHART_CACHE_FILE)
+
+class RunStateStore:
+    """مخزن SQLite صغير يسجل حالة ومدة كل سهم في كل تشغيل"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+    
+    def open(self):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                mode TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS symbol_runs (
+                run_id TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                status TEXT NOT NULL,
+                duration REAL,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, symbol)
+            );
+            CREATE TABLE IF NOT EXISTS renko_state (
+                symbol TEXT PRIMARY KEY,
+                last_month INTEGER NOT NULL,
+                direction INTEGER NOT NULL,
+                bricks INTEGER NOT NULL,
+                box REAL NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+        """)
+        # ترقية قواعد البيانات المنشأة قبل إضافة عمود المحاولات
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(symbol_runs)")}
+        if "attempts" not in columns:
+            self.conn.execute("ALTER TABLE symbol_runs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1")
+        self.conn.commit()
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+    
+    def start_run(self, run_id, mode):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, mode, started_at) VALUES (?, ?, ?)",
+            (run_id, mode, time.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        self.conn.commit()
+    
+    def finish_run(self, run_id):
+        self.conn.execute(
+            "UPDATE runs SET finished_at = ? WHERE run_id = ?",
+            (time.strftime('%Y-%m-%d %H:%M:%S'), run_id)
+        )
+        self.conn.commit()
+    
+    def latest_run(self, finished=None):
+        """أحدث تشغيل منتهٍ أو غير منتهٍ، أو أحدثها مطلقاً مع None"""
+        condition = {None: "1", True: "finished_at IS NOT NULL", False: "finished_at IS NULL"}[finished]
+        # rowid يفصل بين تشغيلين بدآ في نفس الثانية
+        row = self.conn.execute(
+            f"SELECT run_id FROM runs WHERE {condition} ORDER BY started_at DESC, rowid DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+    
+    def record(self, run_id, symbol, status, duration, attempts=1):
+        """تسجيل نتيجة سهم فور وصولها حتى تبقى محفوظة إذا انقطع التشغيل"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO symbol_runs (run_id, symbol, status, duration, attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, symbol, status, duration, attempts, time.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        self.conn.commit()
+    
+    def record_many(self, run_id, symbols, status):
+        """تسجيل حالة واحدة لعدة أسهم دفعة واحدة (مثل الأسهم التي تخطاها الفلتر المسبق)"""
+        updated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO symbol_runs (run_id, symbol, status, duration, attempts, updated_at) VALUES (?, ?, ?, 0, 1, ?)",
+            [(run_id, symbol, status, updated_at) for symbol in symbols]
+        )
+        self.conn.commit()
+    
+    def renko_states(self):
+        """آخر طوبة مُرسلة لكل سهم: الرمز ← (شهرها، اتجاهها، عدد الطوب، حجم الصندوق الذي حُسبت به)"""
+        rows = self.conn.execute("SELECT symbol, last_month, direction, bricks, box FROM renko_state").fetchall()
+        return {symbol: tuple(state) for symbol, *state in rows}
+    
+    def save_renko_state(self, symbol, last_month, direction, bricks, box):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO renko_state (symbol, last_month, direction, bricks, box, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (symbol, last_month, direction, bricks, box, time.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        self.conn.commit()
+    
+    def symbols_with_status(self, run_id, statuses):
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = self.conn.execute(
+            f"SELECT symbol FROM symbol_runs WHERE run_id = ? AND status IN ({placeholders})",
+            (run_id, *statuses)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+def select_run_stocks(run_store, mode):
+    """تحديد معرف التشغيل وشرط اختيار الأسهم حسب الوضع (full / resume / retry-failed)؛ None = كل الأسهم"""
+    # لاحقة عشوائية: تشغيلان يبدآن في نفس الثانية (عمليتان على نفس قاعدة البيانات) لا يشتركان في صف واحد
+    new_run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    
+    if mode == "resume":
+        run_id = run_store.latest_run(finished=False)
+        # تشغيل منقطع قديم تلاه تشغيل مكتمل لا يُستأنف: بقاياه أقدم من النتائج الأحدث
+        if run_id is None or run_id != run_store.latest_run():
+            logger.info("ℹ️ لا يوجد تشغيل منقطع للاستئناف (آخر تشغيل اكتمل) - بدء تشغيل كامل")
+            return new_run_id, None
+        done = run_store.symbols_with_status(run_id, ("delivered", "unchanged"))
+        logger.info(f"⏯️ استئناف التشغيل {run_id}: تم تسليم {len(done)} سهم مسبقاً")
+        return run_id, lambda stock: stock.symbol not in done
+    
+    if mode == "retry-failed":
+        previous_run_id = run_store.latest_run(finished=True)
+        failed = run_store.symbols_with_status(previous_run_id, ("failed",)) if previous_run_id else set()
+        logger.info(f"🔁 إعادة محاولة {len(failed)} سهم فشل في التشغيل {previous_run_id}")
+        return new_run_id, lambda stock: stock.symbol in failed
+    
+    return new_run_id, None
+
+def classify_renko_change(previous, series):
+    """مقارنة آخر طوبة بالحالة المحفوظة: طوبة جديدة أو انعكاس أو بلا تغيير"""
+    if series is None:
+        return "no_data"
+    if previous is None:
+        return "new"
+    previous_month, previous_direction, previous_bricks = previous[:3]
+    if not len(series.directions):
+        return "unchanged" if previous_bricks == 0 else "new"
+    last_month, direction = int(series.months[-1]), int(series.directions[-1])
+    # اتجاه 0 = لم تكن هناك طوبة في آخر إرسال: أول طوبة ليست انعكاساً
+    if previous_direction and direction != previous_direction:
+        return "reversal"
+    # عدة طوب في نفس الشهر: الشهر وحده لا يكفي، فيُقارن عدد الطوب أيضاً
+    if last_month != previous_month or len(series.directions) != previous_bricks:
+        return "new_brick"
+    return "unchanged"
+
+def renko_signature(series):
+    """توقيع آخر طوبة كما يُحفظ بعد التسليم: (شهرها، اتجاهها، عدد الطوب، حجم الصندوق)"""
+    if len(series.directions):
+        return (int(series.months[-1]), int(series.directions[-1]), len(series.directions), series.box)
+    return (0, 0, 0, series.box)
+
+def renko_prefilter(stocks, states):
+    """حساب طوب الأسهم كلها بدفعات متجهة وتصنيف كل سهم: الرمز ← (الحالة، توقيع آخر طوبة للحفظ بعد الإرسال)"""
+    import renko
+    
+    # صندوق ATR يتغير كل شهر فيحرك حدود الطوب دون تغير السعر: المقارنة بنفس الصندوق المحفوظ مع الحالة
+    boxes = {symbol: state[3] for symbol, state in states.items()} if renko.RENKO_BOX_MODE == "atr" else None
+    changes = {}
+    for start in range(0, len(stocks), RENKO_BATCH_SIZE):
+        symbols = [stock.symbol for stock in stocks[start:start + RENKO_BATCH_SIZE]]
+        for symbol, series in zip(symbols, renko.compute_renko_batch(symbols, boxes=boxes)):
+            status = classify_renko_change(states.get(symbol), series)
+            changes[symbol] = (status, renko_signature(series) if series is not None else None)
+    return changes
+
+def iter_run_stocks(selected=None, shard=None):
+    """تمرير أسهم التشغيل واحداً تلو الآخر من القائمة دون نسخها"""
+    for stock in STOCKS:
+        if selected and not selected(stock):
+            continue
+        if shard and not in_shard(stock.symbol, *shard):
+            continue
+        yield stock
+
+async def check_chart_cache(tab, frame, symbol, interval=CHART_INTERVAL, style=CHART_STYLE):
+    """بصمة الشارت ومطابقتها مع آخر شارت مرسل بنفس (السهم، الإطار، النوع)"""
+    frame["fingerprint"] = await run_in_driver_thread(tab.executor, chart_fingerprint, frame["png"])
+    frame["cache_key"] = ChartCache.key(symbol, interval, style)
+    file_id = chart_cache.find_unchanged(frame["cache_key"], frame["fingerprint"])
+    if file_id:
+        frame["unchanged"] = True
+        frame["file_id"] = file_id
+
+async def capture_chart_variants(stock_info, tab, worker_id, detector, ready_timeout, timer, variants=CHART_VARIANTS):
+    """التقاط الأطر الإضافية من الصفحة المحملة نفسها بتبديل الإطار والنوع، وإرجاع (الصور، زمن كل إطار)"""
+    symbol, name, sector, exchange = stock_info
+    frames = []
+    timings = []
+    
+    # الألبوم الواحد لا يتجاوز 10 صور بما فيها الشارت الأساسي
+    for interval, style in variants[:MEDIA_GROUP_SIZE - 1]:
+        label = f"{interval}:{style}"
+        timing = {"variant": label, "method": "switch", "load": None, "success": False}
+        timings.append(timing)
+        load_start = time.time()
+        try:
+            if not await tab.run(switch_chart_variant, tab.driver, interval, style):
+                # واجهة الشارت غير متاحة: تحميل رابط الإطار كصفحة جديدة
+                timing["method"] = "reload"
+                url = chart_url(exchange, symbol, interval, style)
+                if tab.multi_tab:
+                    await tab.run(start_navigation, tab.driver, url)
+                else:
+                    await tab.run(tab.driver.get, url)
+            ready, ready_time = await wait_for_chart_ready(tab, detector, ready_timeout)
+            timer.add("switch", load_start)
+            if not ready:
+                logger.warning(f"⚠️ [Worker {worker_id}] لم يكتمل رسم {symbol} بإطار {label} خلال {format_duration(ready_time)}")
+                continue
+            timing["load"] = time.time() - load_start
+            
+            with timer.span("screenshot"):
+                png = await tab.run(take_chart_screenshot, tab.driver, symbol, worker_id, tab.multi_tab)
+            if not await run_in_driver_thread(tab.executor, is_valid_chart_png, png):
+                logger.warning(f"⚠️ [Worker {worker_id}] لقطة فارغة لـ {symbol} بإطار {label}")
+                continue
+            
+            frame = {"stock": stock_info, "png": png, "unchanged": False,
+                     "caption": f"📊 {symbol} · {interval} · {CHART_STYLE_NAMES.get(style, style)}"}
+            if CHART_DEDUP_MODE != "off":
+                await check_chart_cache(tab, frame, symbol, interval, style)
+            frames.append(frame)
+            timing["success"] = True
+            logger.info(f"🔀 [Worker {worker_id}] {symbol} بإطار {label} في {format_duration(timing['load'])} ({timing['method']})")
+        except Exception as e:
+            logger.warning(f"⚠️ [Worker {worker_id}] تعذر التقاط {symbol} بإطار {label}: {e}")
+    
+    return frames, timings
+
+async def capture_ultra_fast_chart(stock_info, tab, worker_id, detector, ready_timeout=CHART_READY_TIMEOUT, timer=None,
+                                   interval=CHART_INTERVAL, variants=CHART_VARIANTS):
     """التقاط شارت بسرعة قصوى"""
-    symbol = stock_info["symbol"]
-    name = stock_info["name"]
-    sector = stock_info["sector"]
+    symbol, name, sector, exchange = stock_info
     
     chart_start_time = time.time()
+    timer = timer or StageTimer()
     
     logger.info(f"📈 [Worker {worker_id}] معالجة {name} ({symbol})...")
     
     try:
-        # تحديد البورصة بسرعة
-        exchange = "NASDAQ" if symbol in NASDAQ_SET else "NYSE"
+        # رابط الإطار الشهري محسوب مسبقاً عند تحميل قائمة الأسهم
+        url = CHART_URLS[symbol] if interval == CHART_INTERVAL else chart_url(exchange, symbol, interval)
         
-        # معالجة الرموز الخاصة
-        clean_symbol = symbol.replace('.', '-')
+        logger.info(f"🌐 [Worker {worker_id}] الذهاب إلى: {url}")
+        with timer.span("navigate"):
+            if tab.multi_tab:
+                # وضع التبويبات: التنقل لا يحجز خيط المتصفح فتواصل التبويبات الأخرى عملها
+                await tab.run(start_navigation, tab.driver, url)
+            else:
+                await tab.run(tab.driver.get, url)
         
-        # بناء الرابط
-        url = f"https://www.tradingview.com/chart/?symbol={exchange}%3A{clean_symbol}&interval=1M&style=4&theme=dark"
+        # انتظار ذكي حتى جاهزية الشارت فعلياً بدلاً من 5 ثوان ثابتة
+        logger.info(f"⏳ [Worker {worker_id}] انتظار جاهزية الشارت...")
+        with timer.span("render_wait"):
+            ready, ready_time = await wait_for_chart_ready(tab, detector, ready_timeout)
         
-        logger.info(f"🌐 [Worker {worker_id}] الذهاب إلى: {url}")
-        driver.get(url)
+        if not ready:
+            chart_duration = time.time() - chart_start_time
+            logger.error(f"❌ [Worker {worker_id}] لم يكتمل رسم شارت {symbol} خلال {format_duration(ready_time)}")
+            return {"success": False, "duration": chart_duration, "stock": stock_info, "ready_time": None}
+        
+        logger.info(f"🎯 [Worker {worker_id}] الشارت {symbol} جاهز بعد {format_duration(ready_time)}")
+        
+        # أخذ لقطة شاشة في الذاكرة دون ملفات مؤقتة
+        with timer.span("screenshot"):
+            png = await tab.run(take_chart_screenshot, tab.driver, symbol, worker_id, tab.multi_tab)
+        
+        # التحقق من صحة الصورة
+        encode_start = time.time()
+        if await run_in_driver_thread(tab.executor, is_valid_chart_png, png):
+            result = {"success": True, "stock": stock_info, "ready_time": ready_time, "png": png, "unchanged": False}
+            
+            if CHART_DEDUP_MODE != "off":
+                await check_chart_cache(tab, result, symbol, interval)
+                if result["unchanged"]:
+                    logger.info(f"🔁 [Worker {worker_id}] شارت {symbol} لم يتغير منذ التقرير السابق")
+            timer.add("encode", encode_start)
+            
+            if variants:
+                result["variants"], result["variant_timings"] = await capture_chart_variants(
+                    stock_info, tab, worker_id, detector, ready_timeout, timer, variants
+                )
+            
+            chart_duration = time.time() - chart_start_time
+            result["duration"] = chart_duration
+            # النص الخاص بكل سهم ينتقل إلى وصف الصورة بدلاً من رسالة منفصلة
+            result["caption"] = f"📊 **شارت {name} ({symbol})**\n🏢 القطاع: {sector}\n🏛️ البورصة: {exchange}\n🔗 TradingView - رينكو شهري\n📅 {time.strftime('%Y-%m-%d %H:%M UTC')}\n⏱️ وقت المعالجة: {format_duration(chart_duration)}\n🤖 Worker: {worker_id}"
+            
+            logger.info(f"✅ [Worker {worker_id}] تم التقاط شارت {symbol} في {format_duration(chart_duration)}")
+            return result
+            
+        else:
+            timer.add("encode", encode_start)
+            chart_duration = time.time() - chart_start_time
+            logger.error(f"❌ [Worker {worker_id}] لقطة شاشة فارغة أو غير صالحة لـ {symbol}")
+            return {"success": False, "duration": chart_duration, "stock": stock_info, "ready_time": ready_time}
+            
+    except Exception as e:
+        chart_duration = time.time() - chart_start_time
+        logger.error(f"❌ [Worker {worker_id}] خطأ في معالجة {symbol}: {e}")
+        return {"success": False, "duration": chart_duration, "stock": stock_info, "ready_time": None}
+
+async def stock_worker(job_queue, delivery_queue, processor, worker_id):
+    """سحب الأسهم من الطابور المشترك ثم من مسار إعادة المحاولة وتمرير الشارتات الملتقطة إلى مرحلة الإرسال"""
+    detector = ChartReadinessDetector()
+    retry_lane = processor.retry_lane
+    # None في الطابور المشترك يعني انتهاء الأسهم الجديدة؛ بعدها تُسحب إعادات المحاولة فقط
+    feeding = True
+    
+    while True:
+        if feeding:
+            job = await job_queue.get()
+            if job is None:
+                feeding = False
+                continue
+        else:
+            job = await retry_lane.get()
+            if job is None:
+                return
+        stock, attempt, queued_at = job
+        
+        timer = StageTimer()
+        timer.add("queue_wait", queued_at)
+        ready_timeout = CHART_READY_TIMEOUT * RETRY_DEADLINE_FACTOR ** (attempt - 1)
+        fresh = attempt > 1 and RETRY_FRESH_DRIVER
+        
+        try:
+            # الانتظار على حد التوازي يُحسب ضمن زمن الاستعارة
+            lease_start = time.time()
+            async with processor.controller.slot(), processor.pool.lease(fresh=fresh) as tab:
+                timer.add("lease", lease_start)
+                # أول صفحة على متصفح جديد تدفع تكلفة تحميل حزم JS إن لم يكن الكاش دافئاً
+                first_on_driver = tab.slot.pages == 0
+                result = await capture_ultra_fast_chart(stock, tab, worker_id, detector, ready_timeout, timer)
+                result["first_on_driver"] = first_on_driver
+                if CHART_NETWORK_STATS:
+                    # في وضع التبويبات قد تختلط أحداث تبويبات أخرى لكن المجاميع تبقى صحيحة
+                    network_stats.record(*await tab.run(drain_network_log, tab.driver))
+        except Exception as e:
+            logger.error(f"❌ خطأ في معالجة {stock.symbol}: {e}")
+            result = {"success": False, "duration": 0, "stock": stock, "ready_time": None}
+        
+        processor.worker_busy[worker_id] = processor.worker_busy.get(worker_id, 0) + result["duration"]
+        processor.controller.observe(result)
+        result["attempts"] = attempt
+        result["worker"] = worker_id
+        result["spans"] = timer.spans
+        retried = not result["success"] and retry_lane.schedule(stock, attempt)
+        if attempt > 1:
+            retry_lane.done(result["duration"])
+        
+        if retried:
+            pass
+        elif result["success"] and all(frame["unchanged"] for frame in chart_frames(result)) and CHART_DEDUP_MODE == "skip":
+            for frame in chart_frames(result):
+                frame.pop("png", None)
+            await processor.results_queue.put(result)
+        elif result["success"]:
+            # طابور محدود: إذا تأخر الإرسال يتوقف الالتقاط بدلاً من تكديس الصور في الذاكرة
+            result["handoff_at"] = time.time()
+            await delivery_queue.put(result)
+        else:
+            await processor.results_queue.put(result)
+        # راحة قصيرة بين الأسهم
+        await asyncio.sleep(STOCK_PAUSE_SECONDS)
+
+def render_renko_capture(series):
+    """رسم شارت رينكو وبصمته في عملية منفصلة وإرجاع (PNG، البصمة، زمن الرسم)"""
+    import renko
+    
+    png, render_time = renko.render_renko_timed(series, f"{series.symbol} · {CHART_INTERVAL} · Renko")
+    fingerprint = chart_fingerprint(png) if CHART_DEDUP_MODE != "off" else None
+    return png, fingerprint, render_time
+
+async def renko_worker(stocks, capture_queue, processor, worker_id=0):
+    """بديل المتصفح: حساب طوب الرينكو لدفعات من الأسهم دفعة واحدة ثم رسمها بالتوازي في عمليات الصور"""
+    import renko
+    
+    loop = asyncio.get_running_loop()
+    stocks = iter(stocks)
+    while True:
+        batch = list(itertools.islice(stocks, RENKO_BATCH_SIZE))
+        if not batch:
+            return
+        
+        batch_start = time.time()
+        series = await loop.run_in_executor(None, renko.compute_renko_batch, [stock.symbol for stock in batch])
+        # زمن الدفعة يُوزع على أسهمها بالتساوي
+        compute_time = (time.time() - batch_start) / len(batch)
+        logger.info(f"🧱 [Worker {worker_id}] رينكو {len(batch)} سهم في {format_duration(compute_time * len(batch))}")
         
-        # انتظار مُحسن - 5 ثوان فقط!
-        logger.info(f"⏳ [Worker {worker_id}] انتظار تحميل الشارت...")
-        await asyncio.sleep(5)  # 5 ثوان فقط بدلاً من 20!
+        renders = [
+            loop.run_in_executor(processor.image_pool, render_renko_capture, item) if item else None
+            for item in series
+        ]
+        for stock, item, render in zip(batch, series, renders):
+            timer = StageTimer()
+            timer.add("renko", batch_start, batch_start + compute_time)
+            result = {"success": False, "duration": compute_time, "stock": stock, "ready_time": None,
+                      "attempts": 1, "worker": worker_id, "first_on_driver": False}
+            if render is None:
+                logger.error(f"❌ [Worker {worker_id}] لا توجد بيانات أسعار صالحة لـ {stock.symbol} في {renko.RENKO_DATA_DIR}")
+            else:
+                try:
+                    png, fingerprint, render_time = await render
+                    render_end = time.time()
+                    timer.add("render", render_end - render_time, render_end)
+                    result["duration"] += render_time
+                    result.update(success=True, png=png, unchanged=False, caption=(
+                        f"📊 **شارت {stock.name} ({stock.symbol})**\n🏢 القطاع: {stock.sector}\n🏛️ البورصة: {stock.exchange}\n"
+                        f"🧱 رينكو شهري محلي - صندوق {item.box:.2f}\n📅 {time.strftime('%Y-%m-%d %H:%M UTC')}\n"
+                        f"⏱️ وقت المعالجة: {format_duration(result['duration'])}"
+                    ))
+                    if fingerprint:
+                        result["cache_key"] = ChartCache.key(stock.symbol)
+                        result["fingerprint"] = fingerprint
+                        file_id = chart_cache.find_unchanged(result["cache_key"], fingerprint)
+                        if file_id:
+                            result["unchanged"] = True
+                            result["file_id"] = file_id
+                except Exception as e:
+                    logger.error(f"❌ [Worker {worker_id}] خطأ في رسم رينكو {stock.symbol}: {e}")
+            
+            processor.worker_busy[worker_id] = processor.worker_busy.get(worker_id, 0) + result["duration"]
+            result["spans"] = timer.spans
+            if result["success"] and result["unchanged"] and CHART_DEDUP_MODE == "skip":
+                result.pop("png", None)
+                await processor.results_queue.put(result)
+            elif result["success"]:
+                result["handoff_at"] = time.time()
+                await capture_queue.put(result)
+            else:
+                await processor.results_queue.put(result)
+
+async def image_stage(image_queue, delivery_queue, image_pool):
+    """مرحلة الصور بين الالتقاط والإرسال: قص الصورة وضغطها في عملية منفصلة ثم تمريرها للإرسال"""
+    loop = asyncio.get_running_loop()
+    while True:
+        result = await image_queue.get()
+        if result is None:
+            return
+        
+        stamp = f"{result['stock'].symbol}  {time.strftime('%Y-%m-%d')}" if CHART_IMAGE_STAMP else None
+        for frame in chart_frames(result):
+            # الشارت غير المتغير يُرسل بـ file_id فلا حاجة لمعالجة صورته
+            if frame["unchanged"]:
+                continue
+            try:
+                data, extension = await loop.run_in_executor(image_pool, process_chart_image, frame["png"], stamp)
+                # أحجام الأطر الإضافية تُجمع على سجل السهم
+                result["raw_bytes"] = result.get("raw_bytes", 0) + len(frame["png"])
+                result["sent_bytes"] = result.get("sent_bytes", 0) + len(data)
+                frame["png"] = data
+                frame["extension"] = extension
+            except Exception as e:
+                # الصورة الخام ما زالت صالحة للإرسال
+                logger.warning(f"⚠️ تعذرت معالجة صورة {result['stock'].symbol}: {e}")
+        
+        now = time.time()
+        result["spans"].append(["image", result["handoff_at"], now - result["handoff_at"]])
+        result["handoff_at"] = now
+        await delivery_queue.put(result)
+
+def chart_frames(result):
+    """صور السهم بترتيب الألبوم: الشارت الأساسي ثم الأطر الإضافية الملتقطة من نفس الصفحة"""
+    return [result] + result.get("variants", [])
+
+def chart_media(result):
+    """الشارت غير المتغير يُعاد إرساله بـ file_id دون رفع الصورة مجدداً"""
+    from aiogram.types import BufferedInputFile
+    
+    if result.get("unchanged"):
+        return result["file_id"]
+    extension = result.get("extension", "png")
+    return BufferedInputFile(result["png"], filename=f"{result['stock'].symbol}_chart.{extension}")
+
+async def send_chart_batch(batch):
+    """إرسال مجموعة صور كألبوم واحد (أو صورة واحدة إذا كانت مفردة) وإرجاع الرسائل"""
+    from aiogram.types import InputMediaPhoto
+    
+    if len(batch) == 1:
+        result = batch[0]
+        message = await outbound.send(
+            "send_photo", PRIORITY_CHART,
+            chat_id=TELEGRAM_CHAT_ID,
+            photo=chart_media(result),
+            caption=result["caption"],
+            parse_mode="Markdown"
+        )
+        return [message]
+    
+    media = [
+        InputMediaPhoto(
+            media=chart_media(result),
+            caption=result["caption"],
+            parse_mode="Markdown"
+        )
+        for result in batch
+    ]
+    return await outbound.send("send_media_group", PRIORITY_CHART, chat_id=TELEGRAM_CHAT_ID, media=media)
+
+async def chart_sender(delivery_queue, results_queue):
+    """مرحلة الإرسال: تجميع الشارتات في ألبومات ورفعها بينما تواصل المتصفحات الالتقاط"""
+    finished = False
+    # سهم بأطر متعددة وصل أثناء تجميع ألبوم آخر: يُرسل في الدورة التالية
+    held = None
+    
+    while not finished:
+        first = held or await delivery_queue.get()
+        held = None
+        if first is None:
+            return
         
-        # أخذ لقطة شاشة
-        file_name = f"{symbol}_chart_{worker_id}_{int(time.time())}.png"
+        batch = [first]
+        # تجميع حتى 10 صور أو حتى انقضاء مهلة قصيرة دون وصول شارت جديد؛ السهم ذو الأطر المتعددة ألبوم وحده
+        while not first.get("variants") and len(batch) < MEDIA_GROUP_SIZE:
+            try:
+                result = await asyncio.wait_for(delivery_queue.get(), timeout=MEDIA_GROUP_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                break
+            if result is None:
+                finished = True
+                break
+            if result.get("variants"):
+                held = result
+                break
+            batch.append(result)
         
+        send_start_time = time.time()
+        frames = [frame for result in batch for frame in chart_frames(result)]
+        symbols = ", ".join(result["stock"].symbol for result in batch)
         try:
-            # محاولة العثور على منطقة الشارت بسرعة
-            wait = WebDriverWait(driver, 3)  # 3 ثوان فقط
-            chart_area = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".layout__area--center"))
-            )
-            chart_area.screenshot(file_name)
-            logger.info(f"📸 [Worker {worker_id}] تم التقاط شارت {symbol}")
-            
+            messages = await send_chart_batch(frames)
+            logger.info(f"📤 تم إرسال {len(frames)} شارت: {symbols}")
+            delivered = True
         except Exception as e:
-            logger.warning(f"⚠️ [Worker {worker_id}] أخذ لقطة شاشة كاملة: {e}")
-            driver.save_screenshot(file_name)
+            logger.error(f"❌ فشل إرسال الألبوم ({symbols}): {e}")
+            messages = []
+            delivered = False
         
-        # التحقق من وجود الملف
-        if os.path.exists(file_name) and os.path.getsize(file_name) > 1000:
-            photo = FSInputFile(file_name)
-            chart_duration = time.time() - chart_start_time
-            
-            # إرسال رسالة نصية
-            await bot.send_message(
-                chat_id=TELEGRAM_CHAT_ID,
-                text=f"📊 **شارت {name} ({symbol})**\n🏢 القطاع: {sector}\n🏛️ البورصة: {exchange}\n🔗 TradingView - رينكو شهري\n📅 {time.strftime('%Y-%m-%d %H:%M UTC')}\n⏱️ وقت المعالجة: {format_duration(chart_duration)}\n🤖 Worker: {worker_id}",
-                parse_mode="Markdown"
-            )
-            
-            # إرسال الصورة
-            await bot.send_photo(
-                chat_id=TELEGRAM_CHAT_ID,
-                photo=photo,
-                caption=f"📈 {name} ({symbol}) - {sector} | {exchange}"
-            )
-            
-            # حذف الملف
-            os.remove(file_name)
-            logger.info(f"✅ [Worker {worker_id}] تم إرسال شارت {symbol} في {format_duration(chart_duration)}")
-            return True, chart_duration, stock_info
-            
-        else:
-            chart_duration = time.time() - chart_start_time
-            logger.error(f"❌ [Worker {worker_id}] فشل في إنشاء ملف صحيح لـ {symbol}")
-            return False, chart_duration, stock_info
-            
-    except Exception as e:
-        chart_duration = time.time() - chart_start_time
-        logger.error(f"❌ [Worker {worker_id}] خطأ في معالجة {symbol}: {e}")
-        return False, chart_duration, stock_info
-
-async def process_stocks_batch(stocks_batch, processor, worker_id):
-    """معالجة مجموعة من الأسهم"""
-    results = []
-    driver = processor.drivers[worker_id]
-    
-    for stock in stocks_batch:
+        # حفظ file_id لكل شارت لإعادة استخدامه في التقارير القادمة؛ الألبوم وصل فلا يُحسب الخطأ هنا فشلاً
         try:
-            result = await capture_ultra_fast_chart(stock, driver, worker_id)
-            results.append(result)
-            # راحة قصيرة بين الأسهم
-            await asyncio.sleep(1)
+            for frame, message in zip(frames, messages):
+                if "fingerprint" in frame and message.photo:
+                    chart_cache.update(frame["cache_key"], frame["fingerprint"], message.photo[-1].file_id)
         except Exception as e:
-            logger.error(f"❌ خطأ في معالجة {stock['symbol']}: {e}")
-            results.append((False, 0, stock))
-    
-    return results
+            logger.warning(f"⚠️ تعذر حفظ file_id للألبوم ({symbols}): {e}")
+        
+        send_end_time = time.time()
+        send_time = send_end_time - send_start_time
+        for frame in frames:
+            # تحرير الصور من الذاكرة بعد الإرسال
+            frame.pop("png", None)
+        for result in batch:
+            result["success"] = delivered
+            result["send_time"] = send_time
+            result["spans"].append(["delivery_wait", result["handoff_at"], send_start_time - result["handoff_at"]])
+            result["spans"].append(["send", send_start_time, send_time])
+            await results_queue.put(result)
 
-async def send_summary_message(successful_charts, total_duration, chart_durations):
+async def send_summary_message(successful_charts, total_duration, chart_durations, unchanged_charts=(), total_stocks=None):
     """إرسال رسالة ملخص محسنة"""
     try:
-        total_stocks = len(STOCKS)
+        total_stocks = total_stocks or len(STOCKS)
         success_count = len(successful_charts)
         
         current_date = datetime.now()
@@ -381,17 +2233,19 @@ async def send_summary_message(successful_charts, total_duration, chart_duration
                 sectors[sector] = []
             sectors[sector].append(f"{stock['name']} ({stock['symbol']})")
         
-        sectors_summary = ""
+        sectors_summary = []
         for sector, stocks in sectors.items():
-            sectors_summary += f"\n🏢 **{sector}:**\n"
-            for stock in stocks:
-                sectors_summary += f"  • {stock}\n"
+            sectors_summary.append(f"\n🏢 **{sector}:**")
+            sectors_summary.extend(f"  • {stock}" for stock in stocks)
         
-        # حساب التحسن في السرعة
-        old_avg_time = 45  # الوقت القديم لكل سهم
-        speed_improvement = ((old_avg_time - avg_time_per_chart) / old_avg_time) * 100
+        # الشارتات التي لم تتغير منذ التقرير السابق
+        unchanged_summary = []
+        if unchanged_charts:
+            action = "أُعيد إرسالها دون رفع" if CHART_DEDUP_MODE == "resend" else "تم تخطيها"
+            unchanged_summary.append(f"\n🔁 **دون تغيير ({len(unchanged_charts)}) - {action}:**")
+            unchanged_summary.extend(split_message([stock['symbol'] for stock in unchanged_charts], ", "))
         
-        summary = f"""
+        summary_head = f"""
 🇺🇸 **التقرير الشهري المُحسن - بوت الأسهم الأمريكية**
 📅 الشهر: {current_month} {current_year}
 🕒 التاريخ والوقت: {time.strftime('%Y-%m-%d %H:%M UTC')}
@@ -406,34 +2260,38 @@ async def send_summary_message(successful_charts, total_duration, chart_duration
 📈 متوسط الوقت لكل شارت: {format_duration(avg_time_per_chart)}
 ⚡ أسرع شارت: {format_duration(min(chart_durations)) if chart_durations else "غير متاح"}
 🐌 أبطأ شارت: {format_duration(max(chart_durations)) if chart_durations else "غير متاح"}
-🚀 تحسن السرعة: {speed_improvement:.1f}% أسرع من السابق!
-
-✅ **الشارتات المُرسلة حسب القطاع:**{sectors_summary}
 
+✅ **الشارتات المُرسلة حسب القطاع:**""".strip()
+        
+        summary_tail = f"""
 📈 **معلومات إضافية:**
 • المصدر: TradingView
 • البورصة: NASDAQ/NYSE
 • الإطار الزمني: 1 شهر
 • نوع الشارت: Renko
-• تقنية المعالجة: متوازية بـ 3 workers
+• تقنية المعالجة: متوازية بـ {MAX_WORKERS} workers
 
 🤖 **المصدر:** GitHub Actions Bot - Ultra Fast Edition
 💡 **حالة البوت:** نشط ويعمل تلقائياً بسرعة قصوى
-        """.strip()
+        """.rstrip()
         
-        await bot.send_message(
-            chat_id=TELEGRAM_CHAT_ID,
-            text=summary,
-            parse_mode="Markdown"
-        )
+        # مع آلاف الأسهم تتجاوز القائمة حد الرسالة الواحدة فتُقسم على عدة رسائل
+        for text in split_message([summary_head, *sectors_summary, *unchanged_summary, summary_tail]):
+            await outbound.send(
+                "send_message", PRIORITY_REPORT,
+                chat_id=TELEGRAM_CHAT_ID,
+                text=text,
+                parse_mode="Markdown"
+            )
         
         logger.info("📋 تم إرسال ملخص التقرير المُحسن")
         
     except Exception as e:
         logger.error(f"❌ خطأ في إرسال الملخص: {e}")
 
-async def send_monthly_greeting():
+async def send_monthly_greeting(stocks_count=None):
     """إرسال رسالة ترحيب محسنة"""
+    stocks_count = stocks_count or len(STOCKS)
     try:
         current_date = datetime.now()
         month_names = {
@@ -445,7 +2303,7 @@ async def send_monthly_greeting():
         current_year = current_date.year
         
         # تقدير الوقت المحسن (حوالي 8 ثواني لكل سهم)
-        estimated_time = len(STOCKS) * 8  # ثانية
+        estimated_time = stocks_count * 8  # ثانية
         estimated_duration = format_duration(estimated_time)
         
         greeting = f"""
@@ -455,14 +2313,14 @@ async def send_monthly_greeting():
 🕒 بدء التشغيل: {time.strftime('%Y-%m-%d %H:%M UTC')}
 
 ⚡ **التحسينات الجديدة:**
-• معالجة متوازية بـ 3 workers
-• انتظار مُحسن: 5 ثوان بدلاً من 20
+• معالجة متوازية بـ {MAX_WORKERS} workers
+• انتظار ذكي حتى اكتمال رسم الشارت (حد أقصى {CHART_READY_TIMEOUT:.0f} ثانية)
 • Chrome محسن للسرعة القصوى
 • تحسن السرعة: 80%+ أسرع!
 
 📊 **ما سيتم عمله:**
 • تصوير شارتات الأسهم الأمريكية على فريم شهري رينكو
-• عدد الأسهم: {len(STOCKS)} سهم أمريكي
+• عدد الأسهم: {stocks_count} سهم أمريكي
 • الوقت المتوقع للإنتهاء: {estimated_duration} (محسن!)
 
 🏢 **القطاعات المشمولة:**
@@ -477,7 +2335,8 @@ async def send_monthly_greeting():
 يرجى الانتظار بينما نجلب أحدث الشارتات بسرعة قصوى!
         """.strip()
         
-        await bot.send_message(
+        await outbound.send(
+            "send_message", PRIORITY_REPORT,
             chat_id=TELEGRAM_CHAT_ID,
             text=greeting,
             parse_mode="Markdown"
@@ -488,159 +2347,711 @@ async def send_monthly_greeting():
     except Exception as e:
         logger.error(f"❌ خطأ في إرسال رسالة الترحيب: {e}")
 
-async def send_progress_update(current_index, total_stocks, elapsed_time, successful_count, failed_count):
-    """إرسال تحديث التقدم محسن"""
-    try:
-        progress_percentage = (current_index / total_stocks) * 100
-        avg_time_per_stock = elapsed_time / current_index if current_index > 0 else 0
-        remaining_stocks = total_stocks - current_index
-        estimated_remaining_time = remaining_stocks * avg_time_per_stock
-        
-        # حساب السرعة الحالية
-        stocks_per_minute = (current_index / elapsed_time) * 60 if elapsed_time > 0 else 0
+class ProgressReporter:
+    """رسالة حالة واحدة تُعدل في مكانها مع وصول النتائج، بتعديل واحد كحد أقصى كل interval ثانية"""
+    
+    def __init__(self, total_stocks, workers, interval=PROGRESS_INTERVAL, window=PROGRESS_WINDOW, shard=None):
+        self.total_stocks = total_stocks
+        self.shard = shard
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.start_time = time.time()
+        self.completed = 0
+        self.successful = 0
+        # أزمنة آخر الشارتات فقط: التقدير يتبع السرعة الحالية لا متوسط التشغيل كله
+        self.latencies = collections.deque(maxlen=window)
+        self.message_id = None
+        self.last_update = 0
+        self.updates = 0
+        self.dirty = False
+        self.wake = asyncio.Event()
+        self.task = None
+    
+    def start(self):
+        """نشر رسالة الحالة فوراً (0%) ثم تعديلها لاحقاً"""
+        self._schedule()
+    
+    def record(self, success, duration):
+        self.completed += 1
+        self.successful += success
+        self.latencies.append(duration)
+        self._schedule()
+    
+    def _schedule(self):
+        self.dirty = True
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush())
+    
+    async def _flush(self):
+        # النتائج التي تصل أثناء الانتظار أو الإرسال تُدمج في التعديل التالي
+        while self.dirty:
+            delay = self.last_update + self.interval - time.time()
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wake.wait(), delay)
+            self.dirty = False
+            await self._publish()
+    
+    async def _publish(self):
+        self.last_update = time.time()
+        text = self.render()
+        try:
+            if self.message_id is None:
+                message = await outbound.send(
+                    "send_message", PRIORITY_PROGRESS,
+                    chat_id=TELEGRAM_CHAT_ID,
+                    text=text,
+                    parse_mode="Markdown"
+                )
+                self.message_id = message.message_id
+            else:
+                await outbound.send(
+                    "edit_message_text", PRIORITY_PROGRESS,
+                    chat_id=TELEGRAM_CHAT_ID,
+                    message_id=self.message_id,
+                    text=text,
+                    parse_mode="Markdown"
+                )
+            self.updates += 1
+            logger.info(f"📊 تحديث رسالة التقدم: {self.completed}/{self.total_stocks}")
+        except Exception as e:
+            logger.warning(f"⚠️ تعذر تحديث رسالة التقدم: {e}")
+    
+    async def close(self):
+        """تعديل أخير فوري بالحالة النهائية"""
+        self.interval = 0
+        self.wake.set()
+        if self.task is not None:
+            await self.task
+    
+    def eta(self):
+        """الوقت المتبقي: المتبقي × متوسط زمن آخر الشارتات ÷ عدد الـ workers"""
+        if not self.latencies:
+            return None
+        average = sum(self.latencies) / len(self.latencies)
+        return (self.total_stocks - self.completed) * average / self.workers
+    
+    def render(self):
+        elapsed_time = time.time() - self.start_time
+        progress_percentage = (self.completed / self.total_stocks) * 100 if self.total_stocks else 100
+        stocks_per_minute = (self.completed / elapsed_time) * 60 if elapsed_time > 0 else 0
+        eta = self.eta()
+        eta_text = format_duration(eta) if eta is not None else "..."
+        recent_average = sum(self.latencies) / len(self.latencies) if self.latencies else 0
+        state = "✅ **اكتملت المعالجة**" if self.completed >= self.total_stocks else "⚡ **معالجة متوازية نشطة!**"
+        # في وضع الأجزاء رسالة مستقلة لكل جزء
+        scope = f" (الجزء {self.shard[0]}/{self.shard[1]})" if self.shard else ""
         
-        progress_message = f"""
-📊 **تحديث التقدم السريع - الأسهم الأمريكية**
+        return f"""
+📊 **تحديث التقدم السريع - الأسهم الأمريكية{scope}**
 
 🔄 **الحالة الحالية:**
-• تم إنجاز: {current_index}/{total_stocks} ({progress_percentage:.1f}%)
-• نجح: {successful_count} | فشل: {failed_count}
+• تم إنجاز: {self.completed}/{self.total_stocks} ({progress_percentage:.1f}%)
+• نجح: {self.successful} | فشل: {self.completed - self.successful}
 
 ⚡ **إحصائيات الأداء:**
 • الوقت المنقضي: {format_duration(elapsed_time)}
-• متوسط الوقت لكل سهم: {format_duration(avg_time_per_stock)}
-• السرعة الحالية: {stocks_per_minute:.1f} سهم/دقيقة
-• الوقت المتبقي المتوقع: {format_duration(estimated_remaining_time)}
+• متوسط آخر {len(self.latencies)} شارت: {format_duration(recent_average)}
+• السرعة: {stocks_per_minute:.1f} سهم/دقيقة
+• الوقت المتبقي المتوقع: {eta_text}
 
 🚀 **التقدم:** {"█" * int(progress_percentage // 5)}{"░" * (20 - int(progress_percentage // 5))} {progress_percentage:.1f}%
 
-⚡ **معالجة متوازية نشطة!**
+{state}
         """.strip()
-        
-        await bot.send_message(
-            chat_id=TELEGRAM_CHAT_ID,
-            text=progress_message,
-            parse_mode="Markdown"
-        )
-        
-        logger.info(f"📊 تم إرسال تحديث التقدم المحسن: {current_index}/{total_stocks}")
-        
-    except Exception as e:
-        logger.error(f"❌ خطأ في إرسال تحديث التقدم: {e}")
-
-async def main():
-    """الدالة الرئيسية المحسنة"""
-    # بدء قياس الوقت الإجمالي
-    total_start_time = time.time()
     
-    logger.info("🚀 بدء تشغيل بوت الأسهم الأمريكية المحسن...")
-    
-    await send_monthly_greeting()
-    
-    # إنشاء معالج سريع
-    processor = UltraFastStockProcessor(max_workers=3)
-    processor.create_driver_pool()
+    def stats(self):
+        return {"updates": self.updates, "interval": PROGRESS_INTERVAL, "completed": self.completed}
+
+def in_shard(symbol, shard_index, shard_count):
+    """تقسيم حتمي للأسهم حسب بصمة الرمز (ثابت حتى لو تغير ترتيب القائمة)"""
+    return zlib.crc32(symbol.encode("utf-8")) % shard_count == shard_index - 1
+
+def result_record(result):
+    """سجل نتيجة قابل للتسلسل إلى JSON (بدون الصورة)"""
+    stock = result["stock"]
+    return {
+        "symbol": stock.symbol,
+        "name": stock.name,
+        "sector": stock.sector,
+        "success": result["success"],
+        "unchanged": all(frame.get("unchanged", False) for frame in chart_frames(result)),
+        "duration": result["duration"],
+        "ready_time": result.get("ready_time"),
+        "attempts": result.get("attempts", 1),
+        "worker": result.get("worker"),
+        "first_on_driver": result.get("first_on_driver", False),
+        "raw_bytes": result.get("raw_bytes"),
+        "sent_bytes": result.get("sent_bytes"),
+        "variants": result.get("variant_timings", []),
+        "spans": result.get("spans", []),
+    }
+
+def merge_run_reports(reports):
+    """دمج تقارير الأجزاء: الأجزاء تعمل بالتوازي فالوقت هو الأطول والعدادات تُجمع"""
+    def summed(section, field):
+        return sum(report[section][field] for report in reports)
     
-    successful_charts = []
-    failed_charts = []
-    chart_durations = []
+    calls_by_method = {}
+    for report in reports:
+        for method, count in report["telegram"]["calls_by_method"].items():
+            calls_by_method[method] = calls_by_method.get(method, 0) + count
     
+    return {
+        "run_id": ",".join(report["run_id"] for report in reports),
+        "mode": reports[0]["mode"],
+        "backend": reports[0].get("backend", "browser"),
+        "shards": len(reports),
+        "total_stocks": sum(report["total_stocks"] for report in reports),
+        # كل جزء يقرأ القائمة كاملة؛ الدمج يحفظ كل رمز مرفوض مرة واحدة
+        "universe": {
+            "size": max(report["universe"]["size"] for report in reports),
+            "rejected": list(dict.fromkeys(symbol for report in reports for symbol in report["universe"]["rejected"])),
+        },
+        "total_duration": max(report["total_duration"] for report in reports),
+        "parallel_duration": max(report["parallel_duration"] for report in reports),
+        "started_at": min(report["started_at"] for report in reports),
+        "max_workers": sum(report["max_workers"] for report in reports),
+        # أرقام الـ workers تتكرر بين الأجزاء فتُميَّز برقم الجزء
+        "results": [
+            dict(record, worker=f"{report['shard']}/{record['worker']}")
+            for report in reports for record in report["results"]
+        ],
+        "workers": {
+            f"{report['shard']}/{worker_id}": utilization
+            for report in reports for worker_id, utilization in report["workers"].items()
+        },
+        "pool": {
+            "startup_time": max(report["pool"]["startup_time"] for report in reports),
+            "drivers": summed("pool", "drivers"),
+            "recycle_count": summed("pool", "recycle_count"),
+            "replacement_count": summed("pool", "replacement_count"),
+            "fresh_count": summed("pool", "fresh_count"),
+            "launch_failures": summed("pool", "launch_failures"),
+            "tabs_per_browser": max(report["pool"]["tabs_per_browser"] for report in reports),
+            "peak_memory_mb": summed("pool", "peak_memory_mb"),
+            "profile": reports[0]["pool"]["profile"],
+        },
+        "telegram": {
+            "api_calls": summed("telegram", "api_calls"),
+            "calls_by_method": calls_by_method,
+            "retry_after_count": summed("telegram", "retry_after_count"),
+            "throttled_time": summed("telegram", "throttled_time"),
+            "failures": summed("telegram", "failures"),
+        },
+        "network": {
+            "pages": summed("network", "pages"),
+            "blocked_patterns": max(report["network"]["blocked_patterns"] for report in reports),
+            "blocked_requests": summed("network", "blocked_requests"),
+            "requests": summed("network", "requests"),
+            "transferred_bytes": summed("network", "transferred_bytes"),
+        },
+        "retry": {
+            "spent": summed("retry", "spent"),
+            "budget": summed("retry", "budget"),
+        },
+        "prefilter": merge_prefilter([report.get("prefilter") for report in reports]),
+        "concurrency": merge_concurrency(reports),
+    }
+
+def merge_concurrency(reports):
+    """دمج حدود التوازي: الأجزاء تعمل معاً فتُجمع الحدود، والقرارات تُميَّز برقم الجزء"""
+    sections = [(report["shard"], report["concurrency"]) for report in reports if report.get("concurrency")]
+    if not sections:
+        return None
+    return {
+        "adaptive": any(section["adaptive"] for _, section in sections),
+        "initial": sum(section["initial"] for _, section in sections),
+        "minimum": sum(section["minimum"] for _, section in sections),
+        "maximum": sum(section["maximum"] for _, section in sections),
+        "final": sum(section["final"] for _, section in sections),
+        "peak": sum(section["peak"] for _, section in sections),
+        "decisions": [dict(decision, shard=shard) for shard, section in sections for decision in section["decisions"]],
+    }
+
+def merge_prefilter(sections):
+    """دمج نتائج الفلتر المسبق من الأجزاء (التقارير القديمة بلا هذا القسم تُتجاهل)"""
+    sections = [section for section in sections if section]
+    counts = collections.Counter()
+    for section in sections:
+        counts.update(section["counts"])
+    return {
+        "enabled": any(section["enabled"] for section in sections),
+        "duration": max((section["duration"] for section in sections), default=0),
+        "counts": dict(counts),
+        "unchanged": [symbol for section in sections for symbol in section["unchanged"]],
+    }
+
+def split_message(parts, separator="\n", limit=TELEGRAM_TEXT_LIMIT):
+    """جمع الأجزاء في أقل عدد من الرسائل تحت حد تليجرام دون قطع أي جزء"""
+    chunks = []
+    for part in parts:
+        if chunks and len(chunks[-1]) + len(separator) + len(part) <= limit:
+            chunks[-1] += separator + part
+        else:
+            chunks.append(part)
+    return chunks
+
+async def send_unchanged_bricks(symbols):
+    """رسالة نصية مختصرة بالأسهم التي لم تظهر لها طوبة جديدة بدلاً من إرسال شارتاتها"""
+    header = f"🧱 **بلا طوبة جديدة هذا الشهر ({len(symbols)} سهم):**\n"
     try:
-        # تقسيم الأسهم إلى مجموعات للمعالجة المتوازية
-        batch_size = len(STOCKS) // processor.max_workers
-        stock_batches = []
-        
-        for i in range(processor.max_workers):
-            start_idx = i * batch_size
-            if i == processor.max_workers - 1:  # المجموعة الأخيرة تأخذ الباقي
-                end_idx = len(STOCKS)
-            else:
-                end_idx = (i + 1) * batch_size
-            
-            stock_batches.append(STOCKS[start_idx:end_idx])
-            logger.info(f"📦 مجموعة {i+1}: {len(stock_batches[i])} سهم")
-        
-        # معالجة متوازية
-        logger.info("🚀 بدء المعالجة المتوازية...")
-        
-        # إنشاء المهام المتوازية
-        tasks = []
-        for worker_id, batch in enumerate(stock_batches):
-            task = process_stocks_batch(batch, processor, worker_id)
-            tasks.append(task)
-        
-        # تشغيل جميع المهام معاً
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # تجميع النتائج
-        processed_count = 0
-        for worker_results in batch_results:
-            if isinstance(worker_results, list):
-                for success, duration, stock_info in worker_results:
-                    processed_count += 1
-                    chart_durations.append(duration)
-                    
-                    if success:
-                        successful_charts.append(stock_info)
-                    else:
-                        failed_charts.append(stock_info)
-                    
-                    # إرسال تحديث التقدم كل 20 سهم
-                    if processed_count % 20 == 0 or processed_count == len(STOCKS):
-                        elapsed_time = time.time() - total_start_time
-                        await send_progress_update(
-                            processed_count,
-                            len(STOCKS),
-                            elapsed_time,
-                            len(successful_charts),
-                            len(failed_charts)
-                        )
-        
-        # حساب الوقت الإجمالي
-        total_duration = time.time() - total_start_time
-        
-        # إرسال الملخص النهائي
-        await send_summary_message(successful_charts, total_duration, chart_durations)
-        
-        # إرسال قائمة الأسهم الفاشلة إن وجدت
-        if failed_charts:
-            failed_list = "\n".join([f"• {info['name']} ({info['symbol']}) - {info['sector']}" for info in failed_charts])
-            await bot.send_message(
+        for chunk in split_message(sorted(symbols), ", ", TELEGRAM_TEXT_LIMIT - len(header)):
+            await outbound.send(
+                "send_message", PRIORITY_REPORT,
                 chat_id=TELEGRAM_CHAT_ID,
-                text=f"⚠️ **الأسهم التي فشل في معالجتها:**\n{failed_list}\n\n🔧 سيتم إعادة المحاولة في التقرير القادم",
+                text=header + chunk,
                 parse_mode="Markdown"
             )
-        
-        # إرسال إحصائيات الأداء النهائية
-        avg_time = sum(chart_durations) / len(chart_durations) if chart_durations else 0
-        total_stocks_per_hour = (len(STOCKS) / total_duration) * 3600
-        
-        performance_stats = f"""
+    except Exception as e:
+        logger.error(f"❌ خطأ في إرسال قائمة الأسهم بلا طوبة جديدة: {e}")
+
+async def send_run_report(report):
+    """إرسال الملخص وقائمة الفاشلة وإحصائيات الأداء من تقرير تشغيل (محلي أو مدمج من عدة أجزاء)"""
+    records = report["results"]
+    total_stocks = report["total_stocks"]
+    total_duration = report["total_duration"]
+    parallel_duration = report["parallel_duration"]
+    max_workers = report["max_workers"]
+    pool_stats = report["pool"]
+    telegram_stats = report["telegram"]
+    
+    successful_charts = [record for record in records if record["success"]]
+    failed_charts = [record for record in records if not record["success"]]
+    unchanged_charts = [record for record in successful_charts if record["unchanged"]]
+    retried_results = [record for record in records if record["attempts"] > 1]
+    chart_durations = [record["duration"] for record in records]
+    ready_times = [record["ready_time"] for record in records if record["ready_time"] is not None]
+    
+    # إرسال الملخص النهائي
+    await send_summary_message(successful_charts, total_duration, chart_durations, unchanged_charts, total_stocks)
+    
+    # إرسال قائمة الأسهم الفاشلة إن وجدت
+    if failed_charts:
+        failed_list = [f"• {info['name']} ({info['symbol']}) - {info['sector']}" for info in failed_charts]
+        try:
+            for text in split_message([
+                "⚠️ **الأسهم التي فشل في معالجتها:**",
+                *failed_list,
+                "\n🔧 يمكن إعادة المحاولة بتشغيل البوت بوضع --retry-failed",
+            ]):
+                await outbound.send(
+                    "send_message", PRIORITY_REPORT,
+                    chat_id=TELEGRAM_CHAT_ID,
+                    text=text,
+                    parse_mode="Markdown"
+                )
+        except Exception as e:
+            logger.error(f"❌ خطأ في إرسال قائمة الأسهم الفاشلة: {e}")
+    
+    prefilter = report.get("prefilter") or {}
+    if prefilter.get("unchanged"):
+        await send_unchanged_bricks(prefilter["unchanged"])
+    
+    # إرسال إحصائيات الأداء النهائية
+    avg_time = sum(chart_durations) / len(chart_durations) if chart_durations else 0
+    total_stocks_per_hour = (total_stocks / total_duration) * 3600 if total_duration > 0 else 0
+    
+    # نسبة التوازي: مجموع أوقات الشارتات مقسوماً على الوقت الفعلي للمعالجة (متوسط الشارتات الجارية معاً)
+    # ليست تسريعاً مقاساً: مقارنة worker واحد بعدة workers على نفس الأسهم في سيناريو sequential في bench.py
+    concurrency_ratio = sum(chart_durations) / parallel_duration if parallel_duration > 0 else 0
+    logger.info(f"⚡ نسبة التوازي بـ {max_workers} workers: {concurrency_ratio:.2f}x")
+    
+    avg_ready_time = sum(ready_times) / len(ready_times) if ready_times else 0
+    max_ready_time = max(ready_times) if ready_times else 0
+    
+    retry_summary = ""
+    if retried_results:
+        retry_lines = "\n".join(
+            f"• {record['symbol']}: {record['attempts']} محاولات {'✅' if record['success'] else '❌'}"
+            for record in retried_results
+        )
+        retry_summary = f"""
+
+🔁 **إعادة المحاولة داخل التشغيل:**
+• الميزانية المستخدمة: {format_duration(report['retry']['spent'])} من {format_duration(report['retry']['budget'])}
+{retry_lines}"""
+    
+    shards_line = f"\n• عدد الأجزاء المتوازية: {report['shards']}" if report.get("shards") else ""
+    
+    concurrency = report.get("concurrency") or {}
+    concurrency_line = ""
+    if concurrency.get("adaptive"):
+        actions = collections.Counter(decision["action"] for decision in concurrency["decisions"])
+        concurrency_line = (
+            f"\n• التوازي التكيفي: {concurrency['initial']} ← {concurrency['final']} "
+            f"(الذروة {concurrency['peak']}، حدود {concurrency['minimum']}-{concurrency['maximum']}) | "
+            f"زيادة {actions['increase']} / خفض {actions['decrease']} / إبقاء {actions['hold']}"
+        )
+    
+    prefilter_line = ""
+    if prefilter.get("enabled"):
+        prefilter_counts = " | ".join(
+            f"{RENKO_CHANGE_LABELS[status]}: {count}" for status, count in prefilter["counts"].items()
+        )
+        prefilter_line = f"\n• الفلتر المسبق ({format_duration(prefilter['duration'])}): {prefilter_counts}"
+    
+    rejected = report["universe"]["rejected"]
+    # سطر واحد لا يُقسم بين الرسائل: أول 20 رمزاً فقط والبقية عدداً
+    rejected_more = f" (+{len(rejected) - 20} أخرى)" if len(rejected) > 20 else ""
+    rejected_line = f"\n• رموز مرفوضة قبل التشغيل (بورصة غير معروفة): {len(rejected)} - {', '.join(rejected[:20])}{rejected_more}" if rejected else ""
+    
+    # أين يذهب الوقت: زمن كل مرحلة بدلاً من متوسط إجمالي واحد
+    stages = stage_statistics(records)
+    stage_lines = "\n".join(
+        f"• {SPAN_STAGES[stage]}: {stats['p50']:.2f} / {stats['p95']:.2f} / {stats['p99']:.2f} ث"
+        for stage, stats in stages.items()
+    )
+    utilization = list(report["workers"].values())
+    avg_utilization = sum(utilization) / len(utilization) * 100 if utilization else 0
+    min_utilization = min(utilization) * 100 if utilization else 0
+    
+    # البدء البارد: أول شارت على كل متصفح مقابل البقية
+    cold_start = cold_start_statistics(records)
+    profile_labels = {"warm": "ملف دافئ", "cold": "ملف جديد", "off": "بدون ملف محفوظ"}
+    
+    # حجم الرفع: الصور الخام مقابل الصور بعد القص والضغط
+    images = image_statistics(records)
+    
+    # الأطر الإضافية: تبديل في نفس الصفحة مقابل تحميل صفحة كاملة
+    variants = variant_statistics(records)
+    variants_line = ""
+    if variants["captured"] or variants["failed"]:
+        variants_line = (
+            f"\n• أطر إضافية من نفس الصفحة: {variants['captured']} لقطة ({variants['failed']} فشل، {variants['reloads']} إعادة تحميل) | "
+            f"التبديل {variants['switch_p50']:.2f} ث مقابل {variants['first_load_p50']:.2f} ث لتحميل الصفحة (توفير {format_duration(variants['saved'])})"
+        )
+    
+    # وزن الصفحة: ما حُظر وما نُقل فعلاً لكل صفحة
+    network = report["network"]
+    network_pages = network["pages"] or 1
+    
+    # كفاءة الذاكرة: شارتات ناجحة لكل GB من ذروة ذاكرة المتصفحات
+    peak_memory_mb = pool_stats["peak_memory_mb"]
+    charts_per_gb = len(successful_charts) / (peak_memory_mb / 1024) if peak_memory_mb else 0
+    
+    if report.get("backend") == "renko":
+        charts_per_minute = len(successful_charts) / parallel_duration * 60 if parallel_duration > 0 else 0
+        backend_section = f"""🧱 **الرسم المحلي (رينكو):**
+• بدون متصفح: الشارتات مرسومة من ملفات OHLC المحلية
+• معدل الرسم: {charts_per_minute:.0f} شارت/دقيقة"""
+    else:
+        backend_section = f"""🌐 **مجموعة المتصفحات:**
+• زمن تشغيل المتصفحات: {format_duration(pool_stats['startup_time'])} ({pool_stats['drivers']}/{max_workers} جاهزة، {pool_stats['tabs_per_browser']} تبويب لكل متصفح)
+• أول شارت لكل متصفح: {cold_start['first_p50']:.1f} ث مقابل {cold_start['steady_p50']:.1f} ث للبقية ({profile_labels[pool_stats['profile']]})
+• ذروة ذاكرة المتصفحات: {peak_memory_mb:.0f} MB | {charts_per_gb:.1f} شارت لكل GB
+• إعادة تدوير: {pool_stats['recycle_count']} | استبدال drivers معطلة: {pool_stats['replacement_count']} | drivers جديدة لإعادة المحاولة: {pool_stats['fresh_count']}
+• طلبات محظورة لكل صفحة: {network['blocked_requests'] / network_pages:.1f} ({network['blocked_patterns']} نمط) | منقول لكل صفحة: {network['requests'] / network_pages:.0f} طلب، {network['transferred_bytes'] / network_pages / 1024:.0f} KB{variants_line}"""
+    
+    performance_stats = f"""
 🎯 **إحصائيات الأداء النهائية**
 
 ⚡ **السرعة:**
 • إجمالي الوقت: {format_duration(total_duration)}
 • متوسط الوقت لكل سهم: {format_duration(avg_time)}
 • معدل المعالجة: {total_stocks_per_hour:.1f} سهم/ساعة
+• نسبة التوازي (مجموع أزمنة الشارتات ÷ الزمن الفعلي): {concurrency_ratio:.2f}x بـ {max_workers} workers{shards_line}{concurrency_line}
+• متوسط زمن جاهزية الشارت: {format_duration(avg_ready_time)} (الأقصى: {format_duration(max_ready_time)})
+
+⏱️ **زمن المراحل (p50 / p95 / p99):**
+{stage_lines}
+• استغلال الـ workers: {avg_utilization:.0f}% في المتوسط (الأدنى {min_utilization:.0f}%)
+
+{backend_section}
+
+📨 **تليجرام:**
+• حجم الصور المرفوعة ({images['format']}): {images['raw_bytes'] / 1048576:.1f} MB ← {images['sent_bytes'] / 1048576:.1f} MB (توفير {images['saved_ratio'] * 100:.0f}%)
+• طلبات API: {telegram_stats['api_calls']} | طلبات انتظار (429): {telegram_stats['retry_after_count']}
+• وقت الانتظار بسبب حدود الإرسال: {format_duration(telegram_stats['throttled_time'])}
 
 📊 **النتائج:**
-• نجح: {len(successful_charts)}/{len(STOCKS)} ({(len(successful_charts)/len(STOCKS)*100):.1f}%)
-• فشل: {len(failed_charts)}/{len(STOCKS)} ({(len(failed_charts)/len(STOCKS)*100):.1f}%)
+• نجح: {len(successful_charts)}/{total_stocks} ({(len(successful_charts)/total_stocks*100):.1f}%)
+• فشل: {len(failed_charts)}/{total_stocks} ({(len(failed_charts)/total_stocks*100):.1f}%){prefilter_line}{rejected_line}{retry_summary}
 
 🚀 **التحسينات المطبقة:**
 • معالجة متوازية ✅
 • Chrome محسن ✅  
 • انتظار مُحسن ✅
-• تحسن السرعة: ~80% ✅
 
 ✨ **تم الانتهاء بنجاح!**
-        """.strip()
-        
-        await bot.send_message(
-            chat_id=TELEGRAM_CHAT_ID,
-            text=performance_stats,
-            parse_mode="Markdown"
+    """.strip()
+    
+    # قائمة الأسهم المعاد محاولتها قد تطيل الرسالة، وفشل الإرسال لا يمنع إنهاء التشغيل
+    try:
+        for text in split_message(performance_stats.split("\n")):
+            await outbound.send(
+                "send_message", PRIORITY_REPORT,
+                chat_id=TELEGRAM_CHAT_ID,
+                text=text,
+                parse_mode="Markdown"
+            )
+    except Exception as e:
+        logger.error(f"❌ خطأ في إرسال إحصائيات الأداء: {e}")
+
+def write_report_file(report, path):
+    """كتابة تقرير التشغيل كملف JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+def write_run_artifacts(report):
+    """كتابة تقرير التشغيل مع إحصائيات المراحل كـ JSON والمراحل الخام كـ CSV"""
+    try:
+        if RUN_REPORT_FILE:
+            write_report_file(dict(
+                report,
+                stages=stage_statistics(report["results"]),
+                cold_start=cold_start_statistics(report["results"]),
+                images=image_statistics(report["results"]),
+                variants=variant_statistics(report["results"]),
+            ), RUN_REPORT_FILE)
+        if SPANS_CSV_FILE:
+            write_spans_csv(report["results"], report["started_at"], SPANS_CSV_FILE)
+    except OSError as e:
+        logger.warning(f"⚠️ تعذر كتابة ملفات تقرير التشغيل: {e}")
+
+def write_shard_report(report, shard_index, shard_count):
+    """كتابة نتيجة الجزء كملف JSON ليدمجها أمر --merge لاحقاً"""
+    os.makedirs(SHARD_RESULTS_DIR, exist_ok=True)
+    path = os.path.join(SHARD_RESULTS_DIR, f"shard-{shard_index}-of-{shard_count}.json")
+    report = dict(report, shard=shard_index, shard_count=shard_count)
+    write_report_file(report, path)
+    logger.info(f"💾 تم حفظ نتيجة الجزء {shard_index}/{shard_count} في {path}")
+    return path
+
+async def main(mode="full", shard=None, processor=None):
+    """الدالة الرئيسية المحسنة؛ الوضع الدائم يمرر معالجاً بمتصفحات دافئة يبقى مفتوحاً بعد التشغيل"""
+    # بدء قياس الوقت الإجمالي
+    total_start_time = time.time()
+    daemon = processor is not None
+    # العدادات العامة تتراكم طوال عمر العملية (أوامر /chart والتشغيلات السابقة في الوضع الدائم): التقرير يعرض الفرق فقط
+    telegram_start = outbound.stats()
+    network_start = network_stats.stats()
+    
+    logger.info("🚀 بدء تشغيل بوت الأسهم الأمريكية المحسن...")
+    
+    run_store = RunStateStore(RUN_STATE_DB)
+    run_store.open()
+    run_id, selected = select_run_stocks(run_store, mode)
+    
+    # الفلتر المسبق: الأسهم التي لم تظهر لها طوبة جديدة لا تُفتح في المتصفح أصلاً
+    prefilter = {}
+    unchanged_bricks = []
+    prefilter_duration = 0
+    if RENKO_PREFILTER:
+        prefilter_start = time.time()
+        candidates = list(iter_run_stocks(selected, shard))
+        prefilter = await asyncio.to_thread(renko_prefilter, candidates, run_store.renko_states())
+        prefilter_duration = time.time() - prefilter_start
+        unchanged_bricks = [stock.symbol for stock in candidates if prefilter[stock.symbol][0] == "unchanged"]
+        change_counts = collections.Counter(status for status, _ in prefilter.values())
+        logger.info(
+            f"🧱 الفلتر المسبق: {len(candidates)} سهم في {format_duration(prefilter_duration)} ← "
+            + ", ".join(f"{RENKO_CHANGE_LABELS[status]} {count}" for status, count in change_counts.items())
         )
+        if unchanged_bricks:
+            skipped = set(unchanged_bricks)
+            run_selected = selected
+            selected = lambda stock: stock.symbol not in skipped and (run_selected is None or run_selected(stock))
+    
+    # عدّ فقط: الأسهم نفسها تُمرر لاحقاً إلى الطابور دون نسخ القائمة
+    total_stocks = sum(1 for _ in iter_run_stocks(selected, shard))
+    if shard:
+        logger.info(f"🧩 الجزء {shard[0]}/{shard[1]}: {total_stocks} سهم")
+    run_store.start_run(run_id, mode)
+    if unchanged_bricks:
+        run_store.record_many(run_id, unchanged_bricks, "unchanged")
+    
+    prefilter_report = {
+        "enabled": RENKO_PREFILTER,
+        "duration": prefilter_duration,
+        "counts": dict(collections.Counter(status for status, _ in prefilter.values())),
+        "unchanged": unchanged_bricks,
+    }
+    
+    if not total_stocks:
+        logger.info("✅ لا توجد أسهم متبقية للمعالجة")
+        if shard:
+            # ملف الجزء يُكتب حتى دون أسهم، وإلا لا يرى أمر merge قائمة الأسهم بلا طوبة جديدة فيه
+            write_shard_report({
+                "run_id": run_id,
+                "mode": mode,
+                "backend": CHART_BACKEND,
+                "started_at": total_start_time,
+                "total_stocks": 0,
+                "universe": {"size": len(STOCKS), "rejected": REJECTED_SYMBOLS},
+                "total_duration": time.time() - total_start_time,
+                "parallel_duration": 0,
+                "max_workers": 0,
+                "results": [],
+                "pool": DriverPool(0).stats(),
+                "telegram": outbound.stats(telegram_start),
+                "network": network_stats.stats(network_start),
+                "retry": {"spent": 0, "budget": 0},
+                "progress": None,
+                "concurrency": None,
+                "prefilter": prefilter_report,
+                "workers": {},
+            }, *shard)
+        elif unchanged_bricks:
+            await send_unchanged_bricks(unchanged_bricks)
+        run_store.finish_run(run_id)
+        run_store.close()
+        if not daemon:
+            await bot.session.close()
+        return
+    
+    logger.info(f"🆔 التشغيل {run_id} ({mode}): {total_stocks} سهم")
+    # في وضع الأجزاء يُرسل الترحيب مرة واحدة بأمر greet قبل بدء الأجزاء، والتقرير الموحد بأمر merge
+    if not shard:
+        await send_monthly_greeting(total_stocks)
+    
+    if CHART_DEDUP_MODE != "off":
+        chart_cache.load()
+    
+    # إنشاء معالج سريع، أو إعادة استخدام معالج الوضع الدائم
+    if daemon:
+        processor.new_run()
+    else:
+        processor = UltraFastStockProcessor(max_workers=MAX_WORKERS)
+    
+    records = []
+    progress = None
+    controller_task = None
+    
+    try:
+        if CHART_BACKEND == "browser" and not daemon:
+            await processor.create_driver_pool()
+        
+        # معالجة متوازية
+        logger.info(f"🚀 بدء المعالجة المتوازية ({CHART_BACKEND}): {total_stocks} سهم على {processor.max_workers} workers...")
+        
+        parallel_start_time = time.time()
+        delivery_queue = asyncio.Queue(maxsize=DELIVERY_QUEUE_SIZE)
+        sender = asyncio.create_task(chart_sender(delivery_queue, processor.results_queue))
+        
+        # الالتقاط ← معالجة الصور ← الإرسال، وكل مرحلة بطابور محدود
+        image_stages = []
+        capture_queue = delivery_queue
+        if processor.image_pool:
+            capture_queue = asyncio.Queue(maxsize=DELIVERY_QUEUE_SIZE)
+            image_stages = [
+                asyncio.create_task(image_stage(capture_queue, delivery_queue, processor.image_pool))
+                for _ in range(IMAGE_WORKERS)
+            ]
+        
+        if CHART_BACKEND == "renko":
+            # دون متصفح: worker واحد يحسب الرينكو لكل دفعة والرسم يتوزع على عمليات الصور
+            workers = [asyncio.create_task(renko_worker(iter_run_stocks(selected, shard), capture_queue, processor))]
+            feeder = None
+        else:
+            # طابور مشترك محدود: كل worker يسحب السهم التالي فور انتهائه، والقائمة تُمرر إليه تدريجياً
+            # فلا يكبر الطابور مع آلاف الرموز
+            # workers بعدد الحد الأقصى للتوازي؛ الزائدة عن الحد الحالي تنتظر تصريح المتحكم
+            worker_count = processor.controller.maximum
+            job_queue = asyncio.Queue(maxsize=worker_count * 2)
+            workers = [
+                asyncio.create_task(stock_worker(job_queue, capture_queue, processor, worker_id))
+                for worker_id in range(worker_count)
+            ]
+            
+            async def feed_jobs():
+                for stock in iter_run_stocks(selected, shard):
+                    await job_queue.put((stock, 1, time.time()))
+                for _ in workers:
+                    await job_queue.put(None)
+            
+            feeder = asyncio.create_task(feed_jobs())
+            if processor.controller.adaptive:
+                controller_task = asyncio.create_task(processor.controller.run())
+        
+        async def close_delivery():
+            await asyncio.gather(*workers, return_exceptions=True)
+            for _ in image_stages:
+                await capture_queue.put(None)
+            await asyncio.gather(*image_stages, return_exceptions=True)
+            await delivery_queue.put(None)
+        
+        delivery_closer = asyncio.create_task(close_delivery())
+        
+        progress = ProgressReporter(total_stocks, len(workers) if CHART_BACKEND == "browser" else IMAGE_WORKERS, shard=shard)
+        progress.start()
+        
+        # تجميع النتائج فور وصولها
+        while len(records) < total_stocks:
+            if sender.done() and processor.results_queue.empty():
+                logger.error("❌ توقفت المعالجة قبل اكتمال جميع الأسهم")
+                break
+            
+            try:
+                result = await asyncio.wait_for(processor.results_queue.get(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            
+            record = result_record(result)
+            records.append(record)
+            
+            if record["success"]:
+                status = "unchanged" if record["unchanged"] else "delivered"
+            else:
+                status = "failed"
+            run_store.record(run_id, record["symbol"], status, record["duration"], record["attempts"])
+            # حالة الرينكو تُحدث بعد التسليم فقط، فالسهم الفاشل يبقى "متغيراً" في التشغيل القادم
+            signature = prefilter.get(record["symbol"], (None, None))[1]
+            if record["success"] and signature:
+                run_store.save_renko_state(record["symbol"], *signature)
+            
+            if progress:
+                if processor.controller:
+                    progress.workers = max(1, processor.controller.limit)
+                progress.record(record["success"], record["duration"])
+        
+        parallel_duration = time.time() - parallel_start_time
+        if progress:
+            await progress.close()
+        if sender.done() and sender.exception():
+            # لا أحد يفرغ طابور الإرسال بعد توقف المرسل: إلغاء المراحل السابقة بدل انتظار put() إلى الأبد
+            logger.error(f"❌ توقف مرسل الشارتات: {sender.exception()}")
+            for task in [*workers, *image_stages, delivery_closer]:
+                task.cancel()
+        await asyncio.gather(delivery_closer, sender, return_exceptions=True)
+        if feeder:
+            feeder.cancel()
+        if controller_task:
+            controller_task.cancel()
+        
+        report = {
+            "run_id": run_id,
+            "mode": mode,
+            "backend": CHART_BACKEND,
+            "started_at": total_start_time,
+            "total_stocks": total_stocks,
+            "universe": {"size": len(STOCKS), "rejected": REJECTED_SYMBOLS},
+            # حساب الوقت الإجمالي
+            "total_duration": time.time() - total_start_time,
+            "parallel_duration": parallel_duration,
+            "max_workers": processor.max_workers,
+            "results": records,
+            "pool": processor.pool.stats(),
+            "telegram": outbound.stats(telegram_start),
+            "network": network_stats.stats(network_start),
+            "retry": {"spent": processor.retry_lane.spent, "budget": processor.retry_lane.budget},
+            "progress": progress.stats() if progress else None,
+            "concurrency": processor.controller.stats() if processor.controller else None,
+            "prefilter": prefilter_report,
+            # نسبة وقت العمل الفعلي لكل worker من زمن المعالجة المتوازية
+            "workers": {
+                str(worker_id): busy / parallel_duration if parallel_duration > 0 else 0
+                for worker_id, busy in sorted(processor.worker_busy.items())
+            },
+        }
+        
+        write_run_artifacts(report)
+        if shard:
+            write_shard_report(report, *shard)
+        else:
+            await send_run_report(report)
+        
+        run_store.finish_run(run_id)
                 
     except Exception as e:
         total_duration = time.time() - total_start_time
@@ -657,14 +3068,15 @@ async def main():
 {str(e)}
 
 🔧 **الإجراءات:**
-• سيتم إعادة المحاولة في الموعد القادم
+• يمكن استكمال الأسهم المتبقية بتشغيل البوت بوضع --resume
 • تحقق من حالة GitHub Actions
 • راجع سجلات الأخطاء للمزيد من التفاصيل
 
 ⚡ **ملاحظة:** النسخة المحسنة تعمل بسرعة أكبر!
             """.strip()
             
-            await bot.send_message(
+            await outbound.send(
+                "send_message", PRIORITY_REPORT,
                 chat_id=TELEGRAM_CHAT_ID,
                 text=error_message,
                 parse_mode="Markdown"
@@ -673,28 +3085,432 @@ async def main():
             logger.error("فشل في إرسال رسالة الخطأ")
         
     finally:
-        # تنظيف الموارد
-        try:
-            processor.cleanup_drivers()
-            logger.info("🔒 تم إغلاق جميع Chrome Drivers")
-        except:
-            logger.warning("⚠️ خطأ في إغلاق Drivers")
+        # تنظيف الموارد (المتصفحات الدافئة في الوضع الدائم تبقى للتشغيل القادم)
+        if not daemon:
+            try:
+                await processor.cleanup_drivers()
+                logger.info("🔒 تم إغلاق جميع Chrome Drivers")
+            except:
+                logger.warning("⚠️ خطأ في إغلاق Drivers")
             
-        try:
-            await bot.session.close()
-            logger.info("🔒 تم إغلاق جلسة البوت")
-        except:
-            logger.warning("⚠️ خطأ في إغلاق جلسة البوت")
+        run_store.close()
+        
+        if CHART_DEDUP_MODE != "off":
+            try:
+                chart_cache.save()
+                logger.info(f"🗂️ تم حفظ ذاكرة الشارتات: {len(chart_cache.entries)} شارت")
+            except Exception as e:
+                logger.warning(f"⚠️ تعذر حفظ ذاكرة الشارتات: {e}")
+        
+        # بعد خطأ قد يبقى تعديل تقدم معلق
+        if progress and progress.task:
+            progress.task.cancel()
+        if controller_task:
+            controller_task.cancel()
+        
+        if not daemon:
+            try:
+                await outbound.close()
+                await bot.session.close()
+                logger.info("🔒 تم إغلاق جلسة البوت")
+            except:
+                logger.warning("⚠️ خطأ في إغلاق جلسة البوت")
         
         # حساب وعرض الوقت الإجمالي النهائي
         final_total_duration = time.time() - total_start_time
         logger.info(f"🏁 انتهى التشغيل المحسن - الوقت الإجمالي: {format_duration(final_total_duration)}")
+
+async def merge_main(paths):
+    """دمج ملفات نتائج الأجزاء وإرسال تقرير موحد واحد"""
+    try:
+        reports = []
+        for path in sorted(paths):
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        
+        if not reports:
+            logger.error("❌ لا توجد ملفات أجزاء للدمج")
+            return
+        
+        logger.info(f"🧩 دمج {len(reports)} جزء: {sum(len(report['results']) for report in reports)} سهم")
+        report = merge_run_reports(reports)
+        write_run_artifacts(report)
+        if report["total_stocks"]:
+            await send_run_report(report)
+        elif report["prefilter"] and report["prefilter"]["unchanged"]:
+            # كل الأجزاء بلا أسهم للمعالجة: القائمة المختصرة وحدها كما في التشغيل غير الموزع
+            await send_unchanged_bricks(report["prefilter"]["unchanged"])
+    finally:
+        await outbound.close()
+        await bot.session.close()
+
+async def greet_main():
+    """رسالة الترحيب وحدها: في التشغيل الموزع تُرسل مرة واحدة قبل بدء الأجزاء"""
+    try:
+        await send_monthly_greeting()
+    finally:
+        await outbound.close()
+        await bot.session.close()
+
+def next_monthly_run(now, day=DAEMON_RUN_DAY, hour=DAEMON_RUN_HOUR):
+    """أقرب موعد للتقرير الشهري بعد اللحظة المعطاة (اليوم محصور بين 1 و28 حتى يوجد في كل شهر)"""
+    run_at = now.replace(day=min(max(day, 1), 28), hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at = run_at.replace(year=now.year + now.month // 12, month=now.month % 12 + 1)
+    return run_at
+
+class ChartDaemon:
+    """الوضع الدائم: أوامر /chart على المتصفحات الدافئة مع ذاكرة مؤقتة ودمج الطلبات المتزامنة، والتقرير الشهري بجدولة داخلية"""
+    
+    def __init__(self, processor, ttl=ON_DEMAND_CACHE_TTL):
+        self.processor = processor
+        self.ttl = ttl
+        self.detector = ChartReadinessDetector()
+        self.stocks = {stock.symbol: stock for stock in STOCKS}
+        # محرك الرينكو المحلي يرسم الإطار الشهري فقط
+        self.intervals = ON_DEMAND_INTERVALS if CHART_BACKEND == "browser" else (CHART_INTERVAL,)
+        # مفتاح الشارت ← (انتهاء الصلاحية، file_id، الوصف)
+        self.cache = {}
+        # مفتاح الشارت ← Future يكتمل بـ (file_id، الوصف) عند انتهاء أول التقاط
+        self.inflight = {}
+        self.sources = collections.Counter()
+        self.latencies = {}
+        self.failures = 0
+        self.rejected = 0
+        self.monthly_runs = 0
+        self.next_run = None
+        self.started_at = time.time()
+    
+    async def run_scheduler(self):
+        """تشغيل التقرير الشهري في موعده على نفس المتصفحات الدافئة"""
+        while True:
+            self.next_run = next_monthly_run(datetime.now(timezone.utc))
+            logger.info(f"🗓️ التقرير الشهري القادم: {self.next_run:%Y-%m-%d %H:%M} UTC")
+            while True:
+                remaining = (self.next_run - datetime.now(timezone.utc)).total_seconds()
+                if remaining <= 0:
+                    break
+                # نوم على دفعات حتى لا ينحرف الموعد إذا توقف الجهاز مؤقتاً
+                await asyncio.sleep(min(remaining, 3600))
+            try:
+                await main("full", processor=self.processor)
+            except Exception as e:
+                logger.error(f"❌ فشل التقرير الشهري المجدول: {e}")
+            self.monthly_runs += 1
+    
+    async def _reply(self, message, text):
+        await outbound.send(
+            "send_message", PRIORITY_COMMAND,
+            chat_id=message.chat.id,
+            text=text,
+            reply_to_message_id=message.message_id
+        )
+    
+    async def on_chart(self, message, command):
+        """/chart SYMBOL [interval]"""
+        received_at = time.time()
+        if str(message.chat.id) not in DAEMON_ALLOWED_CHATS:
+            logger.warning(f"🚫 أمر /chart من محادثة غير مسموحة: {message.chat.id}")
+            return
+        
+        args = (command.args or "").upper().split()
+        stock = self.stocks.get(args[0]) if args else None
+        interval = args[1] if len(args) > 1 else CHART_INTERVAL
+        if not stock or len(args) > 2 or interval not in self.intervals:
+            self.rejected += 1
+            await self._reply(message, f"⚠️ الاستخدام: /chart SYMBOL [{'|'.join(self.intervals)}] لسهم من القائمة")
+            return
         
-        # حساب التحسن في الأداء
-        old_estimated_time = len(STOCKS) * 45  # الوقت القديم
-        improvement_percentage = ((old_estimated_time - final_total_duration) / old_estimated_time) * 100
-        logger.info(f"🚀 تحسن الأداء: {improvement_percentage:.1f}% أسرع من النسخة السابقة!")
+        key = ChartCache.key(stock.symbol, interval)
+        entry = self.cache.get(key)
+        try:
+            if entry and entry[0] > received_at:
+                source = "cache"
+                await self._send(message, entry[1], entry[2])
+            elif key in self.inflight:
+                # طلب آخر لنفس الشارت قيد الالتقاط: انتظار نتيجته بدلاً من التقاط ثانٍ
+                source = "coalesced"
+                file_id, caption = await asyncio.shield(self.inflight[key])
+                await self._send(message, file_id, caption)
+            else:
+                source = "capture"
+                await self._capture_and_send(message, key, stock, interval)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ فشل طلب /chart {stock.symbol} {interval}: {e}")
+            with contextlib.suppress(Exception):
+                await self._reply(message, f"❌ تعذر التقاط شارت {stock.symbol} ({interval})، حاول لاحقاً")
+            self.write_metrics()
+            return
+        
+        latency = time.time() - received_at
+        self.sources[source] += 1
+        self.latencies.setdefault(source, collections.deque(maxlen=ON_DEMAND_METRICS_WINDOW)).append(latency)
+        logger.info(f"📨 /chart {stock.symbol} {interval}: {source} في {format_duration(latency)}")
+        self.write_metrics()
+    
+    async def _send(self, message, photo, caption):
+        """إرسال الشارت رداً على الأمر وإرجاع file_id لإعادة استخدامه"""
+        sent = await outbound.send(
+            "send_photo", PRIORITY_COMMAND,
+            chat_id=message.chat.id,
+            photo=photo,
+            caption=caption,
+            parse_mode="Markdown",
+            reply_to_message_id=message.message_id
+        )
+        return sent.photo[-1].file_id
+    
+    async def _capture_and_send(self, message, key, stock, interval):
+        """التقاط واحد يُرفع مرة واحدة؛ الطلبات المدموجة والمخزنة تُرسل بـ file_id الناتج"""
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._capture(stock, interval)
+            caption = (
+                f"📊 **{stock.name} ({stock.symbol})**\n⏱️ {interval} · {CHART_STYLE_NAMES.get(CHART_STYLE, CHART_STYLE)}\n"
+                f"📅 {time.strftime('%Y-%m-%d %H:%M UTC')}"
+            )
+            file_id = await self._send(message, chart_media(result), caption)
+            now = time.time()
+            self.cache = {cached: entry for cached, entry in self.cache.items() if entry[0] > now}
+            self.cache[key] = (now + self.ttl, file_id, caption)
+            future.set_result((file_id, caption))
+        except Exception as e:
+            future.set_exception(e)
+            # قراءة الاستثناء حتى لا يُسجل تحذير عند عدم وجود طلبات مدموجة
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self.inflight[key]
+    
+    async def _capture(self, stock, interval):
+        """التقاط الشارت بنفس مسار التقرير الشهري (حد التوازي والمتصفحات ومعالجة الصور) دون أطر إضافية"""
+        loop = asyncio.get_running_loop()
+        if CHART_BACKEND == "renko":
+            import renko
+            
+            series = (await loop.run_in_executor(None, renko.compute_renko_batch, [stock.symbol]))[0]
+            if not series:
+                raise RuntimeError(f"لا توجد بيانات أسعار صالحة في {renko.RENKO_DATA_DIR}")
+            png, _, _ = await loop.run_in_executor(self.processor.image_pool, render_renko_capture, series)
+            result = {"success": True, "stock": stock, "png": png, "unchanged": False}
+        else:
+            async with self.processor.controller.slot(), self.processor.pool.lease() as tab:
+                result = await capture_ultra_fast_chart(stock, tab, "/chart", self.detector, interval=interval, variants=())
+                if CHART_NETWORK_STATS:
+                    # تفريغ سجل الشبكة حتى لا تُنسب طلبات هذه الصفحة إلى أول صفحة في التقرير القادم
+                    await tab.run(drain_network_log, tab.driver)
+            if not result["success"]:
+                raise RuntimeError("لم يكتمل رسم الشارت")
+        
+        # الشارت المطابق لآخر تقرير شهري يُرسل بـ file_id المحفوظ دون رفع
+        if self.processor.image_pool and not result["unchanged"]:
+            result["png"], result["extension"] = await loop.run_in_executor(
+                self.processor.image_pool, process_chart_image, result["png"]
+            )
+        return result
+    
+    async def on_stats(self, message):
+        """/stats: زمن الاستجابة ونسبة الإصابة في الذاكرة"""
+        if str(message.chat.id) not in DAEMON_ALLOWED_CHATS:
+            return
+        stats = self.stats()
+        latency_lines = "\n".join(
+            f"• {source}: {values['p50']:.2f} / {values['p95']:.2f} ث ({values['count']} طلب)"
+            for source, values in stats["latency"].items()
+        )
+        next_run = f"{self.next_run:%Y-%m-%d %H:%M} UTC" if self.next_run else "-"
+        await self._reply(message, f"""📈 مقاييس الوضع الدائم
+• مدة التشغيل: {format_duration(stats['uptime'])} | تقارير شهرية: {stats['monthly_runs']} | القادم: {next_run}
+• الطلبات: {stats['served']} ناجح / {stats['failures']} فشل / {stats['rejected']} مرفوض
+• من الذاكرة: {stats['sources'].get('cache', 0)} (نسبة الإصابة {stats['hit_rate'] * 100:.0f}%) | مدموج: {stats['sources'].get('coalesced', 0)} | التقاط جديد: {stats['sources'].get('capture', 0)}
+• شارتات في الذاكرة: {stats['cache_entries']} (صلاحية {format_duration(self.ttl)})
+
+⏱️ زمن الاستجابة p50 / p95:
+{latency_lines or '• لا طلبات بعد'}""")
+    
+    def stats(self):
+        served = sum(self.sources.values())
+        latencies = {source: list(values) for source, values in self.latencies.items()}
+        if latencies:
+            latencies["all"] = [value for values in latencies.values() for value in values]
+        return {
+            "uptime": time.time() - self.started_at,
+            "served": served,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "sources": dict(self.sources),
+            # الطلبات المدموجة لا تُحسب إصابة: انتظرت التقاطاً جارياً
+            "hit_rate": self.sources["cache"] / served if served else 0,
+            "latency": {
+                source: {"count": len(values), "p50": percentile(values, 0.50), "p95": percentile(values, 0.95)}
+                for source, values in latencies.items()
+            },
+            "cache_entries": len(self.cache),
+            "inflight": len(self.inflight),
+            "monthly_runs": self.monthly_runs,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "pool": self.processor.pool.stats() if CHART_BACKEND == "browser" else None,
+        }
+    
+    def write_metrics(self):
+        if not DAEMON_METRICS_FILE:
+            return
+        try:
+            write_report_file(self.stats(), DAEMON_METRICS_FILE)
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر كتابة مقاييس الوضع الدائم: {e}")
+
+async def daemon_main():
+    """تشغيل دائم: متصفحات دافئة، التقرير الشهري بجدولة داخلية، وأوامر /chart و /stats عبر polling"""
+    from aiogram import Dispatcher
+    from aiogram.filters import Command
+    
+    processor = UltraFastStockProcessor(max_workers=MAX_WORKERS)
+    daemon = ChartDaemon(processor)
+    dispatcher = Dispatcher()
+    dispatcher.message.register(daemon.on_chart, Command("chart"))
+    dispatcher.message.register(daemon.on_stats, Command("stats"))
+    scheduler = None
+    
+    try:
+        if CHART_BACKEND == "browser":
+            await processor.create_driver_pool()
+        if CHART_DEDUP_MODE != "off":
+            chart_cache.load()
+        scheduler = asyncio.create_task(daemon.run_scheduler())
+        logger.info(f"🛰️ الوضع الدائم جاهز ({CHART_BACKEND}) خلال {format_duration(time.perf_counter() - STARTUP_TIME)}: أوامر /chart من {len(DAEMON_ALLOWED_CHATS)} محادثة")
+        # الطلبات تُعالج كمهام متزامنة، و polling يتوقف عند SIGINT/SIGTERM
+        await dispatcher.start_polling(bot, close_bot_session=False)
+    finally:
+        if scheduler:
+            scheduler.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await scheduler
+        try:
+            await processor.cleanup_drivers()
+            logger.info("🔒 تم إغلاق جميع Chrome Drivers")
+        except Exception:
+            logger.warning("⚠️ خطأ في إغلاق Drivers")
+        daemon.write_metrics()
+        await outbound.close()
+        await bot.session.close()
+        logger.info(f"🏁 انتهى الوضع الدائم بعد {format_duration(time.time() - daemon.started_at)}")
+
+def parse_shard(value):
+    """تحويل 'i/N' إلى (i, N) مع 1 <= i <= N"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("الصيغة المطلوبة: i/N مثل 1/3")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("يجب أن يكون 1 <= i <= N")
+    return index, count
+
+def dry_run(shard=None, show_urls=False):
+    """التحقق من قائمة الأسهم وحساب روابط الشارتات (وملفات الأسعار مع renko) دون متصفح أو تليجرام؛ يعيد رمز الخروج"""
+    stocks = list(iter_run_stocks(None, shard))
+    exchanges = collections.Counter(stock.exchange for stock in stocks)
+    bad_urls = [
+        stock.symbol for stock in stocks
+        if not CHART_URLS.get(stock.symbol, "").startswith(("http://", "https://"))
+    ]
+    
+    if show_urls:
+        for stock in stocks:
+            print(f"{stock.symbol}\t{CHART_URLS.get(stock.symbol, '')}")
+    
+    scope = f" (الجزء {shard[0]}/{shard[1]})" if shard else ""
+    logger.info(f"📋 {STOCK_UNIVERSE_FILE}: {len(STOCKS)} سهم صالح{scope} → {len(stocks)} سهم للتشغيل")
+    logger.info(f"🏛️ البورصات: {', '.join(f'{name} {count}' for name, count in sorted(exchanges.items()))}")
+    if REJECTED_SYMBOLS:
+        logger.warning(f"⚠️ رموز مرفوضة: {len(REJECTED_SYMBOLS)} ({', '.join(REJECTED_SYMBOLS[:20])})")
+    if bad_urls:
+        logger.warning(f"⚠️ روابط غير صالحة: {len(bad_urls)} ({', '.join(bad_urls[:20])})")
+    too_many_variants = len(CHART_VARIANTS) > MEDIA_GROUP_SIZE - 1
+    if CHART_VARIANTS:
+        labels = ", ".join(f"{interval}:{style}" for interval, style in CHART_VARIANTS)
+        logger.info(f"🔀 أطر إضافية من نفس الصفحة: {labels}")
+        if too_many_variants:
+            logger.warning(f"⚠️ الألبوم يتسع لـ {MEDIA_GROUP_SIZE - 1} أطر إضافية فقط: سيُتجاهل الباقي")
+    missing_data = []
+    if CHART_BACKEND == "renko":
+        import renko
+        missing_data = [stock.symbol for stock in stocks if not renko.ohlc_path(stock.symbol)]
+        logger.info(f"🧱 ملفات الأسعار في {renko.RENKO_DATA_DIR}: {len(stocks) - len(missing_data)}/{len(stocks)}")
+        if missing_data:
+            logger.warning(f"⚠️ أسهم بلا بيانات أسعار: {len(missing_data)} ({', '.join(missing_data[:20])})")
+    logger.info(f"⚡ زمن الإقلاع والتحقق: {(time.perf_counter() - STARTUP_TIME) * 1000:.0f} مللي ثانية")
+    return 1 if REJECTED_SYMBOLS or bad_urls or missing_data or too_many_variants else 0
+
+def run_bench(argv):
+    """تشغيل bench.py بنفس الوحدة المحملة بدلاً من استيراد main.py مرة ثانية"""
+    sys.modules.setdefault("main", sys.modules[__name__])
+    import bench
+    bench.cli(argv)
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # الصيغة القديمة بدون أمر فرعي: python main.py [--resume | --retry-failed | --merge ...] [--shard i/N]
+    if not argv or argv[0].startswith("-") and argv[0] not in ("-h", "--help"):
+        if "--merge" in argv:
+            argv = ["merge"] + [arg for arg in argv if arg != "--merge"]
+        else:
+            argv = ["run"] + argv
+    
+    parser = argparse.ArgumentParser(description="بوت التقرير الشهري للأسهم الأمريكية")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    run = commands.add_parser("run", help="التشغيل الكامل: التقاط الشارتات وإرسالها إلى تليجرام")
+    mode = run.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="استكمال آخر تشغيل منقطع (الأسهم غير المُسلّمة فقط)")
+    mode.add_argument("--retry-failed", action="store_true", help="إعادة محاولة الأسهم الفاشلة في التشغيل السابق فقط")
+    run.add_argument("--shard", type=parse_shard, metavar="i/N", help="معالجة الجزء i من N فقط وكتابة نتيجته كملف JSON")
+    run.add_argument("--backend", choices=CHART_BACKENDS, help="محرك الشارت (الافتراضي من CHART_BACKEND)")
+    
+    dry = commands.add_parser("dry-run", help="التحقق من قائمة الأسهم وحساب الروابط دون متصفح أو تليجرام")
+    dry.add_argument("--shard", type=parse_shard, metavar="i/N", help="التحقق من الجزء i من N فقط")
+    dry.add_argument("--urls", action="store_true", help="طباعة رابط شارت كل سهم")
+    dry.add_argument("--backend", choices=CHART_BACKENDS, help="مع renko: التحقق من وجود ملفات الأسعار المحلية أيضاً")
+    
+    daemon = commands.add_parser("daemon", help="تشغيل دائم: متصفحات دافئة، التقرير الشهري بجدولة داخلية، وأوامر /chart")
+    daemon.add_argument("--backend", choices=CHART_BACKENDS, help="محرك الشارت (الافتراضي من CHART_BACKEND)")
+    
+    commands.add_parser("greet", help="إرسال رسالة الترحيب الشهرية فقط (قبل بدء الأجزاء في التشغيل الموزع)")
+    
+    merge = commands.add_parser("merge", help="دمج ملفات نتائج الأجزاء وإرسال التقرير الموحد")
+    merge.add_argument("files", nargs="+", metavar="SHARD_FILE")
+    
+    # خيارات bench تُمرر كما هي إلى bench.py (REMAINDER لا يقبل خياراً يبدأ بـ - في أوله)
+    commands.add_parser("bench", help="قياس الأداء محلياً (الخيارات تُمرر إلى bench.py)", add_help=False)
+    if argv[0] == "bench":
+        return argparse.Namespace(command="bench", bench_args=argv[1:])
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    asyncio.run(main())
- 
+    args = parse_args()
+    if getattr(args, "backend", None):
+        CHART_BACKEND = args.backend
+    if args.command == "dry-run":
+        sys.exit(dry_run(args.shard, args.urls))
+    elif args.command == "bench":
+        run_bench(args.bench_args)
+    else:
+        if not configure_telegram():
+            sys.exit(1)
+        if args.command == "merge":
+            asyncio.run(merge_main(args.files))
+        elif args.command == "greet":
+            asyncio.run(greet_main())
+        elif args.command == "daemon":
+            asyncio.run(daemon_main())
+        else:
+            if args.resume:
+                run_mode = "resume"
+            elif args.retry_failed:
+                run_mode = "retry-failed"
+            else:
+                run_mode = "full"
+            asyncio.run(main(run_mode, args.shard))
@@ -0,0 +1,294 @@
+import collections
+import io
+import logging
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# مجلد بيانات الأسعار المحلية: ملف لكل سهم باسم الرمز (SYMBOL.csv أو SYMBOL.parquet)
+RENKO_DATA_DIR = os.getenv("RENKO_DATA_DIR", "ohlc")
+# حجم الصندوق: atr (متوسط المدى الحقيقي للأشهر الأخيرة مثل افتراضي TradingView) أو fixed (قيمة ثابتة)
+RENKO_BOX_MODE = os.getenv("RENKO_BOX_MODE", "atr")
+RENKO_BOX_SIZE = float(os.getenv("RENKO_BOX_SIZE", "0"))
+RENKO_ATR_PERIOD = int(os.getenv("RENKO_ATR_PERIOD", "14"))
+# عدد الطوب الأخير الظاهر في الشارت
+RENKO_MAX_BRICKS = int(os.getenv("RENKO_MAX_BRICKS", "120"))
+RENKO_WIDTH = int(os.getenv("RENKO_WIDTH", "1280"))
+RENKO_HEIGHT = int(os.getenv("RENKO_HEIGHT", "720"))
+RENKO_FONT = os.getenv("RENKO_FONT", "DejaVuSans.ttf")
+
+# ألوان الثيم الداكن في TradingView
+BACKGROUND_COLOR = (19, 23, 34)
+GRID_COLOR = (42, 46, 57)
+TEXT_COLOR = (178, 181, 190)
+UP_COLOR = (8, 153, 129)
+DOWN_COLOR = (242, 54, 69)
+
+OHLC_COLUMNS = ("date", "open", "high", "low", "close")
+MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# طوب رينكو لسهم واحد: الاتجاه (+1/-1) وقاع كل طوبة والشهر الذي اكتملت فيه (سنة × 12 + شهر)
+RenkoSeries = collections.namedtuple("RenkoSeries", ["symbol", "box", "directions", "bottoms", "months", "last_close", "last_month"])
+
+def ohlc_path(symbol, data_dir=RENKO_DATA_DIR):
+    """مسار ملف أسعار السهم (CSV أولاً ثم Parquet) أو None إذا لم يوجد"""
+    for extension in ("csv", "parquet"):
+        path = os.path.join(data_dir, f"{symbol}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def read_ohlc_file(path):
+    """قراءة ملف أسعار إلى (تواريخ datetime64، مصفوفة N×4 للفتح والأعلى والأدنى والإغلاق)"""
+    if path.endswith(".parquet"):
+        try:
+            import pandas
+        except ImportError:
+            raise RuntimeError("قراءة Parquet تتطلب pandas و pyarrow")
+        frame = pandas.read_parquet(path)
+        frame.columns = [str(column).strip().lower() for column in frame.columns]
+        dates = pandas.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]")
+        return dates, frame[list(OHLC_COLUMNS[1:])].to_numpy(dtype=float)
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    header = [column.strip().lower() for column in lines[0].split(",")]
+    indexes = [header.index(column) for column in OHLC_COLUMNS]
+    # محلل numpy المكتوب بـ C أسرع بعدة مرات من تحويل الصفوف في بايثون
+    rows = [line for line in lines[1:] if line]
+    dates = np.loadtxt(rows, delimiter=",", usecols=indexes[0], dtype="datetime64[D]", ndmin=1)
+    prices = np.loadtxt(rows, delimiter=",", usecols=indexes[1:], dtype=float, ndmin=2)
+    return dates, prices
+
+def monthly_bars(dates, prices):
+    """تجميع الشموع (يومية أو أسبوعية أو شهرية) إلى شموع شهرية بعمليات متجهة"""
+    order = np.argsort(dates, kind="stable")
+    dates, prices = dates[order], prices[order]
+    # مفتاح الشهر: سنة × 12 + (شهر - 1)
+    months = dates.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    starts = np.flatnonzero(np.r_[True, np.diff(months) != 0])
+    ends = np.r_[starts[1:], len(months)] - 1
+    bars = np.column_stack((
+        prices[starts, 0],
+        np.maximum.reduceat(prices[:, 1], starts),
+        np.minimum.reduceat(prices[:, 2], starts),
+        prices[ends, 3],
+    ))
+    return months[starts], bars
+
+def load_monthly_ohlc(symbol, data_dir=RENKO_DATA_DIR):
+    """الشموع الشهرية لسهم واحد أو None إذا لم تتوفر بيانات"""
+    path = ohlc_path(symbol, data_dir)
+    if not path:
+        return None
+    dates, prices = read_ohlc_file(path)
+    if not len(dates):
+        return None
+    return monthly_bars(dates, prices)
+
+def stack_monthly(series):
+    """رص شموع عدة أسهم في مصفوفات (الأسهم × الأشهر) على تقويم مشترك مع NaN للأشهر الناقصة"""
+    calendar = np.unique(np.concatenate([months for months, _ in series]))
+    high = np.full((len(series), len(calendar)), np.nan)
+    low = high.copy()
+    close = high.copy()
+    for row, (months, bars) in enumerate(series):
+        columns = np.searchsorted(calendar, months)
+        high[row, columns] = bars[:, 1]
+        low[row, columns] = bars[:, 2]
+        close[row, columns] = bars[:, 3]
+    return calendar, high, low, close
+
+def box_sizes(high, low, close, mode=RENKO_BOX_MODE, size=RENKO_BOX_SIZE, period=RENKO_ATR_PERIOD):
+    """حجم الصندوق لكل سهم: ثابت أو متوسط المدى الحقيقي لآخر period شهراً متوفراً"""
+    if mode == "fixed":
+        if size <= 0:
+            raise ValueError("RENKO_BOX_SIZE يجب أن يكون أكبر من صفر في وضع fixed")
+        return np.full(close.shape[0], size)
+
+    previous_close = np.roll(close, 1, axis=1)
+    previous_close[:, 0] = np.nan
+    with np.errstate(invalid="ignore"):
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    valid = ~np.isnan(true_range)
+    # ترتيب القيم الصالحة من اليمين: تُحسب آخر period قيمة فقط حتى لو توقفت بيانات السهم مبكراً
+    rank_from_end = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    window = valid & (rank_from_end <= period)
+    counts = window.sum(axis=1)
+    totals = np.where(window, true_range, 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals / counts
+
+def renko_counts(close, box):
+    """عدد الطوب المكتمل في كل شهر لكل الأسهم معاً (+ صاعد، - هابط) مع انعكاس بصندوقين"""
+    symbols, months = close.shape
+    upper = np.full(symbols, np.nan)
+    lower = np.full(symbols, np.nan)
+    base = np.full(symbols, np.nan)
+    counts = np.zeros((symbols, months), dtype=np.int32)
+
+    # التكرار على الأشهر فقط؛ كل خطوة متجهة على كل الأسهم
+    with np.errstate(invalid="ignore"):
+        for month in range(months):
+            price = close[:, month]
+            started = np.isnan(upper) & ~np.isnan(price)
+            upper[started] = lower[started] = base[started] = price[started]
+
+            up = np.nan_to_num(np.floor((price - upper) / box)).clip(min=0)
+            down = np.nan_to_num(np.floor((lower - price) / box)).clip(min=0)
+
+            rising = up > 0
+            upper[rising] += up[rising] * box[rising]
+            lower[rising] = upper[rising] - box[rising]
+            falling = down > 0
+            lower[falling] -= down[falling] * box[falling]
+            upper[falling] = lower[falling] + box[falling]
+            counts[:, month] = up - down
+    return counts, base
+
+def expand_bricks(symbol, counts, base, box, calendar, last_close, last_month):
+    """تحويل عدد الطوب الشهري لسهم واحد إلى سلسلة طوب: كل طوبة تبتعد صندوقاً واحداً عن سابقتها"""
+    active = np.flatnonzero(counts)
+    sizes = np.abs(counts[active])
+    directions = np.repeat(np.sign(counts[active]), sizes).astype(np.int8)
+    months = np.repeat(calendar[active], sizes)
+    if len(directions):
+        # أول طوبة صاعدة تبدأ من سعر الأساس وأول طوبة هابطة تنتهي عنده
+        bottoms = base + (np.cumsum(directions) - (directions[0] > 0)) * box
+    else:
+        bottoms = np.empty(0)
+    return RenkoSeries(symbol, float(box), directions, bottoms, months, float(last_close), int(last_month))
+
+def compute_renko_batch(symbols, data_dir=RENKO_DATA_DIR, mode=RENKO_BOX_MODE, size=RENKO_BOX_SIZE, period=RENKO_ATR_PERIOD, boxes=None):
+    """حساب طوب رينكو الشهري لدفعة أسهم بعمليات متجهة (boxes: صناديق محفوظة تحل محل المحسوبة)؛ None للسهم بلا بيانات أو بحجم صندوق غير صالح"""
+    loaded = {}
+    for symbol in symbols:
+        try:
+            bars = load_monthly_ohlc(symbol, data_dir)
+        except Exception as e:
+            logger.warning(f"⚠️ تعذرت قراءة أسعار {symbol}: {e}")
+            continue
+        if bars is not None:
+            loaded[symbol] = bars
+    if not loaded:
+        return [None] * len(symbols)
+
+    names = list(loaded)
+    series = [loaded[symbol] for symbol in names]
+    calendar, high, low, close = stack_monthly(series)
+    sizes = box_sizes(high, low, close, mode, size, period)
+    if boxes:
+        for row, symbol in enumerate(names):
+            if symbol in boxes:
+                sizes[row] = boxes[symbol]
+    valid = np.isfinite(sizes) & (sizes > 0)
+    counts, base = renko_counts(close, np.where(valid, sizes, np.inf))
+
+    results = {}
+    for row, symbol in enumerate(names):
+        if not valid[row]:
+            continue
+        months, bars = series[row]
+        results[symbol] = expand_bricks(symbol, counts[row], base[row], sizes[row], calendar, bars[-1, 3], months[-1])
+    return [results.get(symbol) for symbol in symbols]
+
+def nice_step(span, lines=8):
+    """خطوة شبكة أسعار مقروءة (1 أو 2 أو 5 × 10^n)"""
+    raw = span / lines
+    magnitude = 10 ** np.floor(np.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+def format_price(value, step):
+    decimals = max(0, int(-np.floor(np.log10(step)))) if step < 1 else 0
+    return f"{value:,.{decimals}f}"
+
+def load_font(size):
+    try:
+        return ImageFont.truetype(RENKO_FONT, size)
+    except OSError:
+        return ImageFont.load_default()
+
+def render_renko_png(series, title=None, width=RENKO_WIDTH, height=RENKO_HEIGHT, max_bricks=RENKO_MAX_BRICKS):
+    """رسم شارت رينكو بثيم TradingView الداكن وإرجاعه كبايتات PNG"""
+    image = Image.new("RGB", (width, height), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+    font = load_font(13)
+    title_font = load_font(16)
+
+    left, top, right, bottom = 10, 44, width - 80, height - 28
+    directions = series.directions[-max_bricks:]
+    bottoms = series.bottoms[-max_bricks:]
+    months = series.months[-max_bricks:]
+    box = series.box
+
+    if len(directions):
+        low = min(bottoms.min(), series.last_close)
+        high = max(bottoms.max() + box, series.last_close)
+    else:
+        low = high = series.last_close
+    padding = max((high - low) * 0.05, box)
+    low, high = low - padding, high + padding
+
+    def y_of(price):
+        return bottom - (price - low) / (high - low) * (bottom - top)
+
+    # شبكة الأسعار ومحورها على اليمين
+    step = nice_step(high - low)
+    level = np.ceil(low / step) * step
+    while level < high:
+        y = y_of(level)
+        draw.line((left, y, right, y), fill=GRID_COLOR)
+        draw.text((right + 8, y - 7), format_price(level, step), fill=TEXT_COLOR, font=font)
+        level += step
+
+    if len(directions):
+        brick_width = min(24, (right - left) / len(directions))
+        gap = 1 if brick_width >= 4 else 0
+        x = right - brick_width * len(directions)
+        previous_year = None
+        label_end = left
+        for direction, brick_bottom, month in zip(directions, bottoms, months):
+            color = UP_COLOR if direction > 0 else DOWN_COLOR
+            draw.rectangle(
+                (x + gap, y_of(brick_bottom + box), x + brick_width - gap, y_of(brick_bottom)),
+                fill=color, outline=color
+            )
+            year = month // 12
+            if year != previous_year:
+                # خط عمودي وتسمية عند أول طوبة في كل سنة
+                draw.line((x, top, x, bottom), fill=GRID_COLOR)
+                if x >= label_end:
+                    draw.text((x + 2, bottom + 6), str(year), fill=TEXT_COLOR, font=font)
+                    label_end = x + 40
+                previous_year = year
+            x += brick_width
+
+    # خط آخر سعر إغلاق بلون اتجاه آخر طوبة
+    last_color = UP_COLOR if not len(directions) or directions[-1] > 0 else DOWN_COLOR
+    y = y_of(series.last_close)
+    for x in range(left, right, 8):
+        draw.line((x, y, x + 4, y), fill=last_color)
+    draw.rectangle((right + 2, y - 9, width - 2, y + 9), fill=last_color)
+    draw.text((right + 8, y - 7), format_price(series.last_close, step), fill=(255, 255, 255), font=font)
+
+    last_month = f"{MONTH_NAMES[series.last_month % 12]} {series.last_month // 12}"
+    heading = title or f"{series.symbol} · 1M · Renko"
+    draw.text((left + 4, 10), f"{heading}  ·  box {format_price(box, step)}  ·  {last_month}", fill=TEXT_COLOR, font=title_font)
+
+    buffer = io.BytesIO()
+    # ضغط خفيف: مرحلة الصور تعيد الترميز على أي حال
+    image.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+def render_renko_timed(series, title=None):
+    """رسم الشارت مع زمن الرسم (تُنفذ في عملية منفصلة)"""
+    start_time = time.perf_counter()
+    png = render_renko_png(series, title)
+    return png, time.perf_counter() - start_time
@@ -0,0 +1,47 @@
+"""بصمة الشارت: شارت بطوبة جديدة واحدة لا يُعاد إرساله كشارت الشهر السابق"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+import renko
+
+KEY = main.ChartCache.key("AAPL")
+
+
+def renko_chart(directions):
+    """رسم سلسلة طوب اصطناعية بصندوق 10 تبدأ من سعر 100"""
+    directions = np.array(directions, dtype=np.int8)
+    bottoms = 100 + (np.cumsum(directions) - (directions[0] > 0)) * 10.0
+    months = 2015 * 12 + np.arange(len(directions))
+    last_close = bottoms[-1] + (10 if directions[-1] > 0 else 0)
+    series = renko.RenkoSeries("AAPL", 10.0, directions, bottoms, months, float(last_close), int(months[-1]))
+    return renko.render_renko_png(series)
+
+
+def test_chart_with_one_new_brick_is_sent_again(tmp_path):
+    cache = main.ChartCache(str(tmp_path / "cache.json"))
+    # سبعون طوبة: البصمة القديمة (64 بت للصورة كلها) لم تكن ترى الطوبة الأخيرة إطلاقاً
+    previous = renko_chart([1, 1, -1, -1, 1, 1, 1] * 10)
+    current = renko_chart([1, 1, -1, -1, 1, 1, 1] * 10 + [1])
+    cache.update(KEY, main.chart_fingerprint(previous), "previous-file-id")
+
+    assert cache.find_unchanged(KEY, main.chart_fingerprint(current)) is None
+
+
+def test_identical_chart_reuses_file_id(tmp_path):
+    cache = main.ChartCache(str(tmp_path / "cache.json"))
+    chart = renko_chart([1, 1, -1, -1, 1, 1, 1])
+    cache.update(KEY, main.chart_fingerprint(chart), "previous-file-id")
+
+    assert cache.find_unchanged(KEY, main.chart_fingerprint(chart)) == "previous-file-id"
+
+
+def test_fingerprint_from_older_format_never_matches(tmp_path):
+    cache = main.ChartCache(str(tmp_path / "cache.json"))
+    chart = renko_chart([1, 1, -1, -1, 1, 1, 1])
+    cache.update(KEY, main.chart_fingerprint(chart)[:16], "previous-file-id")
+
+    assert cache.find_unchanged(KEY, main.chart_fingerprint(chart)) is None
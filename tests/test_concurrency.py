@@ -0,0 +1,146 @@
+"""قرارات المتحكم التكيفي (AIMD): زيادة جمعية، خفض ضربي عند الفشل أو البطء، والبقاء داخل الحدود"""
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+class StubPool:
+    """مجموعة وهمية: grow و retire يعدلان عدد المتصفحات فقط"""
+
+    tabs_per_browser = 1
+
+    def __init__(self, size):
+        self.slots = [types.SimpleNamespace(relaunch_reason=None) for _ in range(size)]
+
+    async def grow(self):
+        self.slots.append(types.SimpleNamespace(relaunch_reason=None))
+        return True
+
+    def retire(self):
+        active = [slot for slot in self.slots if slot.relaunch_reason is None]
+        if len(active) <= 1:
+            return False
+        active[-1].relaunch_reason = "retire"
+        return True
+
+
+@pytest.fixture(autouse=True)
+def quiet_system(monkeypatch):
+    # الحمل والذاكرة الحقيقيان للجهاز لا يدخلان في القرار
+    monkeypatch.setattr(main, "system_pressure", lambda: (None, None))
+
+
+def controller(initial, minimum=1, maximum=8):
+    return main.ConcurrencyController(StubPool(initial), initial, minimum=minimum, maximum=maximum, adaptive=True)
+
+
+def window(control, successes=4, failures=0, ready_time=1.0):
+    for _ in range(successes):
+        control.observe({"success": True, "ready_time": ready_time})
+    for _ in range(failures):
+        control.observe({"success": False})
+
+
+def evaluate(control):
+    async def decide():
+        await control.evaluate()
+        await control.close()
+    asyncio.run(decide())
+    return control.decisions[-1] if control.decisions else None
+
+
+def test_too_few_samples_make_no_decision():
+    control = controller(3)
+    window(control, successes=main.ADAPTIVE_MIN_SAMPLES - 1)
+
+    assert evaluate(control) is None
+    assert control.limit == 3
+
+
+def test_additive_increase_when_healthy_and_workers_wait():
+    control = controller(3)
+    control.waiting = 2
+    window(control)
+
+    decision = evaluate(control)
+    assert (decision["action"], decision["reason"]) == ("increase", "healthy")
+    assert control.limit == 4
+    assert control.peak == 4
+
+
+def test_no_increase_without_waiting_workers():
+    control = controller(3)
+    window(control)
+
+    decision = evaluate(control)
+    assert (decision["action"], decision["reason"]) == ("hold", "no_demand")
+    assert control.limit == 3
+
+
+def test_multiplicative_decrease_on_failures():
+    control = controller(8)
+    window(control, successes=2, failures=2)
+
+    decision = evaluate(control)
+    assert (decision["action"], decision["reason"]) == ("decrease", "failures")
+    assert control.limit == int(8 * main.ADAPTIVE_DECREASE_FACTOR)
+
+
+def test_multiplicative_decrease_on_latency():
+    control = controller(8)
+    window(control, ready_time=1.0)
+    evaluate(control)
+
+    window(control, ready_time=1.0 * main.ADAPTIVE_LATENCY_FACTOR + 0.5)
+    decision = evaluate(control)
+    assert (decision["action"], decision["reason"]) == ("decrease", "latency")
+    assert control.limit == int(8 * main.ADAPTIVE_DECREASE_FACTOR)
+    # الزمن البطيء لا يصبح المرجع الجديد
+    assert control.best_latency == 1.0
+
+
+def test_decrease_always_drops_at_least_one():
+    control = controller(2)
+    window(control, successes=0, failures=4)
+
+    evaluate(control)
+    assert control.limit == 1
+
+
+def test_limit_stays_within_minimum_and_maximum():
+    control = controller(3, minimum=2, maximum=5)
+    for _ in range(6):
+        control.waiting = 1
+        window(control)
+        evaluate(control)
+    assert control.limit == 5
+    assert control.decisions[-1]["reason"] == "at_max"
+
+    for _ in range(6):
+        window(control, successes=0, failures=4)
+        evaluate(control)
+    assert control.limit == 2
+    assert control.decisions[-1]["action"] == "hold"
+
+    assert all(2 <= decision["limit"] <= 5 for decision in control.decisions)
+
+
+def test_pool_follows_the_limit():
+    control = controller(3)
+    control.waiting = 1
+    window(control)
+    evaluate(control)
+    assert len(control.pool.slots) == 4
+
+    window(control, successes=0, failures=4)
+    evaluate(control)
+    # متصفح واحد يُعلَّم للإغلاق في كل قرار حتى يصل العدد إلى الحد
+    active = [slot for slot in control.pool.slots if slot.relaunch_reason is None]
+    assert control.limit == 2
+    assert len(active) == 3
@@ -0,0 +1,91 @@
+"""استعارة التبويبات من مجموعة المتصفحات: من يطلب تبويباً جديداً يحصل عليه دائماً"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+class StubPool(main.DriverPool):
+    """مجموعة بلا Chrome: إعادة التشغيل واستبدال التبويب يسجلان فقط ما حدث"""
+
+    def __init__(self, tabs_per_browser):
+        super().__init__(1, max_pages=2, tabs_per_browser=tabs_per_browser)
+        self.launches = 0
+        self.replaced = []
+        slot = main.DriverSlot(0)
+        self.slots.append(slot)
+        self._open_tabs(slot)
+
+    def _open_tabs(self, slot):
+        self.launches += 1
+        slot.tabs = [main.ChartTab(slot, f"launch-{self.launches}-tab-{index}") for index in range(self.tabs_per_browser)]
+        slot.pages = 0
+        slot.leased = 0
+        slot.parked = []
+        slot.relaunch_reason = None
+        return list(slot.tabs)
+
+    async def _relaunch(self, slot):
+        return self._open_tabs(slot)
+
+    async def _replace_tab(self, tab):
+        self.replaced.append(tab.handle)
+        tab.handle = f"{tab.handle}-replaced"
+
+    async def _is_alive(self, slot):
+        return True
+
+
+def test_fresh_caller_gets_tab_from_recycled_browser():
+    async def scenario():
+        pool = StubPool(tabs_per_browser=2)
+        first, second = pool.slots[0].tabs
+        pool.slots[0].pages = pool.max_pages
+        pool.idle.put_nowait(second)
+        pool.slots[0].leased = 1
+
+        # تبويب آخر مُعار: الاستعارة تركن التبويب وتعلّم المتصفح لإعادة التدوير ثم تنتظر
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.slots[0].relaunch_reason == "recycle"
+
+        # التبويب المُعاد يصل إلى من طلب تبويباً جديداً وهو آخر من يمسك المتصفح
+        pool.slots[0].leased = 0
+        pool.idle.put_nowait(first)
+        tab = await pool.acquire(fresh=True)
+        other = await waiting
+        return pool, tab, other
+
+    pool, tab, other = asyncio.run(scenario())
+    assert pool.launches == 2
+    assert tab.handle.startswith("launch-2-")
+    assert other.handle.startswith("launch-2-") and other is not tab
+    # لا استبدال لتبويب في متصفح جديد أصلاً
+    assert pool.replaced == []
+    assert pool.recycle_count == 1
+
+
+def test_fresh_caller_in_shared_browser_gets_replaced_tab():
+    async def scenario():
+        pool = StubPool(tabs_per_browser=2)
+        for tab in pool.slots[0].tabs:
+            pool.idle.put_nowait(tab)
+        return pool, await pool.acquire(fresh=True)
+
+    pool, tab = asyncio.run(scenario())
+    assert tab.handle.endswith("-replaced")
+    assert pool.launches == 1
+    assert pool.fresh_count == 1
+
+
+def test_fresh_caller_in_single_tab_browser_gets_relaunched_browser():
+    async def scenario():
+        pool = StubPool(tabs_per_browser=1)
+        pool.idle.put_nowait(pool.slots[0].tabs[0])
+        return pool, await pool.acquire(fresh=True)
+
+    pool, tab = asyncio.run(scenario())
+    assert tab.handle.startswith("launch-2-")
+    assert pool.fresh_count == 1
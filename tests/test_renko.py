@@ -0,0 +1,120 @@
+"""حساب طوب الرينكو المتجه مقارنة بالخوارزمية المرجعية (حلقة لكل سهم وكل شهر)"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renko
+
+BOX = 10.0
+
+
+def reference_bricks(closes, box):
+    """الخوارزمية المرجعية: طوبة لكل صندوق كامل، والانعكاس يحتاج صندوقين من قمة (أو قاع) آخر طوبة"""
+    directions, bottoms, months = [], [], []
+    upper = lower = None
+    for month, price in enumerate(closes):
+        if np.isnan(price):
+            continue
+        if upper is None:
+            upper = lower = price
+            continue
+        while price >= upper + box:
+            directions.append(1)
+            bottoms.append(upper)
+            months.append(month)
+            upper += box
+            lower = upper - box
+        while price <= lower - box:
+            lower -= box
+            directions.append(-1)
+            bottoms.append(lower)
+            months.append(month)
+            upper = lower + box
+    return directions, bottoms, months
+
+
+def write_closes(data_dir, symbol, closes, first_month=0):
+    """ملف أسعار شهري: شمعة واحدة لكل شهر بدءاً من يناير 2020 (+first_month)"""
+    lines = ["date,open,high,low,close"]
+    for index, close in enumerate(closes):
+        month = first_month + index
+        lines.append(f"{2020 + month // 12}-{month % 12 + 1:02d}-15,{close},{close + 1},{close - 1},{close}")
+    (data_dir / f"{symbol}.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def compute(data_dir, closes_by_symbol, **options):
+    for symbol, closes in closes_by_symbol.items():
+        write_closes(data_dir, symbol, closes)
+    options.setdefault("mode", "fixed")
+    options.setdefault("size", BOX)
+    symbols = list(closes_by_symbol)
+    return dict(zip(symbols, renko.compute_renko_batch(symbols, data_dir=str(data_dir), **options)))
+
+
+def assert_matches_reference(series, closes, box=BOX):
+    directions, bottoms, months = reference_bricks(np.array(closes, dtype=float), box)
+    assert series.directions.tolist() == directions
+    assert np.allclose(series.bottoms, bottoms)
+    assert (series.months - 2020 * 12).tolist() == months
+
+
+def test_up_moves(tmp_path):
+    closes = [100, 125, 131, 131]
+    series = compute(tmp_path, {"UP": closes})["UP"]
+
+    assert series.directions.tolist() == [1, 1, 1]
+    assert series.bottoms.tolist() == [100, 110, 120]
+    assert_matches_reference(series, closes)
+
+
+def test_down_moves(tmp_path):
+    closes = [100, 75, 69]
+    series = compute(tmp_path, {"DOWN": closes})["DOWN"]
+
+    assert series.directions.tolist() == [-1, -1, -1]
+    assert series.bottoms.tolist() == [90, 80, 70]
+    assert_matches_reference(series, closes)
+
+
+def test_reversal_needs_two_boxes(tmp_path):
+    # قمة آخر طوبة 130: التراجع إلى 115 (صندوق ونصف) لا يرسم طوبة، و109 ترسم طوبة هابطة
+    closes = [100, 130, 115, 109]
+    series = compute(tmp_path, {"REV": closes})["REV"]
+
+    assert series.directions.tolist() == [1, 1, 1, -1]
+    assert series.bottoms.tolist() == [100, 110, 120, 110]
+    assert (series.months - 2020 * 12).tolist() == [1, 1, 1, 3]
+    assert_matches_reference(series, closes)
+
+
+def test_batch_matches_reference_on_random_walks(tmp_path):
+    rng = np.random.default_rng(7)
+    walks = {f"W{index}": (100 + np.cumsum(rng.normal(0, 8, 60))).round(2).tolist() for index in range(8)}
+    results = compute(tmp_path, walks)
+
+    for symbol, closes in walks.items():
+        assert_matches_reference(results[symbol], closes)
+
+
+def test_box_override_replaces_computed_box(tmp_path):
+    closes = [100, 130, 115, 109, 150, 90]
+    fixed = compute(tmp_path, {"BOX": closes})["BOX"]
+    overridden = compute(tmp_path, {"BOX": closes}, mode="atr", boxes={"BOX": BOX})["BOX"]
+    atr = compute(tmp_path, {"BOX": closes}, mode="atr")["BOX"]
+
+    assert overridden.box == BOX
+    assert overridden.directions.tolist() == fixed.directions.tolist()
+    assert np.allclose(overridden.bottoms, fixed.bottoms)
+    assert atr.box != BOX
+
+
+def test_batch_with_different_start_months(tmp_path):
+    # سهم يبدأ بعد غيره بثلاثة أشهر: أشهره الأولى NaN في المصفوفة المشتركة
+    write_closes(tmp_path, "EARLY", [100, 120, 95, 96, 140])
+    write_closes(tmp_path, "LATE", [50, 20, 45], first_month=3)
+    early, late = renko.compute_renko_batch(["EARLY", "LATE"], data_dir=str(tmp_path), mode="fixed", size=BOX)
+
+    assert_matches_reference(early, [100, 120, 95, 96, 140])
+    assert_matches_reference(late, [np.nan, np.nan, np.nan, 50, 20, 45])
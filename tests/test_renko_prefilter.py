@@ -0,0 +1,75 @@
+"""تصنيف الفلتر المسبق: طوبة جديدة أو انعكاس أو بلا تغيير مقارنة بحالة آخر إرسال"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+import renko
+
+BOX = 10.0
+JAN_2024 = 2024 * 12
+
+
+def series(directions, months):
+    directions = np.array(directions, dtype=np.int8)
+    months = np.array(months)
+    bottoms = 100 + np.cumsum(directions) * BOX
+    return renko.RenkoSeries("AAPL", BOX, directions, bottoms, months, 100.0, int(months[-1]) if len(months) else JAN_2024)
+
+
+def state(current):
+    """الحالة كما تُحفظ بعد التسليم وتعيدها renko_states"""
+    return main.renko_signature(current)
+
+
+def test_no_previous_state_is_new():
+    assert main.classify_renko_change(None, series([1, 1], [JAN_2024, JAN_2024 + 1])) == "new"
+
+
+def test_same_month_unchanged():
+    current = series([1, 1, -1, -1], [JAN_2024, JAN_2024 + 1, JAN_2024 + 2, JAN_2024 + 2])
+    assert main.classify_renko_change(state(current), current) == "unchanged"
+
+
+def test_new_month_brick_is_new_brick():
+    previous = series([1, 1], [JAN_2024, JAN_2024 + 1])
+    current = series([1, 1, 1], [JAN_2024, JAN_2024 + 1, JAN_2024 + 2])
+    assert main.classify_renko_change(state(previous), current) == "new_brick"
+
+
+def test_extra_brick_in_stored_month_is_new_brick():
+    # الشهر المحفوظ نفسه اكتملت فيه طوبة إضافية بنفس الاتجاه
+    previous = series([1, 1], [JAN_2024, JAN_2024 + 1])
+    current = series([1, 1, 1], [JAN_2024, JAN_2024 + 1, JAN_2024 + 1])
+    assert main.classify_renko_change(state(previous), current) == "new_brick"
+
+
+def test_first_brick_after_empty_state_is_new_brick():
+    previous = series([], [])
+    current = series([-1], [JAN_2024])
+    assert main.classify_renko_change(state(previous), current) == "new_brick"
+
+
+def test_direction_change_is_reversal():
+    previous = series([1, 1], [JAN_2024, JAN_2024 + 1])
+    current = series([1, 1, -1, -1], [JAN_2024, JAN_2024 + 1, JAN_2024 + 2, JAN_2024 + 2])
+    assert main.classify_renko_change(state(previous), current) == "reversal"
+
+
+def test_empty_series_stays_unchanged():
+    previous = series([], [])
+    assert main.classify_renko_change(state(previous), series([], [])) == "unchanged"
+
+
+def test_saved_state_round_trips_with_brick_count(tmp_path):
+    store = main.RunStateStore(str(tmp_path / "run_state.db"))
+    store.open()
+    current = series([1, 1, 1], [JAN_2024, JAN_2024 + 1, JAN_2024 + 1])
+    store.save_renko_state("AAPL", *main.renko_signature(current))
+    saved = store.renko_states()["AAPL"]
+    store.close()
+
+    assert saved == (JAN_2024 + 1, 1, 3, BOX)
+    assert main.classify_renko_change(saved, current) == "unchanged"
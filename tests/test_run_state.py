@@ -0,0 +1,39 @@
+"""اختيار أسهم التشغيل من run_state.db في أوضاع الاستئناف وإعادة المحاولة"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def open_store(tmp_path):
+    store = main.RunStateStore(str(tmp_path / "run_state.db"))
+    store.open()
+    return store
+
+
+def test_resume_continues_latest_unfinished_run(tmp_path):
+    store = open_store(tmp_path)
+    store.start_run("run-a", "full")
+    store.record("run-a", "AAPL", "delivered", 1.0)
+
+    run_id, selected = main.select_run_stocks(store, "resume")
+    store.close()
+
+    assert run_id == "run-a"
+    assert not selected(main.Stock("AAPL", "Apple", "Tech", "NASDAQ"))
+    assert selected(main.Stock("MSFT", "Microsoft", "Tech", "NASDAQ"))
+
+
+def test_resume_ignores_unfinished_run_older_than_a_finished_one(tmp_path):
+    store = open_store(tmp_path)
+    store.start_run("run-a", "full")
+    store.record("run-a", "AAPL", "delivered", 1.0)
+    store.start_run("run-b", "full")
+    store.finish_run("run-b")
+
+    run_id, selected = main.select_run_stocks(store, "resume")
+    store.close()
+
+    assert run_id not in ("run-a", "run-b")
+    assert selected is None
@@ -0,0 +1,113 @@
+"""الطابور المشترك مقابل التقسيم الثابت القديم على أسهم بأزمنة متفاوتة"""
+import asyncio
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+WORKERS = 3
+SLOW_SECONDS = 0.3
+FAST_SECONDS = 0.02
+
+
+class StubDriver:
+    """driver وهمي: تحميل الصفحة يحجز خيط المتصفح بزمن يحدده الرمز"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.current_url = "about:blank"
+
+    def get(self, url):
+        time.sleep(self.latencies[url])
+        self.current_url = url
+
+
+def build_processor(latencies):
+    pool = main.DriverPool(WORKERS, max_pages=1000, tabs_per_browser=1)
+    for slot_id in range(WORKERS):
+        slot = main.DriverSlot(slot_id)
+        slot.driver = StubDriver(latencies)
+        tab = main.ChartTab(slot, "w0")
+        slot.tabs = [tab]
+        slot.current_handle = "w0"
+        pool.slots.append(slot)
+        pool.idle.put_nowait(tab)
+    return types.SimpleNamespace(
+        pool=pool,
+        controller=main.ConcurrencyController(pool, WORKERS, adaptive=False),
+        retry_lane=main.RetryLane(),
+        results_queue=asyncio.Queue(),
+        worker_busy={},
+    )
+
+
+async def stub_capture(stock_info, tab, worker_id, detector, ready_timeout=None, timer=None):
+    start = time.time()
+    await tab.run(tab.driver.get, main.CHART_URLS[stock_info.symbol])
+    return {"success": True, "duration": time.time() - start, "stock": stock_info, "ready_time": 0, "unchanged": False}
+
+
+async def run_static_slices(processor, stocks):
+    """التقسيم القديم: كل worker يأخذ شريحة ثابتة متجاورة من القائمة"""
+    size = len(stocks) // WORKERS
+    slices = [stocks[i * size:(i + 1) * size if i < WORKERS - 1 else len(stocks)] for i in range(WORKERS)]
+
+    async def run_slice(worker_id, batch):
+        for stock in batch:
+            async with processor.pool.lease() as tab:
+                await main.capture_ultra_fast_chart(stock, tab, worker_id, None)
+
+    await asyncio.gather(*(run_slice(worker_id, batch) for worker_id, batch in enumerate(slices)))
+
+
+async def run_shared_queue(processor, stocks):
+    """نفس إعداد main(): طابور محدود يغذيه feeder وworkers تسحب منه"""
+    job_queue = asyncio.Queue(maxsize=WORKERS * 2)
+    delivery_queue = asyncio.Queue()
+    workers = [
+        asyncio.create_task(main.stock_worker(job_queue, delivery_queue, processor, worker_id))
+        for worker_id in range(WORKERS)
+    ]
+    for stock in stocks:
+        await job_queue.put((stock, 1, time.time()))
+    for _ in workers:
+        await job_queue.put(None)
+    await asyncio.gather(*workers)
+    return delivery_queue.qsize()
+
+
+def makespan(runner, stocks, latencies):
+    async def measure():
+        processor = build_processor(latencies)
+        start = time.perf_counter()
+        result = await runner(processor, stocks)
+        elapsed = time.perf_counter() - start
+        for slot in processor.pool.slots:
+            slot.executor.shutdown(wait=False)
+        return elapsed, result
+
+    return asyncio.run(measure())
+
+
+def test_shared_queue_beats_static_slices_on_skewed_latencies(monkeypatch):
+    monkeypatch.setattr(main, "capture_ultra_fast_chart", stub_capture)
+    monkeypatch.setattr(main, "CHART_NETWORK_STATS", False)
+    monkeypatch.setattr(main, "STOCK_PAUSE_SECONDS", 0)
+
+    # أول ثلث القائمة بطيء: التقسيم الثابت يضعه كله على worker واحد
+    stocks = list(main.STOCKS[:12])
+    latencies = {
+        main.CHART_URLS[stock.symbol]: SLOW_SECONDS if index < len(stocks) // WORKERS else FAST_SECONDS
+        for index, stock in enumerate(stocks)
+    }
+
+    static_time, _ = makespan(run_static_slices, stocks, latencies)
+    shared_time, delivered = makespan(run_shared_queue, stocks, latencies)
+
+    assert delivered == len(stocks)
+    # الشريحة البطيئة وحدها تستغرق 4 × 0.3 ث، والطابور المشترك يوزعها على كل الـ workers
+    assert static_time >= 4 * SLOW_SECONDS
+    assert shared_time < static_time * 0.75
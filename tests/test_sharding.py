@@ -0,0 +1,86 @@
+"""التقسيم الثابت على الأجزاء ودمج تقاريرها كما يستخدمهما سير عمل GitHub Actions"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def test_each_symbol_lands_in_exactly_one_shard():
+    symbols = [stock.symbol for stock in main.STOCKS] + [f"SYM{index}" for index in range(500)]
+    for shard_count in range(1, 6):
+        for symbol in symbols:
+            shards = [index for index in range(1, shard_count + 1) if main.in_shard(symbol, index, shard_count)]
+            assert len(shards) == 1, (symbol, shard_count, shards)
+
+
+def test_shards_partition_the_run_stocks():
+    shards = [list(main.iter_run_stocks(None, (index, 3))) for index in range(1, 4)]
+    symbols = [stock.symbol for shard in shards for stock in shard]
+
+    assert sorted(symbols) == sorted(stock.symbol for stock in main.STOCKS)
+    assert len(set(symbols)) == len(symbols)
+
+
+def record(symbol, success, worker=0):
+    return {"symbol": symbol, "name": symbol, "sector": "Tech", "success": success, "unchanged": False,
+            "duration": 1.0, "attempts": 1, "ready_time": 0.5, "worker": worker, "spans": []}
+
+
+def shard_report(shard, results, rejected, unchanged, api_calls):
+    return {
+        "run_id": f"run-{shard}",
+        "shard": shard,
+        "mode": "full",
+        "backend": "browser",
+        "started_at": 1000.0 + shard,
+        "total_stocks": len(results),
+        "universe": {"size": 100, "rejected": rejected},
+        "total_duration": 60.0 * shard,
+        "parallel_duration": 50.0 * shard,
+        "max_workers": 3,
+        "results": results,
+        "workers": {"0": 0.9},
+        "pool": {"startup_time": 2.0 * shard, "drivers": 3, "recycle_count": 1, "replacement_count": 0,
+                 "fresh_count": 0, "launch_failures": 0, "tabs_per_browser": 1, "peak_memory_mb": 500,
+                 "profile": "warm"},
+        "telegram": {"api_calls": api_calls, "calls_by_method": {"send_media_group": api_calls - 1, "send_message": 1},
+                     "retry_after_count": 1, "throttled_time": 2.0, "failures": 0},
+        "network": {"pages": len(results), "blocked_patterns": 5, "blocked_requests": 10, "requests": 40,
+                    "transferred_bytes": 1000},
+        "retry": {"spent": 1.0, "budget": 300},
+        "prefilter": {"enabled": True, "duration": 0.5, "counts": {"new": len(results), "unchanged": len(unchanged)},
+                      "unchanged": unchanged},
+        "concurrency": None,
+    }
+
+
+def test_merge_sums_counts_and_combines_lists():
+    first = shard_report(1, [record("AAPL", True), record("MSFT", False)], ["BAD1"], ["KO"], api_calls=4)
+    second = shard_report(2, [record("NVDA", False), record("AMZN", True), record("META", True)], ["BAD1", "BAD2"], [], api_calls=6)
+
+    merged = main.merge_run_reports([first, second])
+
+    assert merged["shards"] == 2
+    assert merged["total_stocks"] == 5
+    assert merged["max_workers"] == 6
+    assert merged["total_duration"] == 120.0
+    assert merged["started_at"] == 1001.0
+    assert merged["telegram"]["api_calls"] == 10
+    assert merged["telegram"]["calls_by_method"] == {"send_media_group": 8, "send_message": 2}
+    assert merged["pool"]["drivers"] == 6
+    assert merged["network"]["pages"] == 5
+    assert [result["symbol"] for result in merged["results"] if not result["success"]] == ["MSFT", "NVDA"]
+    # أرقام الـ workers تتكرر بين الأجزاء فتُميَّز برقم الجزء
+    assert {result["worker"] for result in merged["results"]} == {"1/0", "2/0"}
+    assert merged["universe"]["rejected"] == ["BAD1", "BAD2"]
+    assert merged["prefilter"]["unchanged"] == ["KO"]
+    assert merged["prefilter"]["counts"] == {"new": 5, "unchanged": 1}
+
+
+def test_split_message_keeps_parts_whole_and_under_the_limit():
+    parts = [f"• Company {index} (S{index:04d}) - Technology" for index in range(400)]
+    chunks = main.split_message(parts, limit=1000)
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == parts